@@ -1,3 +1,15 @@
+from array import array
+from collections import deque
+import heapq
+import itertools
+import json
+import os
+import random
+import re
+import struct
+import sys
+import zlib
+
 #################################################################################################################
 # Class: Instruction
 #
@@ -14,25 +26,21 @@
 # operands and destination of the instruction are ready.
 #
 # Underlying Implmentation:
-#   Node of a Singly Linked List
+#   Handle to one row of an InstructionQueue
 #
-#   Note: Each instruction holds a pointer to the next instruction.
+#   Note: The opcode and operands live in the columns of the queue's
+#         InstructionTrace and the timestamps in the queue's own timing
+#         columns; an Instruction only holds the queue, its row number and
+#         the issue_delay flag, so it is created when the instruction is
+#         dequeued and dropped once the instruction has left the stations.
 #
 # Private Data Members:
-#     String opcode           - pointer to the first instruction in the queue.
-#     Register * destination  - Points to the register where the result of the instruction will be written.
-#     Register * operand1     - Points to the register that contains the
-#                               first operand of the instruction.
-#     Register * operand2     - Points to the register that contains the
-#                               second operand of the instruction.
-#     Instruction * next      - Points to the next instruction in the linked list.
-#     int issued_cycle        - Marks the cycle when this instruction was issued.
-#     int execute_start_cycle - Timestamp (in clock-cycles) when instruction started executing.
-#     int execute_end_cycle   - Timestamp (in clock-cycles) when instruction finished executing.
-#     int write_back_cycle    - Timestamp (in clock-cycles) when instruction result was written to destination.
+#     InstructionQueue * queue - queue this instruction was taken from.
+#     int index                - row of this instruction in the queue.
+#     bool issue_delay         - stall a cycle to prevent executing same cycle as issue.
 #
 # Public Interface/Methods:
-#     __init__ - Constructs a new instruction
+#     __init__ - Constructs a handle to a queued instruction
 #     __str__  - Outputs instruction content as a string
 #
 #     Accessor Methods:
@@ -42,60 +50,177 @@
 #
 #####################################################################################################################
 class Instruction: 
-    def __init__(self, opcode, destination, operand1, operand2, next=None, issued_cycle=0, execute_start_cycle=0, execute_end_cycle=0, write_back_cycle=0):
-        self.opcode = opcode
-        self.destination = destination
-        self.operand1 = operand1
-        self.operand2 = operand2
-        self.next = next
-        self.issued_cycle = issued_cycle
-        self.execute_start_cycle = execute_start_cycle
-        self.execute_end_cycle = execute_end_cycle
-        self.write_back_cycle = write_back_cycle
+    __slots__ = ("queue", "index", "issue_delay")
+
+    def __init__(self, queue, index):
+        self.queue = queue
+        self.index = index
         self.issue_delay = True # stall a cycle to prevent executing same cycle as issue
 
     def __str__(self):
-        return (f"{self.opcode} {self.destination.get_name()} {self.operand1.get_name()} {self.operand2.get_name()} | Cycle Issued: {self.issued_cycle} | Cycle Start Execute: {self.execute_start_cycle} | Cycle End Execute: {self.execute_end_cycle} | Cycle Write Back: {self.write_back_cycle}")
+        return (f"{self.get_opcode()} {self.get_destination().get_name()} {self.get_operand1().get_name()} {self.get_operand2().get_name()} | Cycle Issued: {self.get_issued_cycle()} | Cycle Start Execute: {self.get_execute_start_cycle()} | Cycle End Execute: {self.get_execute_end_cycle()} | Cycle Write Back: {self.get_write_back_cycle()}")
 
     def get_opcode(self):
-        return self.opcode
+        trace = self.queue.trace
+        return trace.opcode_names[trace.opcodes[self.index]]
 
     def get_destination(self):
-        return self.destination
+        trace = self.queue.trace
+        return trace.operands[trace.destinations[self.index]]
 
     def get_operand1(self):
-        return self.operand1
+        trace = self.queue.trace
+        return trace.operands[trace.operands1[self.index]]
 
     def get_operand2(self): 
-        return self.operand2
+        trace = self.queue.trace
+        return trace.operands[trace.operands2[self.index]]
 
+    # Timestamps of instructions that were never dequeued read as 0.
     def get_issued_cycle(self):
-        return self.issued_cycle
+        return self.queue.get_timing(self.queue.issued_cycles, self.index)
         
     def get_execute_start_cycle(self):
-        return self.execute_start_cycle
+        return self.queue.get_timing(self.queue.execute_start_cycles, self.index)
         
     def get_execute_end_cycle(self):
-        return self.execute_end_cycle
+        return self.queue.get_timing(self.queue.execute_end_cycles, self.index)
         
     def get_write_back_cycle(self):
-        return self.write_back_cycle
+        return self.queue.get_timing(self.queue.write_back_cycles, self.index)
         
     def set_issued_cycle(self, clock_cycle):
-        self.issued_cycle = clock_cycle
+        self.queue.issued_cycles[self.index] = clock_cycle
 
     def set_execute_start_cycle(self, clock_cycle):
-        self.execute_start_cycle = clock_cycle
+        self.queue.execute_start_cycles[self.index] = clock_cycle
 
     def set_execute_end_cycle(self, clock_cycle):
-        self.execute_end_cycle = clock_cycle
+        self.queue.execute_end_cycles[self.index] = clock_cycle
 
     def set_write_back_cycle(self, clock_cycle):
-        self.write_back_cycle = clock_cycle
+        self.queue.write_back_cycles[self.index] = clock_cycle
 
     def set_issue_delay(self, boolean):
         self.issue_delay = boolean
 
+############################################################################
+# Class: InstructionTrace
+#
+# Purpose:
+#
+#   The program side of an instruction queue: what every instruction is,
+#   without any result of running it. Several InstructionQueues can run
+#   the same trace (see InstructionQueue.clone); a trace is never changed
+#   once a second queue uses it.
+#
+# Underlying Implmentation:
+#   Columns of parallel typed arrays, one row per instruction
+#
+#   Note: Opcodes and operands are stored as small integer indices into
+#         the opcode_names and operands tables, 13 bytes per instruction.
+#         A trace read from a file is filled in chunks, as the queues
+#         running it reach rows that are not loaded yet (see load).
+#
+# Private Data Members:
+#     list opcode_names  - opcode strings, indexed by the opcodes column.
+#     dict opcode_ids    - opcode string -> index in opcode_names.
+#     list operands      - distinct operand objects (Registers and load
+#                          address offsets), indexed by the operand columns.
+#     dict operand_ids   - operand -> index in operands. Registers are
+#                          looked up by identity, address offsets by value.
+#
+#     array opcodes, destinations, operands1, operands2 - one entry per instruction.
+#
+#     bool shared - set once a second queue runs this trace.
+#     iterator source  - while rows remain to be streamed in: each next()
+#                        appends the next chunk of rows, None otherwise.
+#     int source_length - total number of rows once 'source' is exhausted,
+#                         None when the source does not know it in advance.
+#
+# Public Interface/Methods:
+#
+# __init__, __len__, copy, load, load_all, opcode_id, operand_id, append, extend_columns
+#
+############################################################################
+class InstructionTrace:
+    def __init__(self):
+        self.opcode_names = []
+        self.opcode_ids = {}
+        self.operands = []
+        self.operand_ids = {}
+        self.opcodes = array('B')
+        self.destinations = array('i')
+        self.operands1 = array('i')
+        self.operands2 = array('i')
+        self.shared = False
+        self.source = None
+        self.source_length = 0
+
+    def __len__(self):
+        if self.source is not None and self.source_length is not None:
+            return self.source_length
+        return len(self.opcodes)
+
+    # Streams in chunks from 'source' until row 'index' is loaded (or the source runs out).
+    def load(self, index):
+        while index >= len(self.opcodes) and self.source is not None:
+            if next(self.source, False) == False or (self.source_length is not None and len(self.opcodes) >= self.source_length):
+                self.source = None
+
+    def load_all(self):
+        while self.source is not None:
+            self.load(len(self.opcodes))
+
+    def copy(self):
+        self.load_all()
+        trace = InstructionTrace()
+        trace.opcode_names = list(self.opcode_names)
+        trace.opcode_ids = dict(self.opcode_ids)
+        trace.operands = list(self.operands)
+        trace.operand_ids = dict(self.operand_ids)
+        trace.opcodes = array('B', self.opcodes)
+        trace.destinations = array('i', self.destinations)
+        trace.operands1 = array('i', self.operands1)
+        trace.operands2 = array('i', self.operands2)
+        return trace
+
+    def opcode_id(self, opcode):
+        opcode_id = self.opcode_ids.get(opcode)
+        if opcode_id == None:
+            opcode_id = len(self.opcode_names)
+            self.opcode_names.append(opcode)
+            self.opcode_ids[opcode] = opcode_id
+        return opcode_id
+
+    def operand_id(self, operand):
+        operand_id = self.operand_ids.get(operand)
+        if operand_id == None:
+            operand_id = len(self.operands)
+            self.operands.append(operand)
+            self.operand_ids[operand] = operand_id
+        return operand_id
+
+    def append(self, opcode, destination, operand1, operand2):
+        self.opcodes.append(self.opcode_id(opcode))
+        self.destinations.append(self.operand_id(destination))
+        self.operands1.append(self.operand_id(operand1))
+        self.operands2.append(self.operand_id(operand2))
+
+    # Block copy of bytes-like columns already numbered with opcode_id and operand_id:
+    # unsigned 8-bit opcodes and 32-bit operands (e.g. NumPy uint8/int32 arrays). Returns the count added.
+    def extend_columns(self, opcodes, destinations, operands1, operands2):
+        opcodes, destinations, operands1, operands2 = [memoryview(column).cast("B") for column in (opcodes, destinations, operands1, operands2)]
+        count = len(opcodes)
+        for column, values in ((self.destinations, destinations), (self.operands1, operands1), (self.operands2, operands2)):
+            if len(values) != count * column.itemsize:
+                raise ValueError("Instruction columns must have the same length and the trace's item sizes")
+        self.opcodes.frombytes(opcodes)
+        self.destinations.frombytes(destinations)
+        self.operands1.frombytes(operands1)
+        self.operands2.frombytes(operands2)
+        return count
+
 ############################################################################
 # Class: InstructionQueue
 #
@@ -112,54 +237,68 @@ class Instruction:
 #   queue; that same information is used later on to make scheduling decisions.
 #
 # Underlying Implmentation:
-#   Singly Linked List
+#   An InstructionTrace plus the results of one run over it
 #
-#   Note: The nodes are the instructions themselves,
-#         and each one holds a pointer to the next instruction.
+#   Note: The queue only owns its position and its timing columns, which
+#         grow as instructions are dequeued, so clone() gives a fresh queue
+#         over the same trace in constant time. A queue that enqueues into
+#         a trace other queues share first takes a private copy of it.
+#         Rows of a trace streamed from a source of unknown length join
+#         the queue as they are read (see count_streamed_rows).
 #
 # Private Data Members:
-#     Instruction * head - pointer to the first instruction in the queue.
-#                          head = None when the queue is empty.
+#     InstructionTrace * trace - the instructions of the queue.
+#     int end                  - number of trace rows counted in the queue.
 #
-#     Instruction * tail - pointer to the last instruction in the queue.
-#                          tail = None when the queue is empty.
+#     array issued_cycles, execute_start_cycles,
+#           execute_end_cycles, write_back_cycles - one entry per
+#                                                   dequeued instruction.
+#
+#     int head - row of the first instruction in the queue.
 #
 #     int length - count of instructions currently in the queue.
 #                  length = 0 when the queue is empty.
 #
-#     Instruction * pseudo_head - represents the virtual start of the
-#                                 queue, so that previous instructions are
-#                                 still accessible for execution history.
+#     int pseudo_head - represents the virtual start of the
+#                       queue, so that previous instructions are
+#                       still accessible for execution history.
 #
 # Public Interface/Methods:
 #
-# __init__, __str__, is_empty, get_length, enqueue, dequeue, soft_dequeue
+# __init__, __str__, __iter__, is_empty, get_length, clone, enqueue, enqueue_columns, dequeue, soft_dequeue
 #
 ############################################################################
 class InstructionQueue: 
-    def __init__(self):
-        self.head = None 
-        self.tail = None
-        self.length = 0
-        self.soft_length = 0
-        self.pseudo_head = None
+    def __init__(self, trace = None):
+        if trace is None:
+            trace = InstructionTrace()
+        else:
+            trace.shared = True
+        self.trace = trace
+        self.issued_cycles = array('i')
+        self.execute_start_cycles = array('i')
+        self.execute_end_cycles = array('i')
+        self.write_back_cycles = array('i')
+        self.head = 0
+        self.end = len(trace)
+        self.length = len(trace)
+        self.soft_length = len(trace)
+        self.pseudo_head = 0
 
     def __str__(self):
-        instructions = "" 
-        current = self.head
-        while current:
-            #instruction = []
-            #instructions += current.opcode + " | "
-            #              + current.destination.get_name() + " | "
-            #              + current.operand1.get_name() + " | "
-            #              + current.operand2.get_name() + " | "
-            #              + str(current.get_issued_cycle()) + " | "
-            #              + str(current.get_execute_start_cycle()) + " | "
-            #              + str(current.get_execute_end_cycle()) + " | "
-            #              + str(current.get_write_back_cycle()) + "\n"
-            instructions += str(current) + "\n"
-            current = current.next
-        return instructions
+        return "".join(str(instruction) + "\n" for instruction in self)
+
+    # Instructions from the head of the queue to its end, including the ones already soft dequeued.
+    def __iter__(self):
+        index = self.head
+        while index < self.end or self.trace.source is not None:
+            if index == self.end:
+                self.count_streamed_rows()
+                if index == self.end:
+                    break
+            self.trace.load(index)
+            yield Instruction(self, index)
+            index += 1
 
     ###########################################################
     # InstructionQueue State/Status Methods
@@ -173,18 +312,57 @@ class InstructionQueue:
     #
     ###########################################################
     def is_empty(self):
+        if self.soft_length == 0:
+            self.count_streamed_rows()
         return self.soft_length == 0
 
     def get_length(self):
         return self.soft_length
 
+    # A new queue, not yet run, over the same instructions as this one. Constant time.
+    def clone(self):
+        return InstructionQueue(self.trace)
+
+    def writable_trace(self):
+        if self.trace.shared == True:
+            self.trace = self.trace.copy()
+        self.trace.load_all() # new rows go after the ones still to be streamed in
+        self.count_streamed_rows()
+        return self.trace
+
+    # Adds the trace rows past 'end' to the queue, reading the next chunk of a streamed trace if needed.
+    def count_streamed_rows(self):
+        self.trace.load(self.end)
+        added = len(self.trace) - self.end
+        self.end += added
+        self.length += added
+        self.soft_length += added
+
+    def opcode_id(self, opcode):
+        return self.writable_trace().opcode_id(opcode)
+
+    def operand_id(self, operand):
+        return self.writable_trace().operand_id(operand)
+
+    def get_timing(self, column, index):
+        return column[index] if index < len(column) else 0
+
+    # Makes sure the timing columns have a row for instruction 'index'.
+    def extend_timings(self, index):
+        missing = index + 1 - len(self.issued_cycles)
+        if missing > 0:
+            zeros = bytes(missing * self.issued_cycles.itemsize)
+            self.issued_cycles.frombytes(zeros)
+            self.execute_start_cycles.frombytes(zeros)
+            self.execute_end_cycles.frombytes(zeros)
+            self.write_back_cycles.frombytes(zeros)
+
     ###########################################################
     #
     # Method: enqueue
     #
-    # Creates a new Instruction and inserts it at the end of
-    # the queue or at the head of the queue when the
-    # InstructionQueue is empty.
+    # Appends a new row for the instruction to the end of the
+    # queue's trace.
     #
     # Parameters:
     #     InstructionQueue * self
@@ -195,36 +373,55 @@ class InstructionQueue:
     #
     # Returns: Does not return anything.
     #
-    # Complexity: Constant - O(1)
-    #   It will always take a maximum of 2 to 3 operations
-    #   to queue an instruction.
-    #   (i.e., set the head, tail, and length)
+    # Complexity: Constant - O(1) amortized
+    #   One append to each column, plus a dictionary lookup
+    #   for the opcode and each operand.
     #
     ###########################################################
     def enqueue(self, opcode, destination, operand1, operand2):
-        new_instruction = Instruction(opcode, destination, operand1, operand2)
-        
-        if self.tail is not None:
-            self.tail.next = new_instruction
-            
-        self.tail = new_instruction
-        
-        if self.head is None:
-            self.head = new_instruction
-            self.pseudo_head = new_instruction
+        self.writable_trace().append(opcode, destination, operand1, operand2)
             
+        self.end += 1
         self.length += 1
         self.soft_length +=1
 
+    ###########################################################
+    #
+    # Method: enqueue_columns
+    #
+    # Appends many instructions at once from columns that are
+    # already numbered with this queue's opcode_id and
+    # operand_id, without creating any Python object per
+    # instruction.
+    #
+    # Parameters:
+    #     InstructionQueue * self
+    #     opcodes      - bytes-like column of unsigned 8-bit opcode numbers
+    #     destinations, operands1, operands2
+    #                  - bytes-like columns of 32-bit operand numbers
+    #                    (e.g. NumPy uint8/int32 arrays)
+    #
+    # Returns: Does not return anything.
+    #
+    # Complexity: Linear in the number of instructions added,
+    #   as block copies.
+    #
+    ###########################################################
+    def enqueue_columns(self, opcodes, destinations, operands1, operands2):
+        count = self.writable_trace().extend_columns(opcodes, destinations, operands1, operands2)
+        self.end += count
+        self.length += count
+        self.soft_length += count
+
     ###########################################################
     #
     # Method: dequeue
     #
     #     Shifts out the instruction waiting at the front of the
-    # queue and then points the 'pseudo_head' to the next
-    # instruction in the queue. Old instructions are retained
-    # until explicity flushed, so that instruction history can
-    # be used for later analysis and scheduling decisions.
+    # queue and then moves the 'head' to the next instruction
+    # in the queue. The rows stay in the columns, so that
+    # instruction history can be used for later analysis and
+    # scheduling decisions.
     #
     # Parameters:
     #     InstructionQueue * self
@@ -232,20 +429,16 @@ class InstructionQueue:
     # Returns: Instruction at the front of the queue or 'None'.
     #
     # Complexity: Constant - O(1)
-    #   It will always take a maximum of 2 to 3 operations
-    #   to dequeue an instruction.
-    #   (i.e., set the head, tail, and length)
     #
     ###########################################################
     def dequeue(self): 
         if self.is_empty():
             return "Instruction queue is empty"
         
-        instruction = self.head
-        self.head = self.head.next
-        
-        if self.head is None:
-            self.tail = None
+        instruction = Instruction(self, self.head)
+        self.trace.load(self.head)
+        self.extend_timings(self.head)
+        self.head += 1
             
         self.length -= 1
         
@@ -266,18 +459,26 @@ class InstructionQueue:
     # Parameters:
     #     InstructionQueue * self
     #
-    # Returns: Does not return anything.
+    # Returns: Instruction at the virtual head of the queue.
     #
     ###########################################################
     def soft_dequeue(self): 
         if self.is_empty():
             return "Instruction queue is empty"
         
-        instruction = self.pseudo_head
-        self.pseudo_head = instruction.next
+        instruction = Instruction(self, self.pseudo_head)
+        self.trace.load(self.pseudo_head)
+        self.extend_timings(self.pseudo_head)
+        self.pseudo_head += 1
         self.soft_length -= 1 # length also needs to be controlled by soft_dequeue to mimic dequeue even though its not accurate
         
         return instruction
+
+    # Moves the virtual head back to row 'index', so that the instructions from there on are soft dequeued
+    # again (after a branch misprediction flush).
+    def rewind(self, index):
+        self.soft_length += self.pseudo_head - index
+        self.pseudo_head = index
     
     
 ############################################################################
@@ -341,8 +542,6 @@ class InstructionQueue:
 #     bool busy - indicates if this ReservationStation is deployed with an instruction.
 #     int busy_cycles - number of clock cycles the ReservationStation has had the current instruction.
 #     int executing_cycles - number of clock cycles spent executing the instruction in this ReservationStation
-#     float busy_fraction - fraction of entire program that the given instruction was in a ReservationStation
-#     float executing_fraction - fraction of entire program that the given instruction was executing.
 #     Instruction * instruction_pointer - A handle to the instruction occupying this Reservation station, so that
 #                                         its start/end execution and write-back cycles can be modified.
 #
@@ -363,10 +562,9 @@ class ReservationStation:
         self.source = source
         self.source_buffer = None
         self.busy = busy
+        self.latency = None # full execution time of the current instruction, to recognise its first execute cycle
         self.busy_cycles = 0 # update while waiting/executing
         self.executing_cycles = 0 # only update while executing
-        self.busy_fraction = 0
-        self.executing_fraction = 0
         self.instruction_pointer = instruction_pointer # points to instruction in order to modify its start/end execution cycle and write back cycle
 
     def get_time(self):
@@ -429,6 +627,16 @@ class ReservationStation:
     def is_ready(self):
         return self.time == 0
 
+    def is_waiting(self):
+        return self.qj != None or self.qk != None or self.source_buffer != None
+
+    # Fractions of the first clock_cycle cycles the station was busy/executing, computed from the counters on demand.
+    def get_busy_fraction(self, clock_cycle):
+        return self.busy_cycles/clock_cycle if clock_cycle != 0 else 0
+
+    def get_executing_fraction(self, clock_cycle):
+        return self.executing_cycles/clock_cycle if clock_cycle != 0 else 0
+
     def set_busy_status(self, status):
         self.busy = status
 
@@ -457,7 +665,8 @@ class ReservationStation:
 # Private Data Members:
 #
 #     String name - Unique name of the LoadBuffer
-#     uint16 address - Memory location to Load value from or Store value into.
+#     (offset, Register *) address - Memory location to Load value from or Store value into,
+#                                    formatted as "offset base" only for display (see format_address).
 #     time - amount of time an instruction will take to execute once dispatched.
 #     op   - instruction's opcode
 #     Register * source   - First operand of the instruction in this load buffer.
@@ -475,8 +684,6 @@ class ReservationStation:
 #     bool busy - indicates if this LoadBuffer is deployed with an instruction.
 #     int busy_cycles - number of clock cycles the LoadBuffer has had the current instruction.
 #     int executing_cycles - number of clock cycles spent executing the instruction in this LoadBuffer
-#     float busy_fraction - fraction of entire program that the given instruction was in a LoadBuffer
-#     float executing_fraction - fraction of entire program that the given instruction was executing
 #     Instruction * instruction_pointer - A handle to the instruction occupying this load buffer, so that
 #                                         its start/end execution and write-back cycles can be modified.
 #
@@ -501,10 +708,9 @@ class LoadBuffer:
         self.time = time
         self.vj = vj
         self.qj = qj
+        self.latency = None # full execution time of the current instruction, to recognise its first execute cycle
         self.busy_cycles = 0
         self.executing_cycles = 0
-        self.busy_fraction = 0
-        self.executing_fraction = 0
         self.instruction_pointer = instruction_pointer # points to instruction in order to modify its start/end execution cycle and write back cycle
 
     def get_name(self):
@@ -514,7 +720,7 @@ class LoadBuffer:
         return self.busy
 
     def get_address(self):
-        return self.address
+        return format_address(self.address)
 
     def get_op(self):
         return self.op
@@ -564,9 +770,25 @@ class LoadBuffer:
     def set_instruction_pointer(self, instruction):
         self.instruction_pointer = instruction
 
+    def is_waiting(self):
+        return self.qj != None or self.source_buffer != None
+
+    # Fractions of the first clock_cycle cycles the station was busy/executing, computed from the counters on demand.
+    def get_busy_fraction(self, clock_cycle):
+        return self.busy_cycles/clock_cycle if clock_cycle != 0 else 0
+
+    def get_executing_fraction(self, clock_cycle):
+        return self.executing_cycles/clock_cycle if clock_cycle != 0 else 0
+
     def __str__(self):
-        return (f"Clock Cycles Remaining: {self.time} | Name: {self.name} | Busy: {self.busy} | Op: {self.op} | Source: {self.get_source().get_name() if self.get_source() != None else None} | Source Buffer: {self.get_source_buffer().get_name() if self.get_source_buffer() != None else None} | Address: {self.address}")
+        return (f"Clock Cycles Remaining: {self.time} | Name: {self.name} | Busy: {self.busy} | Op: {self.op} | Source: {self.get_source().get_name() if self.get_source() != None else None} | Source Buffer: {self.get_source_buffer().get_name() if self.get_source_buffer() != None else None} | Address: {format_address(self.address)}")
         
+# Display form "offset base" of a load/store address kept as an (offset, base Register) pair.
+def format_address(address):
+    if address is None:
+        return None
+    return str(address[0]) + " " + address[1].get_name()
+
 ##############################################################################################################
 # Class: Register
 #
@@ -586,6 +808,8 @@ class LoadBuffer:
 #                       If this is set to None, then it implies that the relevant
 #                       value is in the Register file.
 #     bool write_back - flag to indicate that a register 
+#     int index       - Position of the Register in the simulator's register file,
+#                       numbered by the Tomasulo class so that it can index arrays.
 #
 # Public Interface/Methods:
 #     __init__ - Constructs a new Register
@@ -593,7 +817,7 @@ class LoadBuffer:
 #
 #     Accessor Methods:
 #       RO (get_X):       name
-#       RW ({get|set}_X): buffer, write_back
+#       RW ({get|set}_X): buffer, write_back, index
 #
 ##############################################################################################################
 class Register:
@@ -601,10 +825,17 @@ class Register:
         self.name = name
         self.buffer = buffer # should be a reservation station/ load buffer
         self.write_back = True
+        self.index = None
 
     def get_name(self):
         return self.name
 
+    def get_index(self):
+        return self.index
+
+    def set_index(self, index):
+        self.index = index
+
     def get_buffer(self):
         return self.buffer
 
@@ -620,348 +851,1851 @@ class Register:
     def __str__(self):
         return(f"Register: {self.name} | Buffer Station: {self.buffer.get_name() if self.buffer != None else None}")
 
-class Tomasulo:
-    def __init__(self, instruction_queue, num_fp_add, num_fp_mult, num_loadstore, registers, opcodes, dispatch_size, verbose_mode, latencies = None):
-        ####################################################################
-        # Initialize the instruction queue for incoming instructions
-        ####################################################################
-        self.instruction_queue = instruction_queue
-
-        ####################################################################
-        # Initialize the functional unit buffers within the Execution Unit.
-        ####################################################################
-        self.num_fp_add = num_fp_add
-        self.num_fp_mult = num_fp_mult
-        self.num_loadstore = num_loadstore
-        self.fp_adders = {}
-        self.fp_multipliers = {}
-        self.loadbuffers = {}
+##############################################################################################################
+# Class: StationPool
+#
+# Purpose:
+#
+#   Free-list of the idle Reservation Stations (or Load Buffers) of one functional unit class, kept as a
+#   bitmap with one bit per station. Allocation hands out the lowest numbered idle station - the same one a
+#   scan over the stations in order would find - and allocation and release both take constant time
+#   regardless of how many stations are configured.
+#
+#   The pool also keeps the active sets of its class: the busy stations and, among them, the stations that
+#   wait for a register in qj, qk or their source buffer. The simulator iterates these instead of every
+#   configured station, so the work per cycle follows the number of instructions in flight.
+#
+# Private Data Members:
+#     list stations - the stations of the pool, in order.
+#     dict index    - position of each station in 'stations'.
+#     int free      - bit i is set while stations[i] is idle.
+#     dict busy     - busy stations, in the order they were allocated (used as an ordered set).
+#     dict waiting  - busy stations waiting for a register (used as an ordered set).
+#     int busy_cycles, executing_cycles - busy/executing clock cycles summed over the stations of the pool.
+#     FunctionalUnits units - units shared by the stations, None when every station executes on its own.
+#
+# Public Interface/Methods:
+#     allocate - takes the lowest numbered idle station out of the pool, or returns None if all are busy.
+#     release  - returns a station to the pool.
+#     update_waiting - adds a station to, or removes it from, the waiting set after its qj/qk/source buffer changed.
+#     has_free, num_busy
+#
+##############################################################################################################
+class StationPool:
+    def __init__(self, stations):
+        self.stations = list(stations)
+        self.index = {station: position for position, station in enumerate(self.stations)}
+        self.free = (1 << len(self.stations)) - 1
+        self.busy = {}
+        self.waiting = {}
+        self.busy_cycles = 0
+        self.executing_cycles = 0
+        self.units = None
+
+    def allocate(self):
+        if self.free == 0:
+            return None
+        lowest = self.free & -self.free
+        self.free ^= lowest
+        station = self.stations[lowest.bit_length() - 1]
+        self.busy[station] = None
+        return station
+
+    def release(self, station):
+        self.free |= 1 << self.index[station]
+        del self.busy[station]
+        self.waiting.pop(station, None)
+
+    def update_waiting(self, station):
+        if station.is_waiting() == True:
+            self.waiting[station] = None
+        else:
+            self.waiting.pop(station, None)
 
-        for esh in range(self.num_fp_add):
-            self.fp_adders["ADD" + str(esh + 1)] = ReservationStation("ADD" + str(esh + 1))
-        for esh in range(self.num_fp_mult):
-            self.fp_multipliers["MULT" + str(esh + 1)] = ReservationStation("MULT" + str(esh + 1))
-        for esh in range(self.num_loadstore):
-            self.loadbuffers["LOAD/STORE" + str(esh + 1)] = LoadBuffer("LOAD/STORE" + str(esh + 1))
+    def has_free(self):
+        return self.free != 0
 
-        self.registers = registers
-        self.dispatch_size = int(dispatch_size)
-        self.verbose_mode = verbose_mode
-        self.latencies = latencies
-        self.parameters = [num_fp_add, num_fp_mult, num_loadstore, len(registers), instruction_queue.length, dispatch_size]
-        self.clock_cycle = 0
-        self.output = []
+    def num_busy(self):
+        return len(self.busy)
 
-        ###########################################################################################
-        # Obtain the execution time/latency (in clock-cycles) for each instruction either
-        # from the user or from the latencies table.
-        ###########################################################################################
-        self.instruction_latency = {}
-        if self.latencies == None:
-            for opcode in opcodes:
-                latency = None
-                while type(latency) != type(1):
-                    latency = int(input("Enter latency for " + opcode + ":"))
-                self.instruction_latency[opcode] = latency
-        else:
-            for opcode in opcodes:
-                self.instruction_latency[opcode] = self.latencies[opcode]
-                
-    #######################################################################
-    #
-    # CPU Clock Cycle Management
-    #
-    #######################################################################
-        
-    def increment_clock_cycle(self):
-        self.clock_cycle += 1
+##############################################################################################################
+# Class: FunctionalUnits
+#
+# Purpose:
+#
+#   The execution units shared by the stations of a StationPool: 'count' pipelined units, each accepting a
+#   new operation once the initiation interval of the previous one has passed (1 for a fully pipelined unit,
+#   the latency for an unpipelined one). A station holding a ready instruction starts executing only when
+#   a unit accepts it; its latency then runs down as before.
+#
+# Private Data Members:
+#     int count
+#     list free_at       - heap of the cycle from which each unit accepts again.
+#     int accepted       - operations started.
+#     int issue_cycles   - initiation intervals of the operations started, summed.
+#     int stalls         - station-cycles spent waiting for a unit.
+#
+# Public Interface/Methods:
+#     acquire(clock_cycle, interval) - starts an operation on a free unit; False when none is free.
+#     next_free()                    - first cycle in which a unit accepts.
+#     statistics(clock_cycle)
+#
+##############################################################################################################
+class FunctionalUnits:
+    def __init__(self, count):
+        if count < 1:
+            raise ValueError("A functional unit class needs at least one unit")
+        self.count = count
+        self.free_at = [0] * count
+        self.accepted = 0
+        self.issue_cycles = 0
+        self.stalls = 0
+
+    def acquire(self, clock_cycle, interval):
+        if self.free_at[0] > clock_cycle:
+            return False
+        heapq.heapreplace(self.free_at, clock_cycle + interval)
+        self.accepted += 1
+        self.issue_cycles += interval
+        return True
 
-    def get_clock_cycle(self):
-        return self.clock_cycle
+    def next_free(self):
+        return self.free_at[0]
 
-    #######################################################################
-    #
-    # Methods to Display the internal state of the Execution Unit or
-    # convert the internal state of the Execution to a string.
-    #
-    #######################################################################
+    def statistics(self, clock_cycle):
+        return {"units": self.count, "accepted": self.accepted, "stalls": self.stalls,
+                "utilization": self.issue_cycles/(self.count * clock_cycle) if clock_cycle != 0 else 0}
 
-    def display_adders(self):
-        for name, rs in self.fp_adders.items():
-            print("Reservation Station: " + name + " ", rs,  " Busy Utilization: " + str(rs.busy_fraction) + " | Execution Utilization: " + str(rs.executing_fraction))
+##############################################################################################################
+# Class: Cache
+#
+# Purpose:
+#
+#   A set-associative data cache with LRU replacement, giving the latency of every access: hit_latency
+#   when the line of the address is cached, miss_latency otherwise. A miss allocates the line, evicting the
+#   least recently used line of the set when all 'ways' are taken. Each set is a dict of the cached tags in
+#   LRU order (oldest first), so a lookup, an LRU update and an eviction all take constant time.
+#
+# Private Data Members:
+#     int sets, ways, line_size
+#     int hit_latency, miss_latency
+#     list lines      - per set, dict of the cached tags in LRU order.
+#     int hits, misses, evictions
+#
+# Public Interface/Methods:
+#     access(address) - looks up (and allocates) the line of an address; returns the access latency.
+#     statistics()
+#
+##############################################################################################################
+class Cache:
+    def __init__(self, sets = 64, ways = 4, line_size = 64, hit_latency = 1, miss_latency = 20):
+        if sets < 1 or ways < 1 or line_size < 1:
+            raise ValueError("A cache needs at least one set, one way and a line size of at least one")
+        if hit_latency < 1 or miss_latency < hit_latency:
+            raise ValueError("The cache hit latency must be at least 1 and the miss latency at least the hit latency")
+        self.sets = sets
+        self.ways = ways
+        self.line_size = line_size
+        self.hit_latency = hit_latency
+        self.miss_latency = miss_latency
+        self.lines = [{} for set_index in range(sets)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def access(self, address):
+        line = address // self.line_size
+        tags = self.lines[line % self.sets]
+        tag = line // self.sets
+        if tag in tags:
+            del tags[tag] # re-inserted as the most recently used
+            tags[tag] = None
+            self.hits += 1
+            return self.hit_latency
+        if len(tags) == self.ways:
+            del tags[next(iter(tags))]
+            self.evictions += 1
+        tags[tag] = None
+        self.misses += 1
+        return self.miss_latency
+
+    def statistics(self):
+        accesses = self.hits + self.misses
+        return {"sets": self.sets, "ways": self.ways, "line_size": self.line_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits/accesses if accesses != 0 else 0}
 
-    def display_multipliers(self):
-        for name, rs in self.fp_multipliers.items():
-            print("Reservation Station: " + name + " ", rs, " Busy Utilization: " + str(rs.busy_fraction) + " | Execution Utilization: " + str(rs.executing_fraction))
+##############################################################################################################
+# Class: MemorySystem
+#
+# Purpose:
+#
+#   Memory model of the Load Buffers. Every load and store gets a numeric effective address at issue: its
+#   offset plus the value of its base register, taken from base_addresses (register name -> value, 0 for
+#   the others, since the simulator does not compute register values).
+#
+#   With store_buffer, the stores in flight are kept in a store buffer indexed by address, and loads are
+#   ordered against them (memory disambiguation):
+#     * A store's address is known once it starts executing. A load does not start while an older store
+#       has not, since it might write the load's address.
+#     * A load from the address of an older store in flight takes the value of the youngest such store
+#       (store-to-load forwarding) in forward_latency cycles, once that store has finished executing,
+#       instead of accessing memory.
+#   A store leaves the buffer and writes memory when it writes back.
+#
+#   With a Cache, loads that access memory take its hit or miss latency instead of the fixed LDDD latency,
+#   and stores allocate their line when they write memory. Program order is the issue order, numbered by
+#   'sequence'. Lookups go through dicts keyed by station and address, so they stay cheap with thousands of
+#   memory operations in flight.
+#
+# Private Data Members:
+#     Cache * cache          - None to keep the fixed latencies.
+#     bool store_buffer
+#     int forward_latency
+#     dict base_addresses    - register name -> base address value.
+#     list bases             - base address value per register number (see bind).
+#     int sequence           - issue number of the next memory operation.
+#     dict operations        - station -> (sequence, address, is store) of its memory operation.
+#     dict unresolved        - sequence -> station of the stores that have not started (address unknown).
+#     list unresolved_order  - heap of those sequences; entries of stores that started are dropped lazily.
+#     dict stores            - address -> {sequence: station} of the started stores in the store buffer.
+#     int in_flight_stores   - stores issued and not yet written back or flushed.
+#     int loads, store_count - loads and stores issued, flushed ones included.
+#     int forwarded          - loads that took their value from the store buffer.
+#     int max_stores         - most stores in flight at once.
+#     String blocked         - STALL_* reason of the last load start() refused.
+#     dict stalls            - station-cycles loads waited for each STALL_* reason.
+#
+# Public Interface/Methods:
+#     bind(register_file)          - resolves base_addresses to register numbers.
+#     issue(station, offset, base, store)
+#     start(station, latency)      - execution latency of the operation, or None while a load must wait
+#                                    (the reason is left in 'blocked').
+#     retire(station)              - the operation wrote back.
+#     cancel(station)              - the operation was flushed.
+#     statistics()
+#
+##############################################################################################################
+class MemorySystem:
+    STALL_DISAMBIGUATION = "disambiguation" # an older store's address is not known yet
+    STALL_FORWARDING = "forwarding" # the older store to the same address has not finished executing
+
+    def __init__(self, cache = None, store_buffer = True, forward_latency = 1, base_addresses = None):
+        if forward_latency < 1:
+            raise ValueError("The store forwarding latency must be at least 1")
+        self.cache = cache
+        self.store_buffer = store_buffer
+        self.forward_latency = forward_latency
+        self.base_addresses = dict(base_addresses) if base_addresses is not None else {}
+        self.bases = []
+        self.sequence = 0
+        self.operations = {}
+        self.unresolved = {}
+        self.unresolved_order = []
+        self.stores = {}
+        self.blocked = None
+        self.loads = 0
+        self.store_count = 0
+        self.forwarded = 0
+        self.in_flight_stores = 0
+        self.max_stores = 0
+        self.stalls = {self.STALL_DISAMBIGUATION: 0, self.STALL_FORWARDING: 0}
+
+    def bind(self, register_file):
+        self.bases = [int(self.base_addresses.get(register.get_name(), 0)) for register in register_file]
+
+    def issue(self, station, offset, base, store):
+        self.operations[station] = (self.sequence, offset + self.bases[base.index], store)
+        if store == True:
+            self.store_count += 1
+            if self.store_buffer == True:
+                self.unresolved[self.sequence] = station
+                heapq.heappush(self.unresolved_order, self.sequence)
+                self.in_flight_stores += 1
+                self.max_stores = max(self.max_stores, self.in_flight_stores)
+        else:
+            self.loads += 1
+        self.sequence += 1
+
+    def start(self, station, latency):
+        sequence, address, store = self.operations[station]
+        if store == True:
+            if self.store_buffer == True:
+                del self.unresolved[sequence]
+                self.stores.setdefault(address, {})[sequence] = station
+            return latency
+        if self.store_buffer == True:
+            order = self.unresolved_order
+            while len(order) > 0 and order[0] not in self.unresolved:
+                heapq.heappop(order)
+            if len(order) > 0 and order[0] < sequence:
+                self.blocked = self.STALL_DISAMBIGUATION
+                return None
+            buffered = self.stores.get(address)
+            if buffered is not None:
+                older = [store_sequence for store_sequence in buffered if store_sequence < sequence]
+                if len(older) > 0:
+                    if buffered[max(older)].get_time() != 0:
+                        self.blocked = self.STALL_FORWARDING
+                        return None
+                    self.forwarded += 1
+                    return self.forward_latency
+        if self.cache is not None:
+            return self.cache.access(address)
+        return latency
+
+    def retire(self, station):
+        sequence, address, store = self.operations.pop(station)
+        if store == True:
+            self.remove_store(sequence, address)
+            if self.cache is not None:
+                self.cache.access(address)
+
+    def cancel(self, station):
+        operation = self.operations.pop(station, None)
+        if operation is not None and operation[2] == True:
+            self.unresolved.pop(operation[0], None)
+            self.remove_store(operation[0], operation[1])
+
+    def remove_store(self, sequence, address):
+        if self.store_buffer == True:
+            self.in_flight_stores -= 1
+        buffered = self.stores.get(address)
+        if buffered is not None and buffered.pop(sequence, None) is not None and len(buffered) == 0:
+            del self.stores[address]
+
+    def statistics(self):
+        statistics = {"loads": self.loads, "stores": self.store_count, "forwarded": self.forwarded, "max_stores": self.max_stores,
+                      "disambiguation_stalls": self.stalls[self.STALL_DISAMBIGUATION], "forwarding_stalls": self.stalls[self.STALL_FORWARDING]}
+        if self.cache is not None:
+            statistics["cache"] = self.cache.statistics()
+        return statistics
 
-    def display_loadbuffers(self):
-        for name, lb in self.loadbuffers.items():
-            print("Load/Store Buffer: " + name + " ", lb, " Busy Utilization: " + str(lb.busy_fraction) + " | Execution Utilization: " + str(lb.executing_fraction))
+##############################################################################################################
+# Class: UtilizationWindow
+#
+# Purpose:
+#
+#   Utilization of each functional unit class over the last 'size' clock cycles, for time-resolved
+#   utilization of long runs. The running busy/executing totals of the StationPools are kept in a ring
+#   buffer with one slot per cycle, so recording a cycle and reading the window take constant time.
+#   Every 'size' cycles the window is also appended to 'curve'.
+#
+# Private Data Members:
+#     int size         - window length in clock cycles.
+#     list names       - name of each functional unit class.
+#     list pools       - StationPool of each class.
+#     array ring       - (busy, executing) totals of every class at each of the last size + 1 cycles,
+#                        the slot of cycle c starting at (c % (size + 1)) * 2 * len(pools).
+#     int clock_cycle  - last recorded cycle.
+#     list totals      - totals at clock_cycle.
+#     list curve       - [cycle, utilizations] every 'size' cycles (see utilizations).
+#
+# Public Interface/Methods:
+#     record       - records the totals at a clock cycle. Cycles skipped since the last call are filled in:
+#                    nothing but execution countdowns happens in them, so the totals grow linearly.
+#     utilizations - [name, busy fraction, executing fraction] of every class over the window.
+#
+##############################################################################################################
+class UtilizationWindow:
+    def __init__(self, size, names, pools):
+        if size < 1:
+            raise ValueError("The utilization window must be at least one cycle")
+        self.size = size
+        self.names = list(names)
+        self.pools = list(pools)
+        self.ring = array('q', [0]) * ((size + 1) * 2 * len(self.pools))
+        self.clock_cycle = 0
+        self.totals = [0] * (2 * len(self.pools))
+        self.curve = []
+
+    def record(self, clock_cycle):
+        totals = []
+        for pool in self.pools:
+            totals.append(pool.busy_cycles)
+            totals.append(pool.executing_cycles)
+        previous_cycle = self.clock_cycle
+        previous = self.totals
+        gap = clock_cycle - previous_cycle
+
+        def totals_at(cycle):
+            if cycle >= previous_cycle:
+                return [old + (new - old) * (cycle - previous_cycle) // gap for old, new in zip(previous, totals)]
+            return self.slot(cycle)
+
+        for boundary in range((previous_cycle // self.size + 1) * self.size, clock_cycle + 1, self.size):
+            self.curve.append([boundary, self.fractions(totals_at(boundary - self.size), totals_at(boundary), self.size)])
+        width = len(totals)
+        for cycle in range(max(previous_cycle + 1, clock_cycle - self.size), clock_cycle + 1):
+            start = (cycle % (self.size + 1)) * width
+            self.ring[start:start + width] = array('q', totals_at(cycle))
+        self.clock_cycle = clock_cycle
+        self.totals = totals
+
+    def slot(self, cycle):
+        width = len(self.totals)
+        start = (cycle % (self.size + 1)) * width
+        return list(self.ring[start:start + width])
+
+    def fractions(self, start, end, cycles):
+        utilizations = []
+        for index, name in enumerate(self.names):
+            stations = len(self.pools[index].stations)
+            if cycles == 0 or stations == 0:
+                utilizations.append([name, 0, 0])
+            else:
+                utilizations.append([name, (end[2 * index] - start[2 * index])/(cycles * stations), (end[2 * index + 1] - start[2 * index + 1])/(cycles * stations)])
+        return utilizations
 
-    def display_registers(self):
-        for register in self.registers.values():
-            print(register)
+    def utilizations(self):
+        cycles = min(self.clock_cycle, self.size)
+        return self.fractions(self.slot(self.clock_cycle - cycles), self.totals, cycles)
 
-    def return_adders_string(self):
-        output = ""
-        for name, rs in self.fp_adders.items():
-            output += str("Reservation Station: " + name + " " + str(rs) +  " Busy Utilization: " + str(rs.busy_fraction) + " | Execution Utilization: " + str(rs.executing_fraction))
-            output += "\n"
-        return output
+##############################################################################################################
+# Class: RenameTable
+#
+# Purpose:
+#
+#   Register renaming onto a physical register file. Every instruction that writes a register is given a free
+#   physical register, and the map table sends the later readers of the architectural register to it. Each
+#   value then lives in its own register, so write-after-read and write-after-write hazards no longer hold up
+#   issue: an instruction waits only for the physical registers it reads (true dependencies), or for a free
+#   one when the free list is empty.
+#
+#   The physical register a write replaced is freed when the write retires (commits with a reorder buffer,
+#   writes back without one) - or, without a reorder buffer, once the value it held has been written back,
+#   if that happens later. A flush undoes the renames of the squashed instructions, youngest first.
+#
+# Private Data Members:
+#     list physical   - the physical Registers P0 .. P{size - 1}, numbered in order.
+#     dict registers  - physical register name -> Register, for snapshots and display.
+#     list map        - physical Register of each architectural register, by register number.
+#     deque free      - free physical Registers, the next one to be given out first.
+#     dict previous   - physical Register -> (architectural register number, physical Register it replaced)
+#                       for the writes that have not retired.
+#     dict deferred   - replaced physical Registers to free once their value has been written back.
+#     list written_back - physical Registers written back this cycle, whose readers wait a cycle (see settle).
+#     bool blocked    - the last issue attempt stalled for a free register.
+#     int renamed, stalls (issue attempts refused for want of a free register), min_free
+#
+# Public Interface/Methods:
+#     lookup(register)   - physical Register an architectural register maps to.
+#     has_free, next_free
+#     rename(register)   - maps an architectural register to the next free physical register.
+#     written(physical)  - the value of a physical register was written back.
+#     settle()           - called every cycle before write-back.
+#     retire(physical)   - the write to a physical register retired.
+#     undo(physical)     - the write to a physical register was flushed.
+#     statistics()
+#
+##############################################################################################################
+class RenameTable:
+    def __init__(self, register_file, size):
+        if size <= len(register_file):
+            raise ValueError(f"Renaming {len(register_file)} registers needs more than {len(register_file)} physical registers")
+        self.physical = [Register("P" + str(index)) for index in range(size)]
+        for index, register in enumerate(self.physical):
+            register.set_index(index)
+        self.registers = {register.get_name(): register for register in self.physical}
+        self.map = self.physical[:len(register_file)]
+        self.free = deque(self.physical[len(register_file):])
+        self.previous = {}
+        self.deferred = {}
+        self.written_back = []
+        self.blocked = False
+        self.renamed = 0
+        self.stalls = 0
+        self.min_free = len(self.free)
+
+    def lookup(self, register):
+        return self.map[register.index]
+
+    def has_free(self):
+        return len(self.free) > 0
+
+    def next_free(self):
+        return self.free[0]
+
+    def rename(self, register):
+        physical = self.free.popleft()
+        self.previous[physical] = (register.index, self.map[register.index])
+        self.map[register.index] = physical
+        self.renamed += 1
+        if len(self.free) < self.min_free:
+            self.min_free = len(self.free)
+        return physical
+
+    def written(self, physical):
+        self.written_back.append(physical)
+        if physical in self.deferred:
+            del self.deferred[physical]
+            self.free.append(physical)
+
+    def retire(self, physical):
+        replaced = self.previous.pop(physical)[1]
+        if replaced.get_buffer() == None:
+            self.free.append(replaced)
+        else: # its value is still being computed
+            self.deferred[replaced] = None
+
+    # Clears the write_back flags of the registers written back last cycle. Several stations read a physical
+    # register, so unlike the architectural ones no reader clears the flag for the others.
+    def settle(self):
+        for physical in self.written_back:
+            physical.set_write_back(True)
+        self.written_back.clear()
+
+    def undo(self, physical):
+        index, replaced = self.previous.pop(physical)
+        self.map[index] = replaced
+        self.free.appendleft(physical)
+
+    def statistics(self):
+        return {"physical_registers": len(self.physical), "renamed": self.renamed, "free_list_stalls": self.stalls,
+                "min_free": self.min_free}
 
-    def return_multipliers_string(self):
-        output = ""
-        for name, rs in self.fp_multipliers.items():
-            output += str("Reservation Station: " + name + " " + str(rs) +  " Busy Utilization: " + str(rs.busy_fraction) + " | Execution Utilization: " + str(rs.executing_fraction))
-            output += "\n"
-        return output
+##############################################################################################################
+# Class: ReorderBuffer
+#
+# Purpose:
+#
+#   In-order commit of the instructions the Tomasulo issued out of the instruction queue. Every issued
+#   instruction takes an entry at the tail; once written back it commits from the head, at most commit_width
+#   per cycle. Issue stalls while the buffer is full.
+#
+#   A branch whose prediction was wrong flushes every younger entry when it writes back. The trace only
+#   holds the path the program took, so the instructions issued after the branch stand in for the wrong path:
+#   they are squashed and issued again once the branch is resolved.
+#
+# Private Data Members:
+#     int size, commit_width
+#     deque entries        - [instruction, station, branch, physical] from oldest to youngest; branch is None,
+#                            or (label, taken, mispredicted) for a branch; physical is the physical Register
+#                            the instruction writes when registers are renamed (see RenameTable), else None.
+#     list mispredicted    - entries of the mispredicted branches in flight, oldest first.
+#     array commit_cycles  - commit cycle of each instruction, by queue row.
+#
+#     Statistics:
+#     int occupancy_cycles - entries in the buffer summed over every clock cycle.
+#     int max_occupancy, full_stalls (issue attempts refused because the buffer was full), committed,
+#         branches and mispredictions (of the committed branches, so a flushed branch issued again counts
+#         once), flushed_instructions and flush_cycles (cycles from the issue to the write-back of each
+#         mispredicted branch, during which the wrong path was being issued).
+#
+# Public Interface/Methods:
+#     is_full, is_empty, allocate, statistics
+#
+##############################################################################################################
+class ReorderBuffer:
+    def __init__(self, size, commit_width = 1):
+        if size < 1 or commit_width < 1:
+            raise ValueError("The reorder buffer size and commit width must be at least 1")
+        self.size = size
+        self.commit_width = commit_width
+        self.entries = deque()
+        self.mispredicted = []
+        self.commit_cycles = array('i')
+        self.occupancy_cycles = 0
+        self.max_occupancy = 0
+        self.full_stalls = 0
+        self.committed = 0
+        self.branches = 0
+        self.mispredictions = 0
+        self.flushed_instructions = 0
+        self.flush_cycles = 0
+
+    def is_full(self):
+        return len(self.entries) >= self.size
 
-    def return_loadbuffers_string(self):
-        output = ""
-        for name, lb in self.loadbuffers.items():
-            output += str("Load/Store Buffer: " + name + " " + str(lb) + " Busy Utilization: " + str(lb.busy_fraction) + " | Execution Utilization: " + str(lb.executing_fraction))
-            output += "\n"
-        return output
+    def is_empty(self):
+        return len(self.entries) == 0
+
+    def allocate(self, instruction, station, branch = None, physical = None):
+        entry = [instruction, station, branch, physical]
+        self.entries.append(entry)
+        if len(self.entries) > self.max_occupancy:
+            self.max_occupancy = len(self.entries)
+        if branch is not None and branch[2] == True:
+            self.mispredicted.append(entry)
+        return entry
+
+    def statistics(self, clock_cycle):
+        return {"size": self.size, "commit_width": self.commit_width, "committed": self.committed,
+                "average_occupancy": self.occupancy_cycles/clock_cycle if clock_cycle != 0 else 0,
+                "max_occupancy": self.max_occupancy, "full_stalls": self.full_stalls,
+                "branches": self.branches, "mispredictions": self.mispredictions,
+                "flushed_instructions": self.flushed_instructions, "flush_cycles": self.flush_cycles}
 
-    def return_registers_string(self):
-        output = ""
-        for register in self.registers.values():
-            output += str(register)
-            output += "\n"
-        return output
+##############################################################################################################
+# Branch predictors
+#
+#   A predictor is asked for the direction of every branch at issue (predict) and learns the outcome when the
+#   branch commits (update). Branches are told apart by the label of their target, standing in for the
+#   branch address, which a trace does not have. Any object with these two methods can be given to the
+#   Tomasulo; PREDICTORS names the built-in ones for sweeps and batch runs.
+#
+#   StaticPredictor  - always predicts the same direction.
+#   BimodalPredictor - a table of 2^table_bits 2-bit saturating counters indexed by a hash of the label;
+#                      counters start weakly not-taken.
+#
+##############################################################################################################
+class StaticPredictor:
+    def __init__(self, taken = False):
+        self.taken = taken
+
+    def predict(self, label):
+        return self.taken
+
+    def update(self, label, taken):
+        pass
+
+class BimodalPredictor:
+    def __init__(self, table_bits = 10):
+        self.mask = (1 << table_bits) - 1
+        self.counters = array('B', [1]) * (1 << table_bits)
+        self.slots = {}
+
+    def slot(self, label):
+        slot = self.slots.get(label)
+        if slot is None:
+            slot = zlib.crc32(label.encode("utf-8")) & self.mask # stable across processes, unlike hash()
+            self.slots[label] = slot
+        return slot
+
+    def predict(self, label):
+        return self.counters[self.slot(label)] >= 2
+
+    def update(self, label, taken):
+        slot = self.slot(label)
+        if taken == True:
+            self.counters[slot] = min(self.counters[slot] + 1, 3)
+        else:
+            self.counters[slot] = max(self.counters[slot] - 1, 0)
 
-    ###############################################################################
-    #
-    # Tomasulo Scheduling Algorithm for issuing instructions to the Execution Unit
-    #
-    ###############################################################################
-    def issue_instruction(self, instruction):
-        issued = False
-        opcode = instruction.get_opcode()
-        destination = instruction.get_destination()
-        operand1 = instruction.get_operand1()
-        operand2 = instruction.get_operand2()
+PREDICTORS = {"not-taken": lambda: StaticPredictor(False), "taken": lambda: StaticPredictor(True), "bimodal": BimodalPredictor}
 
-        # Get a list of the registers whose values are currently tied to buffers
-        registers = self.buffer_registers()
+##############################################################################################################
+# Class: CommonDataBus
+#
+# Purpose:
+#
+#   Write-back bandwidth: at most 'width' stations broadcast their result per cycle. Stations that finish
+#   executing request the bus; the rest of the requests wait (keeping their station and registers) and
+#   compete again the next cycle. Requests are kept in a heap ordered by the arbitration policy, so each
+#   request and grant is O(log n):
+#
+#     "oldest-first"     - the earliest instruction in program order.
+#     "latency-priority" - the longest latency first (it has held its station longest), then oldest.
+#     "round-robin"      - stations in turn, starting after the last one granted: a request is keyed by
+#                          (lap, station number), in the current lap if its station comes after the last
+#                          grant, in the next one otherwise.
+#
+# Private Data Members:
+#     int width, string policy
+#     list requests   - heap of (key, sequence number, station).
+#     dict pending    - station -> sequence number of its request; stale heap entries are skipped.
+#     int lap, next_station - round-robin position.
+#
+#     Statistics:
+#     int broadcasts          - results written back.
+#     int stalled_completions - requests left waiting, summed over every cycle.
+#     int contention_cycles   - cycles with more requests than broadcast slots.
+#     int max_waiting         - most requests left waiting in one cycle.
+#     dict waiting_cycles     - number of requests left waiting -> cycles it happened in (cycles without
+#                               contention are not counted).
+#
+# Public Interface/Methods:
+#     request, cancel, grant, statistics
+#
+##############################################################################################################
+class CommonDataBus:
+    POLICIES = ("oldest-first", "latency-priority", "round-robin")
+
+    def __init__(self, width, policy = "oldest-first"):
+        if width < 1:
+            raise ValueError("The common data bus needs at least one broadcast slot")
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown arbitration policy {policy}, expected one of: {', '.join(self.POLICIES)}")
+        self.width = width
+        self.policy = policy
+        self.requests = []
+        self.pending = {}
+        self.sequence = 0
+        self.lap = 0
+        self.next_station = 0
+        self.broadcasts = 0
+        self.stalled_completions = 0
+        self.contention_cycles = 0
+        self.max_waiting = 0
+        self.waiting_cycles = {}
+
+    def request(self, station, station_number):
+        if self.policy == "oldest-first":
+            key = (station.instruction_pointer.index,)
+        elif self.policy == "latency-priority":
+            key = (-station.latency, station.instruction_pointer.index)
+        else:
+            key = (self.lap if station_number >= self.next_station else self.lap + 1, station_number)
+        self.pending[station] = self.sequence
+        heapq.heappush(self.requests, (key, self.sequence, station))
+        self.sequence += 1
+
+    # Drops the request of a station that was flushed.
+    def cancel(self, station):
+        self.pending.pop(station, None)
+
+    # Stations that write back this cycle.
+    def grant(self):
+        granted = {}
+        requests = self.requests
+        while len(granted) < self.width and len(requests) > 0:
+            key, sequence, station = heapq.heappop(requests)
+            if self.pending.get(station) != sequence:
+                continue
+            del self.pending[station]
+            granted[station] = None
+            if self.policy == "round-robin":
+                self.lap = key[0]
+                self.next_station = key[1] + 1
+        self.broadcasts += len(granted)
+        waiting = len(self.pending)
+        if waiting > 0:
+            self.stalled_completions += waiting
+            self.contention_cycles += 1
+            if waiting > self.max_waiting:
+                self.max_waiting = waiting
+            self.waiting_cycles[waiting] = self.waiting_cycles.get(waiting, 0) + 1
+        return granted
+
+    def statistics(self, clock_cycle):
+        return {"width": self.width, "policy": self.policy, "broadcasts": self.broadcasts,
+                "utilization": self.broadcasts/(self.width * clock_cycle) if clock_cycle != 0 else 0,
+                "stalled_completions": self.stalled_completions, "contention_cycles": self.contention_cycles,
+                "max_waiting": self.max_waiting, "waiting_cycles": dict(sorted(self.waiting_cycles.items()))}
 
-        ################################################################
-        # Handle Instructions requiring the Adder Functional Unit
-        ################################################################
-        if opcode == "ADDD" or opcode == "SUBD":
-            for rs in self.fp_adders.values():
-                
-                #####################################################################
-                # Issue instruction to Adder Reservation station when all
-                # the following conditions are satisfied:
-                #
-                # * The ReservationStation isn't busy
-                # * The instruction hasn't already been issued.
-                # * None of the instruction's register operands are currently being
-                #   waited for in the Reservation Stations and Load Buffers
-                # 
-                #####################################################################
-                if rs.get_busy_status() == False and issued == False and destination.get_name() not in registers and operand1.get_name() not in registers and operand2.get_name() not in registers:
-                    if self.verbose_mode == True:
-                        print("Avaliable Reservation Station " + rs.get_name())
-                        
-                    rs.set_op(opcode)
-                    rs.set_time(self.instruction_latency[opcode])
-
-                    ################################################
-                    # Determine Instruction Register locations
-                    #
-                    # Note: Need to figure out how to
-                    #       check j,k value and if they
-                    #       they are busy.
-                    #
-                    # If the operand's value depends on the result
-                    # of another station that hasn't completed yet
-                    # (operandX.get_buffer() != None), then set
-                    # the Reservation Station's qX parameter to
-                    # the buffer it is waiting for.
-                    #
-                    # Otherwise, set the vX parameter to
-                    # the current value of the register,
-                    # and then update the latest location of the
-                    # register to this Reservation Station.
-                    #
-                    ################################################
-                    if operand1.get_buffer() != None:
-                        rs.set_qj(operand1) # Save pointer to buffer that will produce this operand.
-                    else:
-                        rs.set_vj(operand1)
-                        self.registers[operand1.get_name()].set_buffer(rs)
-                        
-                    if operand2.get_buffer() != None:
-                        rs.set_qk(operand2) # Save pointer to buffer that will produce this operand.
-                    else:
-                        rs.set_vk(operand2)
-                        self.registers[operand2.get_name()].set_buffer(rs)
-                        
-                    if destination.get_buffer() != None:
-                        rs.set_source_buffer(destination) 
-                    else:
-                        rs.set_source(destination)
-                        self.registers[destination.get_name()].set_buffer(rs)
-                        
-                    rs.set_busy_status(True)
-                    rs.set_instruction_pointer(instruction)
-                    rs.instruction_pointer.set_issued_cycle(self.clock_cycle)
+##############################################################################################################
+# Class: SnapshotLayout
+#
+# Purpose:
+#
+#   Describes how the state of a Tomasulo simulator is packed into the integer columns of a CycleSnapshot.
+#   Stations are numbered in the order adders, multipliers, load buffers; registers in the order of the
+#   register file. Opcodes and load/store addresses are numbered the first time they are seen. One layout
+#   is shared by every snapshot of a simulation, so the names are stored once instead of once per cycle.
+#
+#   Every snapshot has two columns:
+#     small - int16, STATION_FIELDS for every station (field-major), then the station index that
+#             buffers each register. -1 stands for None.
+#     large - int32, LARGE_FIELDS for every station (field-major). -1 stands for None.
+#
+# Public Interface/Methods:
+#     __init__ - Constructs a layout for the given stations, registers and opcodes
+#     opcode_id, register_id, station_id, address_id - number a value, -1 for None
+#
+##############################################################################################################
+class SnapshotLayout:
+    STATION_FIELDS = ("op", "busy", "vj", "vk", "qj", "qk", "source", "source_buffer")
+    LARGE_FIELDS = ("time", "address", "busy_cycles", "executing_cycles")
+
+    def __init__(self, stations, registers, opcodes):
+        self.station_names = [station.get_name() for station in stations]
+        self.is_loadbuffer = [isinstance(station, LoadBuffer) for station in stations]
+        self.station_ids = {name: index for index, name in enumerate(self.station_names)}
+        self.register_names = list(registers)
+        self.register_ids = {name: index for index, name in enumerate(self.register_names)}
+        self.opcodes = list(opcodes)
+        self.opcode_ids = {opcode: index for index, opcode in enumerate(self.opcodes)}
+        self.addresses = []
+        self.address_ids = {}
+
+    def num_stations(self):
+        return len(self.station_names)
+
+    def num_registers(self):
+        return len(self.register_names)
+
+    def opcode_id(self, opcode):
+        if opcode is None:
+            return -1
+        if opcode not in self.opcode_ids:
+            self.opcode_ids[opcode] = len(self.opcodes)
+            self.opcodes.append(opcode)
+        return self.opcode_ids[opcode]
+
+    def register_id(self, register):
+        if register is None:
+            return -1
+        if register.index is not None:
+            return register.index
+        return self.register_ids[register.get_name()]
+
+    def station_id(self, station):
+        if station is None:
+            return -1
+        return self.station_ids[station.get_name()]
+
+    def address_id(self, address):
+        if address is None:
+            return -1
+        if address not in self.address_ids:
+            self.address_ids[address] = len(self.addresses)
+            self.addresses.append(format_address(address))
+        return self.address_ids[address]
+
+##############################################################################################################
+# Class: CycleSnapshot
+#
+# Purpose:
+#
+#   The state of every Reservation Station, Load Buffer and Register at the end of one clock cycle, packed
+#   into two typed arrays (see SnapshotLayout). The human readable text is only built when it is asked for
+#   with render(), so keeping a snapshot costs a few bytes per station instead of a few hundred.
+#
+#   For compatibility with the old [clock_cycle, text] history entries, snapshot[0] is the clock cycle and
+#   snapshot[1] is the rendered text.
+#
+# Public Interface/Methods:
+#     __init__ - Constructs a snapshot from a layout and its packed columns
+#     __str__, render - the state as the text printed by display_simulation
+#     station(name) - dictionary with the fields of one station
+#     register_buffer(name) - name of the station that buffers a register, or None
+#
+##############################################################################################################
+class CycleSnapshot:
+    __slots__ = ("layout", "clock_cycle", "small", "large")
+
+    def __init__(self, layout, clock_cycle, small, large):
+        self.layout = layout
+        self.clock_cycle = clock_cycle
+        self.small = small
+        self.large = large
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        if index == 0 or index == -2:
+            return self.clock_cycle
+        if index == 1 or index == -1:
+            return self.render()
+        raise IndexError("CycleSnapshot index out of range")
+
+    def __str__(self):
+        return self.render()
+
+    def station(self, name):
+        layout = self.layout
+        num_stations = layout.num_stations()
+        index = layout.station_ids[name]
+        fields = {"name": name}
+        for position, field in enumerate(SnapshotLayout.STATION_FIELDS):
+            fields[field] = self.small[position * num_stations + index]
+        for position, field in enumerate(SnapshotLayout.LARGE_FIELDS):
+            fields[field] = self.large[position * num_stations + index]
+        return fields
+
+    def register_buffer(self, name):
+        layout = self.layout
+        station = self.small[8 * layout.num_stations() + layout.register_ids[name]]
+        return layout.station_names[station] if station != -1 else None
+
+    def render(self):
+        layout = self.layout
+        small = self.small
+        large = self.large
+        num_stations = layout.num_stations()
+        names = layout.register_names
+        clock_cycle = self.clock_cycle
+        lines = []
+        for index in range(num_stations):
+            op, busy, vj, vk, qj, qk, source, source_buffer = small[index::num_stations][:8]
+            time, address, busy_cycles, executing_cycles = large[index::num_stations]
+            name = layout.station_names[index]
+            state = (f"Clock Cycles Remaining: {time if time != -1 else None} | Name: {name} | Busy: {busy == 1} | "
+                     f"Op: {layout.opcodes[op] if op != -1 else None} | "
+                     f"Source: {names[source] if source != -1 else None} | "
+                     f"Source Buffer: {names[source_buffer] if source_buffer != -1 else None}")
+            # Same as the stations' get_busy_fraction/get_executing_fraction
+            busy_fraction = busy_cycles/clock_cycle if clock_cycle != 0 else 0
+            executing_fraction = executing_cycles/clock_cycle if clock_cycle != 0 else 0
+            if layout.is_loadbuffer[index] == True:
+                state += f" | Address: {layout.addresses[address] if address != -1 else None}"
+                lines.append("Load/Store Buffer: " + name + " " + state)
+            else:
+                state += (f" | Vj: {names[vj] if vj != -1 else None} | Vk: {names[vk] if vk != -1 else None}"
+                          f" | Qj: {names[qj] if qj != -1 else None} | Qk: {names[qk] if qk != -1 else None}")
+                lines.append("Reservation Station: " + name + " " + state)
+            lines[-1] += " Busy Utilization: " + str(busy_fraction) + " | Execution Utilization: " + str(executing_fraction)
+        for index, buffer in enumerate(small[8 * num_stations:]):
+            lines.append(f"Register: {names[index]} | Buffer Station: {layout.station_names[buffer] if buffer != -1 else None}")
+        return "".join(line + "\n" for line in lines)
+
+##############################################################################################################
+# Class: SnapshotHistory
+#
+# Purpose:
+#
+#   Keeps a sequence of CycleSnapshots by appending their columns to a few long typed arrays, so that a long
+#   simulation costs no Python object per cycle. Indexing returns a CycleSnapshot view of one cycle, which
+#   keeps the old history[-1][0] (clock cycle) and history[i][1] (text) idioms working.
+#
+#   Whole columns can be pulled out with station_field/register_buffers for vectorized statistics
+#   (for example numpy.asarray(history.station_field("MULT1", "busy"))).
+#
+# Public Interface/Methods:
+#     append(snapshot), __len__, __getitem__, __iter__
+#     station_field(name, field) - array of one station field over all kept cycles
+#     register_buffers(name) - array of the station index buffering a register over all kept cycles
+#
+##############################################################################################################
+class SnapshotHistory:
+    def __init__(self):
+        self.layout = None
+        self.cycles = array("l")
+        self.small = array("h")
+        self.large = array("i")
+
+    def append(self, snapshot):
+        if self.layout is None:
+            self.layout = snapshot.layout
+        self.cycles.append(snapshot.clock_cycle)
+        self.small.extend(snapshot.small)
+        self.large.extend(snapshot.large)
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("SnapshotHistory index out of range")
+        small_width = 8 * self.layout.num_stations() + self.layout.num_registers()
+        large_width = 4 * self.layout.num_stations()
+        return CycleSnapshot(self.layout, self.cycles[index],
+                             self.small[index * small_width:(index + 1) * small_width],
+                             self.large[index * large_width:(index + 1) * large_width])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def station_field(self, name, field):
+        num_stations = self.layout.num_stations()
+        index = self.layout.station_ids[name]
+        if field in SnapshotLayout.STATION_FIELDS:
+            width = 8 * num_stations + self.layout.num_registers()
+            return self.small[SnapshotLayout.STATION_FIELDS.index(field) * num_stations + index::width]
+        width = 4 * num_stations
+        return self.large[SnapshotLayout.LARGE_FIELDS.index(field) * num_stations + index::width]
+
+    def register_buffers(self, name):
+        width = 8 * self.layout.num_stations() + self.layout.num_registers()
+        return self.small[8 * self.layout.num_stations() + self.layout.register_ids[name]::width]
+
+##############################################################################################################
+# Class: SnapshotSink
+#
+# Purpose:
+#
+#   Each clock cycle the Tomasulo simulator can take a snapshot of the Reservation Stations, Load Buffers
+#   and Registers (a CycleSnapshot). A SnapshotSink decides which of those snapshots are taken and where they
+#   go, so that the memory used for the execution history is chosen by the caller instead of growing with
+#   the trace.
+#
+#   The base class keeps nothing: every snapshot is only handed to the caller when the simulation is run
+#   lazily (see Tomasulo.run_algorithim). The subclasses below keep, filter or stream the snapshots.
+#
+#     NullSink          - no snapshots are taken at all (fastest).
+#     ListSink          - snapshots are kept in memory in a SnapshotHistory (default).
+#     FileSink          - snapshots are written to a file as soon as they are taken.
+#     CallbackSink      - snapshots are passed to a function as soon as they are taken.
+#     EveryNthCycleSink - forwards the snapshot of every Nth clock cycle to another sink.
+#     OnChangeSink      - forwards a snapshot to another sink only when the state changed in that cycle.
+#                         A change is an issue, an operand claim or a write-back; the countdown of
+#                         'Clock Cycles Remaining' and the utilizations are not counted as changes.
+#
+# Public Interface/Methods:
+#     wants(clock_cycle, changed) - returns True if a snapshot should be taken for this clock cycle.
+#     next_wanted(clock_cycle) - earliest cycle >= clock_cycle whose snapshot may be wanted even when nothing
+#                                changed in it, or None if there is no such cycle. The event-driven engine
+#                                only jumps over cycles that no sink wants.
+#     record(clock_cycle, snapshot) - receives a snapshot that was taken.
+#     close() - called once when the simulation has finished.
+#
+##############################################################################################################
+class SnapshotSink:
+    def wants(self, clock_cycle, changed):
+        return True
+
+    def next_wanted(self, clock_cycle):
+        return clock_cycle
+
+    def record(self, clock_cycle, snapshot):
+        pass
+
+    def close(self):
+        pass
+
+class NullSink(SnapshotSink):
+    def wants(self, clock_cycle, changed):
+        return False
+
+    def next_wanted(self, clock_cycle):
+        return None
+
+class ListSink(SnapshotSink):
+    def __init__(self):
+        self.records = SnapshotHistory()
+
+    def record(self, clock_cycle, snapshot):
+        self.records.append(snapshot)
+
+class FileSink(SnapshotSink):
+    def __init__(self, file):
+        # file is either a path or an already opened text file. Only files opened here are closed here.
+        self.file = file
+        self.handle = None
+        self.owns_handle = False
+
+    def record(self, clock_cycle, snapshot):
+        if self.handle is None:
+            if isinstance(self.file, str):
+                self.handle = open(self.file, "w")
+                self.owns_handle = True
+            else:
+                self.handle = self.file
+        self.handle.write(f"Clock Cycle: {clock_cycle}\n{snapshot.render()}\n")
+
+    def close(self):
+        if self.handle is not None:
+            if self.owns_handle == True:
+                self.handle.close()
+            else:
+                self.handle.flush()
+            self.handle = None
+
+class CallbackSink(SnapshotSink):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def record(self, clock_cycle, snapshot):
+        self.callback(clock_cycle, snapshot)
+
+class EveryNthCycleSink(SnapshotSink):
+    def __init__(self, n, sink=None):
+        if int(n) < 1:
+            raise ValueError("EveryNthCycleSink needs n >= 1")
+        self.n = int(n)
+        self.sink = sink if sink is not None else SnapshotSink()
+
+    def wants(self, clock_cycle, changed):
+        return clock_cycle % self.n == 0 and self.sink.wants(clock_cycle, changed)
+
+    def next_wanted(self, clock_cycle):
+        while True:
+            multiple = -(-clock_cycle // self.n) * self.n
+            wanted = self.sink.next_wanted(multiple)
+            if wanted is None or wanted == multiple:
+                return wanted
+            clock_cycle = wanted
+
+    def record(self, clock_cycle, snapshot):
+        self.sink.record(clock_cycle, snapshot)
+
+    def close(self):
+        self.sink.close()
+
+class OnChangeSink(SnapshotSink):
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else SnapshotSink()
+
+    def wants(self, clock_cycle, changed):
+        return changed == True and self.sink.wants(clock_cycle, changed)
+
+    def next_wanted(self, clock_cycle):
+        return None
+
+    def record(self, clock_cycle, snapshot):
+        self.sink.record(clock_cycle, snapshot)
+
+    def close(self):
+        self.sink.close()
+
+##############################################################################################################
+# Class: PhaseProfiler
+#
+# Purpose:
+#
+#   Opt-in timing of the phases of the cycle loop. When a Tomasulo is given a profiler, the phase methods of
+#   that one simulator object are replaced by wrappers that count the calls and add up perf_counter_ns times;
+#   without a profiler the methods are left alone, so profiling costs nothing when it is off.
+#
+#   Times are kept per call path ("run_algorithim;step_cycle;write_back"), so that the self time of a phase
+#   excludes the profiled phases it calls (write_back calls check_register_buffers, update_simulation_results
+#   calls take_snapshot).
+#
+# Private Data Members:
+#     list stack        - call paths of the phases currently running.
+#     dict calls        - call path -> number of calls (of a generator: number of generators run).
+#     dict total_ns     - call path -> time spent in the phase, in nanoseconds.
+#     dict child_ns     - call path -> part of total_ns spent in profiled phases it called.
+#     int clock_cycles  - clock cycles of the profiled run.
+#
+# Public Interface/Methods:
+#     instrument(tomasulo) - wraps the PROFILED_PHASES of a simulator.
+#     breakdown()          - one row per call path: calls, total and self time, share of the run
+#                            and time per clock cycle.
+#     format_breakdown()   - breakdown() as a table.
+#     collapsed_stacks()   - "path self_time_ns" lines, the input format of flamegraph.pl and speedscope.
+#
+##############################################################################################################
+class PhaseProfiler:
+    # Tomasulo methods timed by the profiler; generators are timed while they run, not while suspended.
+    PROFILED_PHASES = ("step_cycle", "issue_instruction", "commit_instructions", "write_back", "check_register_buffers", "execute_instructions",
+                       "update_simulation_results", "take_snapshot", "skip_idle_cycles")
+    PROFILED_GENERATORS = ("iterate_cycles", "skip_idle_cycles")
+    ROOT = "run_algorithim"
+
+    def __init__(self):
+        self.stack = [""]
+        self.calls = {}
+        self.total_ns = {}
+        self.child_ns = {}
+        self.clock_cycles = 0
+
+    def instrument(self, tomasulo):
+        for name in self.PROFILED_PHASES:
+            setattr(tomasulo, name, self.wrap(name, getattr(tomasulo, name)))
+        tomasulo.iterate_cycles = self.wrap(self.ROOT, tomasulo.iterate_cycles)
+        if tomasulo.utilization_window is not None:
+            tomasulo.utilization_window.record = self.wrap("update_utilizations", tomasulo.utilization_window.record)
+
+    def wrap(self, name, function):
+        if name in self.PROFILED_GENERATORS or name == self.ROOT:
+            return self.wrap_generator(name, function)
+        from time import perf_counter_ns
+        stack = self.stack
+
+        def timed(*args):
+            parent = stack[-1]
+            path = parent + ";" + name if parent != "" else name
+            stack.append(path)
+            start = perf_counter_ns()
+            try:
+                return function(*args)
+            finally:
+                self.add(parent, path, perf_counter_ns() - start)
+                stack.pop()
+        return timed
+
+    def wrap_generator(self, name, function):
+        from time import perf_counter_ns
+        stack = self.stack
+
+        def timed(*args):
+            generator = function(*args)
+            calls = 1
+            while True:
+                parent = stack[-1]
+                path = parent + ";" + name if parent != "" else name
+                stack.append(path)
+                start = perf_counter_ns()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    self.add(parent, path, perf_counter_ns() - start, calls)
+                    stack.pop()
+                    calls = 0
+                yield item
+        return timed
+
+    def add(self, parent, path, elapsed, calls = 1):
+        self.calls[path] = self.calls.get(path, 0) + calls
+        self.total_ns[path] = self.total_ns.get(path, 0) + elapsed
+        if parent != "":
+            self.child_ns[parent] = self.child_ns.get(parent, 0) + elapsed
+
+    def finish(self, clock_cycles):
+        self.clock_cycles = clock_cycles
+
+    def breakdown(self):
+        run_ns = sum(total for path, total in self.total_ns.items() if ";" not in path)
+        rows = []
+        for path, total in self.total_ns.items():
+            self_ns = total - self.child_ns.get(path, 0)
+            rows.append({"phase": path, "calls": self.calls[path], "total_ns": total, "self_ns": self_ns,
+                         "percent": 100 * total/run_ns if run_ns > 0 else 0,
+                         "ns_per_cycle": total/self.clock_cycles if self.clock_cycles != 0 else 0})
+        rows.sort(key=lambda row: row["phase"])
+        return rows
+
+    def format_breakdown(self):
+        lines = [f"{'Phase':<60} {'Calls':>10} {'Total ms':>10} {'Self ms':>10} {'% Run':>7} {'ns/cycle':>10}"]
+        for row in self.breakdown():
+            depth = row["phase"].count(";")
+            phase = "  " * depth + row["phase"].rsplit(";", 1)[-1]
+            lines.append(f"{phase:<60} {row['calls']:>10} {row['total_ns']/1e6:>10.2f} {row['self_ns']/1e6:>10.2f} {row['percent']:>7.1f} {row['ns_per_cycle']:>10.1f}")
+        lines.append(f"Clock cycles: {self.clock_cycles}")
+        return "\n".join(lines)
+
+    def collapsed_stacks(self):
+        lines = []
+        for row in self.breakdown():
+            if row["self_ns"] > 0:
+                lines.append(f"{row['phase']} {row['self_ns']}")
+        return "\n".join(lines) + "\n"
+
+##############################################################################################################
+# Class: SimulationObserver
+#
+# Purpose:
+#
+#   Base class of listeners to the events of a simulation. Subclasses override the hooks they want; a
+#   Tomasulo only calls the hooks that were overridden by a registered observer, so an event nobody listens
+#   to costs one empty-list check.
+#
+#   Every hook gets the clock cycle, the Instruction and the ReservationStation/LoadBuffer it is in, except
+#   on_stall, which gets the instruction that could not issue and the reason (STALL_REGISTER,
+#   STALL_STRUCTURAL, STALL_ROB or STALL_RENAME) and is called once per cycle the instruction stays stalled. on_cycle gets the Tomasulo
+#   at the end of each cycle; listening to it turns off the event-driven skip so every cycle is seen.
+#
+# Public Interface/Methods:
+#     on_issue(clock_cycle, instruction, station)
+#     on_exec_start(clock_cycle, instruction, station)
+#     on_exec_end(clock_cycle, instruction, station)
+#     on_writeback(clock_cycle, instruction, station)
+#     on_stall(clock_cycle, instruction, reason)
+#     on_cycle(tomasulo)
+#
+##############################################################################################################
+class SimulationObserver:
+    STALL_REGISTER = "register" # an operand is still waited for by a station
+    STALL_STRUCTURAL = "structural" # every station of the functional unit is busy
+    STALL_ROB = "rob" # the reorder buffer is full
+    STALL_RENAME = "rename" # no free physical register for the register written
+    HOOKS = ("on_issue", "on_exec_start", "on_exec_end", "on_writeback", "on_stall", "on_cycle")
+
+    def on_issue(self, clock_cycle, instruction, station):
+        pass
+
+    def on_exec_start(self, clock_cycle, instruction, station):
+        pass
+
+    def on_exec_end(self, clock_cycle, instruction, station):
+        pass
+
+    def on_writeback(self, clock_cycle, instruction, station):
+        pass
+
+    def on_stall(self, clock_cycle, instruction, reason):
+        pass
+
+    def on_cycle(self, tomasulo):
+        pass
+
+# The messages of verbose_mode: every issue and stall, and the state of the stations and registers every cycle.
+class VerboseObserver(SimulationObserver):
+    def on_issue(self, clock_cycle, instruction, station):
+        if isinstance(station, LoadBuffer):
+            print("Avaliable Load/Store Buffer " + station.get_name())
+        else:
+            print("Avaliable Reservation Station " + station.get_name())
+        print("Issued: ", instruction)
+
+    def on_stall(self, clock_cycle, instruction, reason):
+        print("No avalible Function Units this  clock cycle for Instruction: ", instruction)
+
+    def on_cycle(self, tomasulo):
+        tomasulo.display_simulation()
+
+class Tomasulo:
+    # Functional unit classes of the opcodes (see resolve_instruction_queue)
+    FP_ADDER = 0
+    FP_MULTIPLIER = 1
+    MEMORY = 2
+    BRANCH = 3 # compared on the adder stations
+
+    def __init__(self, instruction_queue, num_fp_add, num_fp_mult, num_loadstore, registers, opcodes, dispatch_size, verbose_mode, latencies = None, snapshot_sink = None, event_driven = True, utilization_window = None, profiler = None, observers = None, rob_size = None, commit_width = 1, predictor = None, cdb_width = None, cdb_policy = "oldest-first", functional_units = None, initiation_intervals = None, memory_system = None, physical_registers = None):
+        ####################################################################
+        # Initialize the instruction queue for incoming instructions
+        ####################################################################
+        self.instruction_queue = instruction_queue
+
+        ####################################################################
+        # Initialize the functional unit buffers within the Execution Unit.
+        ####################################################################
+        self.num_fp_add = num_fp_add
+        self.num_fp_mult = num_fp_mult
+        self.num_loadstore = num_loadstore
+        self.fp_adders = {}
+        self.fp_multipliers = {}
+        self.loadbuffers = {}
+
+        for esh in range(self.num_fp_add):
+            self.fp_adders["ADD" + str(esh + 1)] = ReservationStation("ADD" + str(esh + 1))
+        for esh in range(self.num_fp_mult):
+            self.fp_multipliers["MULT" + str(esh + 1)] = ReservationStation("MULT" + str(esh + 1))
+        for esh in range(self.num_loadstore):
+            self.loadbuffers["LOAD/STORE" + str(esh + 1)] = LoadBuffer("LOAD/STORE" + str(esh + 1))
+        self.stations = list(self.fp_adders.values()) + list(self.fp_multipliers.values()) + list(self.loadbuffers.values())
+        self.fp_adder_pool = StationPool(self.fp_adders.values())
+        self.fp_multiplier_pool = StationPool(self.fp_multipliers.values())
+        self.loadbuffer_pool = StationPool(self.loadbuffers.values())
+        self.station_indices = {station: index for index, station in enumerate(self.stations)}
+        self.station_pools = {}
+        for pool in (self.fp_adder_pool, self.fp_multiplier_pool, self.loadbuffer_pool):
+            for station in pool.stations:
+                self.station_pools[station] = pool
+
+        ####################################################################
+        # Optional utilization of each functional unit class over the last
+        # utilization_window cycles (see UtilizationWindow).
+        ####################################################################
+        self.utilization_window = None
+        if utilization_window is not None:
+            self.utilization_window = UtilizationWindow(utilization_window, ["ADD", "MULT", "LOAD/STORE"], [self.fp_adder_pool, self.fp_multiplier_pool, self.loadbuffer_pool])
+
+        ####################################################################
+        # Optional reorder buffer with in-order commit and branch
+        # prediction (see ReorderBuffer). Without one, instructions retire
+        # at write-back and branches are plain compares that never
+        # mispredict.
+        #
+        # Latencies are only looked up for the opcodes argument, so a trace
+        # with branches needs "BEQ"/"BNE" in opcodes (list(default_latencies)
+        # has them, the module's opcodes list does not); otherwise the run
+        # stops with "No latency given for opcode BNE".
+        ####################################################################
+        self.reorder_buffer = None
+        self.predictor = None
+        self.flushed = False # set when a flush rewound the instruction queue this cycle
+        if rob_size is not None:
+            self.reorder_buffer = ReorderBuffer(rob_size, commit_width)
+            self.predictor = predictor if predictor is not None else StaticPredictor(False)
+
+        ####################################################################
+        # Optional write-back bandwidth (see CommonDataBus). Without it,
+        # every station that finished executing writes back the next cycle.
+        ####################################################################
+        self.cdb = None
+        if cdb_width is not None:
+            self.cdb = CommonDataBus(cdb_width, cdb_policy)
+
+        ####################################################################
+        # Optional functional units shared by the stations of a pool (see
+        # FunctionalUnits): functional_units maps "ADD", "MULT" and
+        # "LOAD/STORE" to a number of units, initiation_intervals an opcode
+        # to its initiation interval (default 1, fully pipelined). A pool
+        # without units executes on each station separately, as before.
+        ####################################################################
+        self.initiation_intervals = dict(initiation_intervals) if initiation_intervals is not None else {}
+        self.unit_waiting = [] # units a station waited for in the current cycle
+        if functional_units is not None:
+            pools = {"ADD": self.fp_adder_pool, "MULT": self.fp_multiplier_pool, "LOAD/STORE": self.loadbuffer_pool}
+            for name, count in functional_units.items():
+                if name not in pools:
+                    raise ValueError(f"Unknown functional unit class {name}, expected one of: {', '.join(pools)}")
+                pools[name].units = FunctionalUnits(count)
+
+        ####################################################################
+        # Optional memory model of the Load Buffers (see MemorySystem):
+        # numeric addresses, a store buffer ordering loads against older
+        # stores, and a cache. Without it, every load and store takes the
+        # fixed latency of its opcode.
+        ####################################################################
+        self.memory_system = memory_system
+        self.memory_waiting = [] # reasons the loads waited for in the current cycle
+
+        self.registers = registers
+        self.register_file = list(registers.values())
+        for index, register in enumerate(self.register_file): # every run starts from a clean register file
+            register.set_index(index)
+            register.set_buffer(None)
+            register.set_write_back(True)
+
+        ####################################################################
+        # Optional register renaming onto physical_registers physical
+        # registers (see RenameTable). The stations then hold physical
+        # registers, and a station claims (Register.buffer) only the
+        # register it writes; without renaming it claims the registers it
+        # reads as well, which is what holds up issue on WAR/WAW hazards.
+        ####################################################################
+        self.rename_table = None
+        self.station_registers = registers # the registers the stations hold, by name
+        if physical_registers is not None:
+            self.rename_table = RenameTable(self.register_file, physical_registers)
+            self.station_registers = self.rename_table.registers
+        self.claim_sources = self.rename_table is None
+        if memory_system is not None:
+            memory_system.bind(self.register_file)
+        self.dispatch_size = int(dispatch_size)
+        self.verbose_mode = verbose_mode
+        self.latencies = latencies
+        self.parameters = [num_fp_add, num_fp_mult, num_loadstore, len(registers), instruction_queue.length, dispatch_size]
+        self.clock_cycle = 0
+
+        ####################################################################
+        # Per-cycle snapshots go to the snapshot sink. By default they are
+        # kept in memory in 'output' as [clock_cycle, snapshot] pairs.
+        ####################################################################
+        if snapshot_sink is None:
+            snapshot_sink = ListSink()
+        self.snapshot_sink = snapshot_sink
+        self.snapshot_layout = SnapshotLayout(self.stations, self.station_registers, opcodes)
+        self.output = snapshot_sink.records if isinstance(snapshot_sink, ListSink) else []
+        self.state_changed = True # the initial state is always a change
+
+        ####################################################################
+        # Event-driven time advance (see skip_idle_cycles). When disabled,
+        # every clock cycle is stepped one at a time.
+        ####################################################################
+        self.event_driven = event_driven
+        self.cycle_event = False
+        self.cycle_idle = False
+        self.executing_stations = {} # station -> sequence number of its latest completion event
+        self.completion_events = [] # heap of (execute_end_cycle, sequence number, station)
+        self.event_sequence = 0
+
+        ####################################################################
+        # Number of stations waiting for each register in their qj, qk or
+        # source buffer, indexed by register number. This is the
+        # incrementally updated form of buffer_registers().
+        ####################################################################
+        self.pending_registers = array('l', [0]) * len(self.station_registers)
+
+        ###########################################################################################
+        # Obtain the execution time/latency (in clock-cycles) for each instruction either
+        # from the user or from the latencies table.
+        ###########################################################################################
+        self.instruction_latency = {}
+        if self.latencies == None:
+            for opcode in opcodes:
+                latency = None
+                while type(latency) != type(1):
+                    try:
+                        latency = int(input("Enter latency for " + opcode + ":"))
+                    except EOFError: # piped input ran out, or there is no input at all
+                        raise ValueError(f"No latency given for opcode {opcode}: standard input ended; pass latencies= when running without input") from None
+                self.instruction_latency[opcode] = latency
+        else:
+            for opcode in opcodes:
+                self.instruction_latency[opcode] = self.latencies[opcode]
+
+        ###########################################################################################
+        # Opcodes and operands of the instruction queue, resolved once to what the hot path
+        # needs: (opcode, functional unit, latency) per queue opcode number and the simulator's
+        # own Register (or the address offset of a load/store) per queue operand number.
+        ###########################################################################################
+        self.opcode_table = []
+        self.operand_table = []
+        self.address_offsets = [] # numeric value of each load/store offset in operand_table, for the memory model
+        self.resolve_instruction_queue()
+
+        ####################################################################
+        # Optional per-phase timing (see PhaseProfiler). Only this object's
+        # methods are wrapped, so an unprofiled run is not slowed down.
+        ####################################################################
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self)
+
+        ####################################################################
+        # Registered listeners of each SimulationObserver hook. verbose_mode
+        # prints through a VerboseObserver.
+        ####################################################################
+        self.issue_listeners = []
+        self.exec_start_listeners = []
+        self.exec_end_listeners = []
+        self.writeback_listeners = []
+        self.stall_listeners = []
+        self.cycle_listeners = []
+        self.stall_reason = None # reason of the last stall, repeated for the cycles skip_idle_cycles jumps over
+        if verbose_mode == True:
+            self.add_observer(VerboseObserver())
+        for observer in (observers if observers is not None else []):
+            self.add_observer(observer)
+                
+    #######################################################################
+    # Registers a SimulationObserver for the hooks it overrides.
+    #######################################################################
+    def add_observer(self, observer):
+        for hook, listeners in zip(SimulationObserver.HOOKS, (self.issue_listeners, self.exec_start_listeners, self.exec_end_listeners,
+                                                              self.writeback_listeners, self.stall_listeners, self.cycle_listeners)):
+            if getattr(type(observer), hook) is not getattr(SimulationObserver, hook):
+                listeners.append(getattr(observer, hook))
+
+    def notify(self, listeners, station):
+        for listener in listeners:
+            listener(self.clock_cycle, station.instruction_pointer, station)
+
+    #######################################################################
+    #
+    # CPU Clock Cycle Management
+    #
+    #######################################################################
+        
+    def increment_clock_cycle(self):
+        self.clock_cycle += 1
+
+    def get_clock_cycle(self):
+        return self.clock_cycle
+
+    #######################################################################
+    #
+    # Methods to Display the internal state of the Execution Unit or
+    # convert the internal state of the Execution to a string.
+    #
+    #######################################################################
+
+    def display_adders(self):
+        for name, rs in self.fp_adders.items():
+            print("Reservation Station: " + name + " ", rs,  " Busy Utilization: " + str(rs.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(rs.get_executing_fraction(self.clock_cycle)))
+
+    def display_multipliers(self):
+        for name, rs in self.fp_multipliers.items():
+            print("Reservation Station: " + name + " ", rs, " Busy Utilization: " + str(rs.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(rs.get_executing_fraction(self.clock_cycle)))
+
+    def display_loadbuffers(self):
+        for name, lb in self.loadbuffers.items():
+            print("Load/Store Buffer: " + name + " ", lb, " Busy Utilization: " + str(lb.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(lb.get_executing_fraction(self.clock_cycle)))
+
+    def display_registers(self):
+        for register in self.station_registers.values():
+            print(register)
+
+    def return_adders_string(self):
+        output = ""
+        for name, rs in self.fp_adders.items():
+            output += str("Reservation Station: " + name + " " + str(rs) +  " Busy Utilization: " + str(rs.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(rs.get_executing_fraction(self.clock_cycle)))
+            output += "\n"
+        return output
+
+    def return_multipliers_string(self):
+        output = ""
+        for name, rs in self.fp_multipliers.items():
+            output += str("Reservation Station: " + name + " " + str(rs) +  " Busy Utilization: " + str(rs.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(rs.get_executing_fraction(self.clock_cycle)))
+            output += "\n"
+        return output
+
+    def return_loadbuffers_string(self):
+        output = ""
+        for name, lb in self.loadbuffers.items():
+            output += str("Load/Store Buffer: " + name + " " + str(lb) + " Busy Utilization: " + str(lb.get_busy_fraction(self.clock_cycle)) + " | Execution Utilization: " + str(lb.get_executing_fraction(self.clock_cycle)))
+            output += "\n"
+        return output
+
+    def return_registers_string(self):
+        output = ""
+        for register in self.station_registers.values():
+            output += str(register)
+            output += "\n"
+        return output
+
+    ###############################################################################
+    #
+    # Tomasulo Scheduling Algorithm for issuing instructions to the Execution Unit
+    #
+    ###############################################################################
+    def issue_instruction(self, instruction):
+        issued = False
+        trace = instruction.queue.trace
+        index = instruction.index
+        opcode, unit, latency = self.opcode_table[trace.opcodes[index]]
+        destination = self.operand_table[trace.destinations[index]]
+        operand1 = self.operand_table[trace.operands1[index]]
+        operand2 = self.operand_table[trace.operands2[index]]
+
+        # Number of stations currently waiting for each register (qj, qk or source buffer),
+        # indexed by register number and kept up to date incrementally. Not
+        # consulted with renaming, where no other instruction's values hold up issue.
+        pending = self.pending_registers
+        station = None
+        branch = None
+
+        ################################################################
+        # With register renaming, the registers read are looked up in
+        # the map table and a register written gets the next free
+        # physical register, taken off the free list only once the
+        # instruction issues. The architectural registers are kept for
+        # the rename and the effective address.
+        ################################################################
+        renaming = self.rename_table
+        written = destination
+        base = operand2
+        writes = False
+        if renaming is not None:
+            renaming.blocked = False
+            writes = unit == self.FP_ADDER or unit == self.FP_MULTIPLIER or opcode == "LDDD"
+            if unit == self.FP_ADDER or unit == self.FP_MULTIPLIER:
+                operand1 = renaming.lookup(operand1)
+            operand2 = renaming.lookup(operand2)
+            if writes == False: # the compared register of a branch, the stored register of a store
+                destination = renaming.lookup(destination)
+            elif renaming.has_free() == True:
+                destination = renaming.next_free()
+
+        ################################################################
+        # Nothing issues while the reorder buffer is full, or while a
+        # register to write has no free physical register
+        ################################################################
+        if self.reorder_buffer is not None and self.reorder_buffer.is_full() == True:
+            self.reorder_buffer.full_stalls += 1
+
+        elif writes == True and renaming.has_free() == False:
+            renaming.stalls += 1
+            renaming.blocked = True
+
+        ################################################################
+        # Handle Instructions requiring the Adder Functional Unit
+        ################################################################
+        elif unit == self.FP_ADDER:
+
+            #####################################################################
+            # Issue instruction to Adder Reservation station when all
+            # the following conditions are satisfied:
+            #
+            # * A ReservationStation isn't busy (the lowest numbered idle
+            #   station is taken from the free pool).
+            # * None of the instruction's register operands are currently being
+            #   waited for in the Reservation Stations and Load Buffers (with
+            #   renaming, its registers hold no other instruction's values)
+            # 
+            #####################################################################
+            if renaming is not None or (pending[destination.index] == 0 and pending[operand1.index] == 0 and pending[operand2.index] == 0):
+                rs = self.fp_adder_pool.allocate()
+                if rs is not None:
+                    self.issue_to_reservation_station(rs, instruction, opcode, latency, destination, operand1, operand2)
                     issued = True
-                    
-                    if self.verbose_mode == True:
-                        print("Issued: ", instruction)
+                    station = rs
                         
         ################################################################
         # Handle Instructions requiring the Multiplier Functional Unit
         ################################################################
-        elif opcode == "MULTD" or opcode == "DIVD":
-            for rs in self.fp_multipliers.values():
-                if rs.get_busy_status() == False and issued == False and destination.get_name() not in registers and operand1.get_name() not in registers and operand2.get_name() not in registers:
-                    if self.verbose_mode == True:
-                        print("Avaliable Reservation Station " + rs.get_name())
-                    rs.set_op(opcode)
-                    rs.set_time(self.instruction_latency[opcode])
-
-                    ################################################
-                    # Determine Instruction Register locations
-                    #
-                    # Note: Need to figure out how to
-                    #       check j,k value and if they
-                    #       they are busy.
-                    #
-                    # If the operand's value depends on the result
-                    # of another station that hasn't completed yet
-                    # (operandX.get_buffer() != None), then set
-                    # the Reservation Station's qX parameter to
-                    # the buffer it is waiting for.
-                    #
-                    # Otherwise, set the vX parameter to
-                    # the current value of the register,
-                    # and then update the latest location of the
-                    # register to this Reservation Station.
-                    #
-                    ################################################
-                    if operand1.get_buffer() != None:
-                        rs.set_qj(operand1) # Save pointer to buffer that will produce this operand.
-                    else:
-                        rs.set_vj(operand1)
-                        self.registers[operand1.get_name()].set_buffer(rs)
-                        
-                    if operand2.get_buffer() != None:
-                        rs.set_qk(operand2) # Save pointer to buffer that will produce this operand.
-                    else:
-                        rs.set_vk(operand2)
-                        self.registers[operand2.get_name()].set_buffer(rs)
-                        
-                    if destination.get_buffer() != None:
-                        rs.set_source_buffer(destination)
-                    else:
-                        rs.set_source(destination)
-                        self.registers[destination.get_name()].set_buffer(rs)
-                        
-                    rs.set_busy_status(True)
-                    rs.set_instruction_pointer(instruction)
-                    rs.instruction_pointer.set_issued_cycle(self.clock_cycle)
+        elif unit == self.FP_MULTIPLIER:
+            if renaming is not None or (pending[destination.index] == 0 and pending[operand1.index] == 0 and pending[operand2.index] == 0):
+                rs = self.fp_multiplier_pool.allocate()
+                if rs is not None:
+                    self.issue_to_reservation_station(rs, instruction, opcode, latency, destination, operand1, operand2)
                     issued = True
-                    if self.verbose_mode == True:
-                        print("Issued: ", instruction)
+                    station = rs
+
+        ################################################################
+        # Handle Branches: the two registers (in the destination and
+        # operand2 slots) are compared on an adder Reservation Station,
+        # which writes no register. operand1 is the branch_target, with
+        # the direction the branch took; with a reorder buffer the
+        # predictor's guess is checked against it.
+        ################################################################
+        elif unit == self.BRANCH:
+            if renaming is not None or (pending[destination.index] == 0 and pending[operand2.index] == 0):
+                rs = self.fp_adder_pool.allocate()
+                if rs is not None:
+                    self.issue_to_reservation_station(rs, instruction, opcode, latency, None, destination, operand2)
+                    issued = True
+                    station = rs
+                    if self.reorder_buffer is not None:
+                        label = operand1.get_label()
+                        taken = operand1.get_taken()
+                        branch = (label, taken, self.predictor.predict(label) != taken)
                         
         ################################################################
         # Handle Instructions requiring the Memory Interface
         ################################################################
-        else: # opcode == "LDDD" or opcode == "STDD"
-            for lb in self.loadbuffers.values():
-                if lb.get_busy_status() == False and issued == False and destination.get_name() not in registers and operand2.get_name() not in registers:
-                    if self.verbose_mode == True:
-                        print("Avaliable Load/Store Buffer " + lb.get_name())
+        else: # unit == self.MEMORY (LDDD or STDD)
+            if renaming is not None or (pending[destination.index] == 0 and pending[operand2.index] == 0):
+                lb = self.loadbuffer_pool.allocate()
+                if lb is not None:
                     lb.set_op(opcode)
-                    lb.set_time(self.instruction_latency[opcode])
-                    lb.set_address(str(operand1) + " " + operand2.get_name()) # check data types
+                    lb.set_time(latency)
+                    lb.latency = latency
+                    lb.set_address((operand1, base)) # offset and base register, formatted only for display
+                    if self.memory_system is not None:
+                        self.memory_system.issue(lb, self.address_offsets[trace.operands1[index]], base, opcode == "STDD")
 
-                    if operand2.get_buffer() != None:
+                    if operand2.get_buffer() not in (None, lb):
                         lb.set_qj(operand2) # Save pointer to buffer that will produce this operand.
+                        self.add_pending_register(operand2)
                     else:
                         lb.set_vj(operand2)
-                        self.registers[operand2.get_name()].set_buffer(lb)
+                        if self.claim_sources == True:
+                            operand2.set_buffer(lb)
                         
-                    if destination.get_buffer() != None:
+                    if destination.get_buffer() not in (None, lb):
                         lb.set_source_buffer(destination)
+                        self.add_pending_register(destination)
                     else:
                         lb.set_source(destination)
-                        self.registers[destination.get_name()].set_buffer(lb)
+                        if self.claim_sources == True or writes == True:
+                            destination.set_buffer(lb)
                         
                     lb.set_busy_status(True)
+                    self.loadbuffer_pool.update_waiting(lb)
                     issued = True
+                    self.state_changed = True
                     lb.set_instruction_pointer(instruction)
                     lb.instruction_pointer.set_issued_cycle(self.clock_cycle)
-                    if self.verbose_mode == True:
-                        print("Issued: ", instruction)
+                    station = lb
+                    if len(self.issue_listeners) > 0:
+                        self.notify(self.issue_listeners, lb)
+
+        physical = None
+        if issued == True and writes == True:
+            physical = renaming.rename(written)
+        if issued == True and self.reorder_buffer is not None:
+            self.reorder_buffer.allocate(instruction, station, branch, physical)
                         
-        if issued == False and self.verbose_mode == True:
-            print("No avalible Function Units this  clock cycle for Instruction: ", instruction)
+        if issued == False and len(self.stall_listeners) > 0:
+            if self.reorder_buffer is not None and self.reorder_buffer.is_full() == True:
+                self.stall_reason = SimulationObserver.STALL_ROB
+            elif renaming is not None:
+                self.stall_reason = SimulationObserver.STALL_RENAME if renaming.blocked == True else SimulationObserver.STALL_STRUCTURAL
+            elif pending[destination.index] != 0 or pending[operand2.index] != 0 or (unit != self.MEMORY and unit != self.BRANCH and pending[operand1.index] != 0):
+                self.stall_reason = SimulationObserver.STALL_REGISTER
+            else:
+                self.stall_reason = SimulationObserver.STALL_STRUCTURAL
+            for listener in self.stall_listeners:
+                listener(self.clock_cycle, instruction, self.stall_reason)
         return issued # determine if instruction issued or not, if not issued need to be next instrucion instead of new front of queue
+
+    #######################################################################
+    # Load an instruction for the Adder or Multiplier Functional Unit
+    # into the idle Reservation Station rs. The opcode, latency and
+    # operands are the ones issue_instruction resolved; the destination
+    # of a branch is None.
+    #######################################################################
+    def issue_to_reservation_station(self, rs, instruction, opcode, latency, destination, operand1, operand2):
+        rs.set_op(opcode)
+        rs.set_time(latency)
+        rs.latency = latency
+
+        ################################################
+        # Determine Instruction Register locations
+        #
+        # If the operand's value depends on the result
+        # of another station that hasn't completed yet
+        # (operandX.get_buffer() not in (None, rs)),
+        # then set the Reservation Station's qX
+        # parameter to the buffer it is waiting for.
+        #
+        # Otherwise, set the vX parameter to
+        # the current value of the register,
+        # and then update the latest location of the
+        # register to this Reservation Station (with
+        # renaming, only the register it writes).
+        #
+        # A register named twice (ADDD F0, F0, F2 or
+        # MULTD F1, F0, F0) is claimed once: the
+        # sources are read first, and a register this
+        # station already holds is not waited on.
+        #
+        ################################################
+        if operand1.get_buffer() not in (None, rs):
+            rs.set_qj(operand1) # Save pointer to buffer that will produce this operand.
+            self.add_pending_register(operand1)
+        else:
+            rs.set_vj(operand1)
+            if self.claim_sources == True:
+                operand1.set_buffer(rs)
+            
+        if operand2.get_buffer() not in (None, rs):
+            rs.set_qk(operand2) # Save pointer to buffer that will produce this operand.
+            self.add_pending_register(operand2)
+        else:
+            rs.set_vk(operand2)
+            if self.claim_sources == True:
+                operand2.set_buffer(rs)
+            
+        if destination == None: # branches write no register
+            pass
+        elif destination.get_buffer() not in (None, rs):
+            rs.set_source_buffer(destination) 
+            self.add_pending_register(destination)
+        else:
+            rs.set_source(destination)
+            destination.set_buffer(rs)
+            
+        rs.set_busy_status(True)
+        self.station_pools[rs].update_waiting(rs)
+        rs.set_instruction_pointer(instruction)
+        rs.instruction_pointer.set_issued_cycle(self.clock_cycle)
+        self.state_changed = True
+        
+        if len(self.issue_listeners) > 0:
+            self.notify(self.issue_listeners, rs)
     
     def execute_instructions(self):
         ######################################
         # Run Execution Cycle for the Adders
         ######################################
-        for rs in self.fp_adders.values():
+        for rs in self.fp_adder_pool.busy:
 
             # Case: Reservation Station is occupied and all operands are ready and available
-            if rs.get_busy_status() == True and rs.get_qj() == None and rs.get_qk() == None and rs.get_source_buffer() == None:
+            if rs.get_busy_status() == True and rs.get_qj() == None and rs.get_qk() == None and rs.get_source_buffer() == None and rs.get_time() != 0: # time 0: waiting for the CDB
 
                 # Dispatch the instruction if it's issue_delay period has passed and all its registers have been written back to.
-                if rs.instruction_pointer.issue_delay == False and rs.get_vk().get_write_back() == True and rs.get_vj().get_write_back() == True and rs.get_source().get_write_back() == True:
-                    if rs.get_time() == self.instruction_latency[rs.get_op()]:
-                        rs.instruction_pointer.set_execute_start_cycle(self.clock_cycle)
-                        
-                    rs.set_time(rs.get_time()- 1)
-                    rs.executing_cycles += 1
+                if rs.instruction_pointer.issue_delay == False and rs.get_vk().get_write_back() == True and rs.get_vj().get_write_back() == True and (rs.get_source() == None or rs.get_source().get_write_back() == True):
+                    if rs.get_time() != rs.latency or self.start_execution(rs) == True: # False while no functional unit is free
+                        rs.set_time(rs.get_time()- 1)
+                        rs.executing_cycles += 1
+                        self.fp_adder_pool.executing_cycles += 1
                     
-                    if rs.get_time() == 0:
-                        rs.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                        if rs.get_time() == 0:
+                            rs.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                            self.finish_execution(rs)
                 else:  
+                    self.cycle_event = True
                     rs.instruction_pointer.set_issue_delay(False)
-                    
-                    if rs.get_vk().get_write_back() == False:
-                        rs.get_vk().set_write_back(True)
-                        
-                    if rs.get_vj().get_write_back() == False:
-                        rs.get_vj().set_write_back(True)
-                        
-                    if rs.get_source().get_write_back() == False:
-                        rs.get_source().set_write_back(True)
+                    if self.claim_sources == True: # with renaming, written registers are reset by RenameTable.settle
+                        if rs.get_vk().get_write_back() == False:
+                            rs.get_vk().set_write_back(True)
+                        if rs.get_vj().get_write_back() == False:
+                            rs.get_vj().set_write_back(True)
+                        if rs.get_source() != None and rs.get_source().get_write_back() == False:
+                            rs.get_source().set_write_back(True)
 
             # Case: Reservation Station is occupied and the first operand is a buffer
             if rs.get_busy_status() == True and rs.get_qj() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_qj().get_name()].get_buffer() == None:
+                if rs.get_qj().get_buffer() in (None, rs):
                     rs.set_vj(rs.get_qj())
-                    self.registers[rs.get_vj().get_name()].set_buffer(rs) # Claim the register for this reservation station.
+                    if self.claim_sources == True:
+                        rs.get_vj().set_buffer(rs) # Claim the register for this reservation station.
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_qj())
                     rs.set_qj(None)
+                    self.station_pools[rs].update_waiting(rs)
                     
-                rs.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(rs)
 
             # Case: Reservation Station is occupied and the second operand is a buffer
             if rs.get_busy_status() == True and rs.get_qk() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_qk().get_name()].get_buffer() == None:
+                if rs.get_qk().get_buffer() in (None, rs):
                     rs.set_vk(rs.get_qk())
-                    self.registers[rs.get_vk().get_name()].set_buffer(rs) # Claim the register for this reservation station.
+                    if self.claim_sources == True:
+                        rs.get_vk().set_buffer(rs) # Claim the register for this reservation station.
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_qk())
                     rs.set_qk(None)
+                    self.station_pools[rs].update_waiting(rs)
                     
-                rs.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(rs)
                 
 
             # Case: Reservation Station is occupied and the destination operand is a buffer
             if rs.get_busy_status() == True and rs.get_source_buffer() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_source_buffer().get_name()].get_buffer() == None:
+                if rs.get_source_buffer().get_buffer() in (None, rs):
                     rs.set_source(rs.get_source_buffer())
-                    self.registers[rs.get_source_buffer().get_name()].set_buffer(rs) # Claim the register for this reservation station.
+                    rs.get_source_buffer().set_buffer(rs) # Claim the register for this reservation station.
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_source_buffer())
                     rs.set_source_buffer(None)
+                    self.station_pools[rs].update_waiting(rs)
 
             if rs.get_busy_status() == True:
                 rs.busy_cycles += 1
@@ -969,61 +2703,71 @@ class Tomasulo:
         ###########################################
         # Run Execution Cycle for the Multipliers
         ###########################################
-        for rs in self.fp_multipliers.values():
+        for rs in self.fp_multiplier_pool.busy:
             
             # Case: Reservation Station is occupied and all operands are ready and available
-            if rs.get_busy_status() == True and rs.get_qj() == None and rs.get_qk() == None and rs.get_source_buffer() == None:
+            if rs.get_busy_status() == True and rs.get_qj() == None and rs.get_qk() == None and rs.get_source_buffer() == None and rs.get_time() != 0: # time 0: waiting for the CDB
                 # Dispatch the instruction if it's issue_delay period has passed and all its registers have been written back to.
                 if rs.instruction_pointer.issue_delay == False and rs.get_vk().get_write_back() == True and rs.get_vj().get_write_back() == True and rs.get_source().get_write_back() == True:
-                    if rs.get_time() == self.instruction_latency[rs.get_op()]:
-                        rs.instruction_pointer.set_execute_start_cycle(self.clock_cycle)
-                        
-                    rs.set_time(rs.get_time()- 1)
-                    rs.executing_cycles += 1
+                    if rs.get_time() != rs.latency or self.start_execution(rs) == True: # False while no functional unit is free
+                        rs.set_time(rs.get_time()- 1)
+                        rs.executing_cycles += 1
+                        self.fp_multiplier_pool.executing_cycles += 1
                     
-                    if rs.get_time() == 0:
-                        rs.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                        if rs.get_time() == 0:
+                            rs.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                            self.finish_execution(rs)
                 else:
+                    self.cycle_event = True
                     rs.instruction_pointer.set_issue_delay(False)
-                    
-                    if rs.get_vk().get_write_back() == False:
-                        rs.get_vk().set_write_back(True)
-                        
-                    if rs.get_vj().get_write_back() == False:
-                        rs.get_vj().set_write_back(True)
-                        
-                    if rs.get_source().get_write_back() == False:
-                        rs.get_source().set_write_back(True)
+                    if self.claim_sources == True: # with renaming, written registers are reset by RenameTable.settle
+                        if rs.get_vk().get_write_back() == False:
+                            rs.get_vk().set_write_back(True)
+                        if rs.get_vj().get_write_back() == False:
+                            rs.get_vj().set_write_back(True)
+                        if rs.get_source().get_write_back() == False:
+                            rs.get_source().set_write_back(True)
 
             # Case: Reservation Station is occupied and the first operand is a buffer
             if rs.get_busy_status() == True and rs.get_qj() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_qj().get_name()].get_buffer() == None:
+                if rs.get_qj().get_buffer() in (None, rs):
                     rs.set_vj(rs.get_qj())
-                    self.registers[rs.get_vj().get_name()].set_buffer(rs)
+                    if self.claim_sources == True:
+                        rs.get_vj().set_buffer(rs)
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_qj())
                     rs.set_qj(None)
+                    self.station_pools[rs].update_waiting(rs)
                     
-                rs.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(rs)
 
             # Case: Reservation Station is occupied and the second operand is a buffer
             if rs.get_busy_status() == True and rs.get_qk() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_qk().get_name()].get_buffer() == None:
+                if rs.get_qk().get_buffer() in (None, rs):
                     rs.set_vk(rs.get_qk())
-                    self.registers[rs.get_vk().get_name()].set_buffer(rs)
+                    if self.claim_sources == True:
+                        rs.get_vk().set_buffer(rs)
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_qk())
                     rs.set_qk(None)
+                    self.station_pools[rs].update_waiting(rs)
                     
-                rs.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(rs)
 
             # Case: Reservation Station is occupied and the destination operand is a buffer
             if rs.get_busy_status() == True and rs.get_source_buffer() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[rs.get_source_buffer().get_name()].get_buffer() == None:
+                if rs.get_source_buffer().get_buffer() in (None, rs):
                     rs.set_source(rs.get_source_buffer())
-                    self.registers[rs.get_source_buffer().get_name()].set_buffer(rs)
+                    rs.get_source_buffer().set_buffer(rs)
+                    self.state_changed = True
+                    self.remove_pending_register(rs.get_source_buffer())
                     rs.set_source_buffer(None)
+                    self.station_pools[rs].update_waiting(rs)
                     
-                rs.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(rs)
                 
             if rs.get_busy_status() == True:
                     rs.busy_cycles += 1
@@ -1031,52 +2775,63 @@ class Tomasulo:
         ################################################
         # Run Execution Cycle for the Memory Interface
         ################################################
-        for lb in self.loadbuffers.values():
+        for lb in self.loadbuffer_pool.busy:
 
             # Case: LoadBuffer is occupied and all operands are ready and available
-            if lb.get_busy_status() == True and lb.get_qj() == None and lb.get_source_buffer() == None:
+            if lb.get_busy_status() == True and lb.get_qj() == None and lb.get_source_buffer() == None and lb.get_time() != 0:
                 # Dispatch the instruction if it's issue_delay period has passed and all its registers have been written back to.
                 if lb.instruction_pointer.issue_delay == False and lb.get_vj().get_write_back() == True and lb.get_source().get_write_back() == True: # NOT GETTING IN HERE
-                    if lb.get_time() == self.instruction_latency[lb.get_op()]:
-                        lb.instruction_pointer.set_execute_start_cycle(self.clock_cycle)
-                        
-                    lb.set_time(lb.get_time()- 1)
-                    lb.executing_cycles += 1
+                    if lb.get_time() != lb.latency or self.start_execution(lb) == True: # False while no functional unit is free
+                        lb.set_time(lb.get_time()- 1)
+                        lb.executing_cycles += 1
+                        self.loadbuffer_pool.executing_cycles += 1
                     
-                    if lb.get_time() == 0:
-                        lb.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                        if lb.get_time() == 0:
+                            lb.instruction_pointer.set_execute_end_cycle(self.clock_cycle)
+                            self.finish_execution(lb)
                 else:
+                    self.cycle_event = True
                     lb.instruction_pointer.set_issue_delay(False)
-                    
-                    if lb.get_vj().get_write_back() == False:
-                        lb.get_vj().set_write_back(True)
-                        
-                    if lb.get_source().get_write_back() == False:
-                        lb.get_source().set_write_back(True)
+                    if self.claim_sources == True: # with renaming, written registers are reset by RenameTable.settle
+                        if lb.get_vj().get_write_back() == False:
+                            lb.get_vj().set_write_back(True)
+                        if lb.get_source().get_write_back() == False:
+                            lb.get_source().set_write_back(True)
 
             # Case: Load Buffer is occupied and the destination operand is a buffer
             if lb.get_busy_status() == True and lb.get_qj() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[lb.get_qj().get_name()].get_buffer() == None:
+                if lb.get_qj().get_buffer() in (None, lb):
                     lb.set_vj(lb.get_qj())
-                    self.registers[lb.get_vj().get_name()].set_buffer(lb)
+                    if self.claim_sources == True:
+                        lb.get_vj().set_buffer(lb)
+                    self.state_changed = True
+                    self.remove_pending_register(lb.get_qj())
                     lb.set_qj(None)
+                    self.station_pools[lb].update_waiting(lb)
                     
-                lb.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(lb)
 
             # Case: Load Buffer is occupied and the destination operand is a buffer
             if lb.get_busy_status() == True and lb.get_source_buffer() != None:
                 # Check if the register is claimed by another buffer. If not, claim it.
-                if self.registers[lb.get_source_buffer().get_name()].get_buffer() == None:
+                if lb.get_source_buffer().get_buffer() in (None, lb):
                     lb.set_source(lb.get_source_buffer())
-                    self.registers[lb.get_source_buffer().get_name()].set_buffer(lb)
+                    if self.claim_sources == True:
+                        lb.get_source_buffer().set_buffer(lb)
+                    self.state_changed = True
+                    self.remove_pending_register(lb.get_source_buffer())
                     lb.set_source_buffer(None)
+                    self.station_pools[lb].update_waiting(lb)
                     
-                lb.instruction_pointer.set_issue_delay(False)
+                self.clear_issue_delay(lb)
                 
             if lb.get_busy_status() == True:
                 lb.busy_cycles += 1    
 
+        for pool in (self.fp_adder_pool, self.fp_multiplier_pool, self.loadbuffer_pool):
+            pool.busy_cycles += pool.num_busy()
+
     #############################################################
     # Write-Back Execution Results and clear stations/buffers
     #
@@ -1085,18 +2840,20 @@ class Tomasulo:
     #       here to send it back on clock cycle 87
     #############################################################
     def write_back(self):
+        granted = None # every finished station, unless the CDB limits the broadcasts
+        if self.cdb is not None:
+            granted = self.cdb.grant()
 
         # Write-back and clear adders
-        for rs in self.fp_adders.values():
-            if rs.get_busy_status() == True and rs.get_time() == 0:
-                self.registers[rs.get_vj().get_name()].set_buffer(None) 
-                self.registers[rs.get_vk().get_name()].set_buffer(None)
-                self.registers[rs.get_source().get_name()].set_buffer(None)
+        for rs in list(self.fp_adder_pool.busy):
+            if rs.get_busy_status() == True and rs.get_time() == 0 and (granted is None or rs in granted):
+                self.release_register(rs.get_vj(), rs)
+                self.release_register(rs.get_vk(), rs)
+                self.release_register(rs.get_source(), rs) # None for branches
+                if self.rename_table is not None:
+                    self.rename_write_back(rs)
 
                 # Clear the Reservation Station
-                rs.get_vk().set_write_back(False)
-                rs.get_vj().set_write_back(False)
-                rs.get_source().set_write_back(False)
                 rs.set_time(None)
                 rs.set_op(None)
                 rs.set_vj(None)
@@ -1106,20 +2863,23 @@ class Tomasulo:
                 rs.set_source(None)
                 rs.set_source_buffer(None)
                 rs.set_busy_status(False)
+                self.fp_adder_pool.release(rs)
                 rs.instruction_pointer.set_write_back_cycle(self.clock_cycle)
+                self.state_changed = True
+                if len(self.writeback_listeners) > 0:
+                    self.notify(self.writeback_listeners, rs)
                 rs.set_instruction_pointer(None)
 
         # Write-back and clear Multipliers
-        for rs in self.fp_multipliers.values():
-            if rs.get_busy_status() == True and rs.get_time() == 0:
-                self.registers[rs.get_vj().get_name()].set_buffer(None) 
-                self.registers[rs.get_vk().get_name()].set_buffer(None)
-                self.registers[rs.get_source().get_name()].set_buffer(None)
+        for rs in list(self.fp_multiplier_pool.busy):
+            if rs.get_busy_status() == True and rs.get_time() == 0 and (granted is None or rs in granted):
+                self.release_register(rs.get_vj(), rs)
+                self.release_register(rs.get_vk(), rs)
+                self.release_register(rs.get_source(), rs)
+                if self.rename_table is not None:
+                    self.rename_write_back(rs)
 
                 # Clear the Reservation Station
-                rs.get_vk().set_write_back(False)
-                rs.get_vj().set_write_back(False)
-                rs.get_source().set_write_back(False)
                 rs.set_time(None)
                 rs.set_op(None)
                 rs.set_vj(None)
@@ -1129,100 +2889,184 @@ class Tomasulo:
                 rs.set_source(None)
                 rs.set_source_buffer(None)
                 rs.set_busy_status(False)
+                self.fp_multiplier_pool.release(rs)
                 rs.instruction_pointer.set_write_back_cycle(self.clock_cycle)
+                self.state_changed = True
+                if len(self.writeback_listeners) > 0:
+                    self.notify(self.writeback_listeners, rs)
                 rs.set_instruction_pointer(None)
 
         # Write-back and clear Load Buffers
-        for lb in self.loadbuffers.values():
-            if lb.get_busy_status() == True and lb.get_time() == 0: # lb is only set to false here 
-                self.registers[lb.get_vj().get_name()].set_buffer(None)
-                self.registers[lb.get_source().get_name()].set_buffer(None)
+        for lb in list(self.loadbuffer_pool.busy):
+            if lb.get_busy_status() == True and lb.get_time() == 0 and (granted is None or lb in granted): # lb is only set to false here 
+                self.release_register(lb.get_vj(), lb)
+                self.release_register(lb.get_source(), lb)
+                if self.rename_table is not None:
+                    self.rename_write_back(lb)
 
                 # Clear the Load Buffer
-                lb.get_vj().set_write_back(False)
-                lb.get_source().set_write_back(False)
                 lb.set_time(None)
                 lb.set_address(None)
                 lb.set_vj(None)
                 lb.set_qj(None)
                 lb.set_busy_status(False)
+                self.loadbuffer_pool.release(lb)
                 lb.set_source(None)
                 lb.set_source_buffer(None)
+                if self.memory_system is not None:
+                    self.memory_system.retire(lb)
                 lb.instruction_pointer.set_write_back_cycle(self.clock_cycle)
+                self.state_changed = True
+                if len(self.writeback_listeners) > 0:
+                    self.notify(self.writeback_listeners, lb)
                 lb.set_instruction_pointer(None)
+
+        if self.reorder_buffer is not None and len(self.reorder_buffer.mispredicted) > 0:
+            self.resolve_mispredictions()
                 
         self.check_register_buffers()
 
+    #######################################################################
+    # A station that writes back frees the registers it claimed. Each is
+    # marked as just written (write_back False), so the instructions
+    # reading it wait a cycle before they execute.
+    #######################################################################
+    def release_register(self, register, station):
+        if register != None and register.get_buffer() is station:
+            register.set_buffer(None)
+            register.set_write_back(False)
+
+    # The physical register a renamed instruction writes now holds its value; without a reorder buffer the
+    # instruction also retires, freeing the physical register it replaced.
+    def rename_write_back(self, station):
+        if station.get_source() == None or station.get_op() == "STDD": # branches and stores write no register
+            return
+        self.rename_table.written(station.get_source())
+        if self.reorder_buffer is None:
+            self.rename_table.retire(station.get_source())
+
     ##########################################################
     # Helper function used to prevent deadlocks from issued
     # instructions coming before buffers are set
     ##########################################################
     def check_register_buffers(self): # helper function used to prevent deadlocks from issued instructions coming before buffers are set
         # Check Adders
-        for rs in self.fp_adders.values():
-            if rs.get_busy_status() == True and rs.get_qj() != None and self.registers[rs.get_qj().get_name()].get_buffer() == None: # python and is sequential so by checking to make sure not none then the last condition will not result in Nonetype error
+        for rs in list(self.fp_adder_pool.waiting):
+            if rs.get_busy_status() == True and rs.get_qj() != None and rs.get_qj().get_buffer() in (None, rs): # python and is sequential so by checking to make sure not none then the last condition will not result in Nonetype error
                 rs.set_vj(rs.get_qj())
-                self.registers[rs.get_qj().get_name()].set_buffer(rs)
+                if self.claim_sources == True:
+                    rs.get_qj().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_qj())
                 rs.set_qj(None)
-            elif rs.get_busy_status() == True and rs.get_qk() != None and self.registers[rs.get_qk().get_name()].get_buffer() == None:
+                self.station_pools[rs].update_waiting(rs)
+            elif rs.get_busy_status() == True and rs.get_qk() != None and rs.get_qk().get_buffer() in (None, rs):
                 rs.set_vk(rs.get_qk())
-                self.registers[rs.get_qk().get_name()].set_buffer(rs)
+                if self.claim_sources == True:
+                    rs.get_qk().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_qk())
                 rs.set_qk(None)
-            elif rs.get_busy_status() == True and rs.get_source_buffer() != None and self.registers[rs.get_source_buffer().get_name()].get_buffer() == None:
+                self.station_pools[rs].update_waiting(rs)
+            elif rs.get_busy_status() == True and rs.get_source_buffer() != None and rs.get_source_buffer().get_buffer() in (None, rs):
                 rs.set_source(rs.get_source_buffer())
-                self.registers[rs.get_source_buffer().get_name()].set_buffer(rs)
+                rs.get_source_buffer().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_source_buffer())
                 rs.set_source_buffer(None)
+                self.station_pools[rs].update_waiting(rs)
 
         # Check Multipliers
-        for rs in self.fp_multipliers.values():
-            if rs.get_busy_status() == True and rs.get_qj() != None and self.registers[rs.get_qj().get_name()].get_buffer() == None:
+        for rs in list(self.fp_multiplier_pool.waiting):
+            if rs.get_busy_status() == True and rs.get_qj() != None and rs.get_qj().get_buffer() in (None, rs):
                 rs.set_vj(rs.get_qj())
-                self.registers[rs.get_qj().get_name()].set_buffer(rs)
+                if self.claim_sources == True:
+                    rs.get_qj().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_qj())
                 rs.set_qj(None)
-            elif rs.get_busy_status() == True and rs.get_qk() != None and self.registers[rs.get_qk().get_name()].get_buffer() == None:
+                self.station_pools[rs].update_waiting(rs)
+            elif rs.get_busy_status() == True and rs.get_qk() != None and rs.get_qk().get_buffer() in (None, rs):
                 rs.set_vk(rs.get_qk())
-                self.registers[rs.get_qk().get_name()].set_buffer(rs)
+                if self.claim_sources == True:
+                    rs.get_qk().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_qk())
                 rs.set_qk(None)
-            elif rs.get_busy_status() == True and rs.get_source_buffer() != None and self.registers[rs.get_source_buffer().get_name()].get_buffer() == None:
+                self.station_pools[rs].update_waiting(rs)
+            elif rs.get_busy_status() == True and rs.get_source_buffer() != None and rs.get_source_buffer().get_buffer() in (None, rs):
                 rs.set_source(rs.get_source_buffer())
-                self.registers[rs.get_source_buffer().get_name()].set_buffer(rs)
+                rs.get_source_buffer().set_buffer(rs)
+                self.state_changed = True
+                self.remove_pending_register(rs.get_source_buffer())
                 rs.set_source_buffer(None)
+                self.station_pools[rs].update_waiting(rs)
 
         # Check Load Buffers
-        for lb in self.loadbuffers.values():
-            if lb.get_busy_status() == True and lb.get_qj() != None and self.registers[lb.get_qj().get_name()].get_buffer() == None:
+        for lb in list(self.loadbuffer_pool.waiting):
+            if lb.get_busy_status() == True and lb.get_qj() != None and lb.get_qj().get_buffer() in (None, lb):
                 lb.set_vj(lb.get_qj())
-                self.registers[lb.get_qj().get_name()].set_buffer(lb)
+                if self.claim_sources == True:
+                    lb.get_qj().set_buffer(lb)
+                self.state_changed = True
+                self.remove_pending_register(lb.get_qj())
                 lb.set_qj(None)
-            elif lb.get_busy_status() == True and lb.get_source_buffer() != None and self.registers[lb.get_source_buffer().get_name()].get_buffer() == None:
+                self.station_pools[lb].update_waiting(lb)
+            elif lb.get_busy_status() == True and lb.get_source_buffer() != None and lb.get_source_buffer().get_buffer() in (None, lb):
                 lb.set_source(lb.get_source_buffer())
-                self.registers[lb.get_source_buffer().get_name()].set_buffer(lb)
+                if self.claim_sources == True:
+                    lb.get_source_buffer().set_buffer(lb)
+                self.state_changed = True
+                self.remove_pending_register(lb.get_source_buffer())
                 lb.set_source_buffer(None)
+                self.station_pools[lb].update_waiting(lb)
     
     def empty_reservation_stations(self):
-        for rs in self.fp_adders.values():
-            if rs.get_busy_status() == True:
-                return False
-        for rs in self.fp_multipliers.values():
-            if rs.get_busy_status() == True:
-                return False
-        for lb in self.loadbuffers.values():
-            if lb.get_busy_status() == True:
-                return False
-        return True
+        return self.fp_adder_pool.num_busy() == 0 and self.fp_multiplier_pool.num_busy() == 0 and self.loadbuffer_pool.num_busy() == 0
 
-    def update_utilizations(self):
-        for rs in self.fp_adders.values():
-            rs.busy_fraction = rs.busy_cycles/self.clock_cycle
-            rs.executing_fraction = rs.executing_cycles/self.clock_cycle
-        for rs in self.fp_multipliers.values():
-            rs.busy_fraction = rs.busy_cycles/self.clock_cycle
-            rs.executing_fraction = rs.executing_cycles/self.clock_cycle
-        for lb in self.loadbuffers.values():
-            lb.busy_fraction = lb.busy_cycles/self.clock_cycle
-            lb.executing_fraction = lb.executing_cycles/self.clock_cycle
+    #######################################################################
+    # Bookkeeping for pending_registers: a station started or stopped
+    # waiting for the given register in its qj, qk or source buffer.
+    #######################################################################
+    def add_pending_register(self, register):
+        self.pending_registers[register.index] += 1
 
-    def buffer_registers(self): # list of registers that are in qj, qk and source buffer to be used to check when to block issue instruction
+    def remove_pending_register(self, register):
+        self.pending_registers[register.index] -= 1
+
+    #######################################################################
+    # Resolve the opcodes and operands the instruction queue has numbered
+    # since the last call into opcode_table and operand_table. Register
+    # operands are looked up by name in the register file here, once,
+    # so the simulation itself never hashes a name. Called again whenever
+    # an instruction is dequeued, since a streamed trace numbers new
+    # operands (load/store offsets) as its chunks are read.
+    #######################################################################
+    def resolve_instruction_queue(self):
+        trace = self.instruction_queue.trace
+        if len(self.opcode_table) == len(trace.opcode_names) and len(self.operand_table) == len(trace.operands):
+            return
+        for opcode in trace.opcode_names[len(self.opcode_table):]:
+            if opcode not in self.instruction_latency:
+                raise ValueError(f"No latency given for opcode {opcode}: add it to the opcodes argument" + (" (branch opcodes are not in the module's opcodes list)" if opcode in BRANCH_OPCODES else ""))
+            if opcode == "ADDD" or opcode == "SUBD":
+                unit = self.FP_ADDER
+            elif opcode == "MULTD" or opcode == "DIVD":
+                unit = self.FP_MULTIPLIER
+            elif opcode in BRANCH_OPCODES:
+                unit = self.BRANCH
+            else:
+                unit = self.MEMORY
+            self.opcode_table.append((opcode, unit, self.instruction_latency[opcode]))
+        for operand in trace.operands[len(self.operand_table):]:
+            if isinstance(operand, Register):
+                if operand.get_name() not in self.registers:
+                    raise ValueError(f"Register {operand.get_name()} is not in the register file")
+                operand = self.registers[operand.get_name()]
+            self.operand_table.append(operand)
+            self.address_offsets.append(operand.get_value() if self.memory_system is not None and isinstance(operand, address_offset) else None)
+
+    def buffer_registers(self): # list of registers that are in qj, qk and source buffer, rebuilt by scanning every station (issue_instruction uses pending_registers instead)
         registers = []
         for rs in self.fp_adders.values():
             if rs.get_qj() != None:
@@ -1248,96 +3092,385 @@ class Tomasulo:
         return registers
         
         
-    def run_algorithim(self): 
-        self.update_simulation_results()
-        if self.dispatch_size == 1:
-            while self.instruction_queue.is_empty() != True:
-                if self.verbose_mode == True:
-                    print("\n")
-                instruction = self.instruction_queue.soft_dequeue()
-                issued = self.issue_instruction(instruction) # boolean based on if instruction was issued
-                if issued == False:
-                    while issued == False:
-                        issued = self.issue_instruction(instruction)
-                        self.write_back()
-                        self.execute_instructions()
-                        self.increment_clock_cycle()
-                        self.update_utilizations()
-                        if self.verbose_mode == True:
-                            self.display_simulation()
-                        self.update_simulation_results()
-                else:
-                    self.write_back()
-                    self.execute_instructions()
-                    self.increment_clock_cycle()
-                    self.update_utilizations()
-                    if self.verbose_mode == True:
-                        self.display_simulation()
-                    self.update_simulation_results()
-            while self.empty_reservation_stations() != True: # finish execution after all instructions are issued 
-                self.write_back()
-                self.execute_instructions()
-                self.increment_clock_cycle()
-                self.update_utilizations()
-                if self.verbose_mode == True:
-                    self.display_simulation()
-                self.update_simulation_results()
-            if self.verbose_mode == True:
-                print("\nRESULTS TABLE\n")
-                print(self.instruction_queue)
-            utilizations = self.return_utilizations()
-            return self.instruction_queue, self.output, utilizations, self.parameters
-        elif self.dispatch_size == 2:
-            while self.instruction_queue.is_empty() != True:
+    #######################################################################
+    #
+    # Method: run_algorithim
+    #
+    # Runs the simulation until every instruction in the queue has been
+    # issued and every Reservation Station and Load Buffer is empty.
+    #
+    # Parameters:
+    #     Tomasulo * self
+    #     bool lazy - when True, returns a generator that runs the
+    #                 simulation as it is consumed and yields the
+    #                 CycleSnapshot of every cycle the snapshot sink
+    #                 asks for.
+    #
+    # Returns: (instruction_queue, output, utilizations, parameters),
+    #          or the generator described above when lazy is True.
+    #
+    #######################################################################
+    def run_algorithim(self, lazy = False):
+        if self.dispatch_size < 1:
+            raise ValueError("Please make sure dispatch_size parameter in Tomasulo class variable is at least 1")
+        if lazy == True:
+            return self.iterate_cycles()
+        for record in self.iterate_cycles():
+            pass
+        utilizations = self.return_utilizations()
+        return self.instruction_queue, self.output, utilizations, self.parameters
+
+    #######################################################################
+    #
+    # Method: iterate_cycles
+    #
+    # Generator behind run_algorithim. Every clock cycle up to
+    # dispatch_size instructions are issued in program order: issue stops
+    # at the first instruction that cannot issue, and that instruction is
+    # retried first in the following cycles (in-order issue stall).
+    #
+    #######################################################################
+    def iterate_cycles(self):
+        self.resolve_instruction_queue()
+        snapshot = self.update_simulation_results()
+        if snapshot is not None:
+            yield snapshot
+        stalled = None # instruction taken from the queue that could not issue yet
+        while True:
+            issuing = stalled is not None or self.instruction_queue.is_empty() != True
+            if issuing == False and self.empty_reservation_stations() == True and (self.reorder_buffer is None or self.reorder_buffer.is_empty() == True):
+                break
+            if issuing == True:
                 if self.verbose_mode == True:
                     print("\n")
-                instruction1 = self.instruction_queue.soft_dequeue()
-                issued1 = self.issue_instruction(instruction1) # boolean based on if instruction was issued
-                instruction2= self.instruction_queue.soft_dequeue()
-                issued2 = self.issue_instruction(instruction2)
-                if issued1 == False or issued2 == False:
-                    while issued1 == False:
-                        issued1 = self.issue_instruction(instruction1)
-                        self.write_back()
-                        self.execute_instructions()
-                        self.increment_clock_cycle()
-                        self.update_utilizations()
-                        if self.verbose_mode == True:
-                            self.display_simulation()
-                        self.update_simulation_results()
-                    while issued2 == False:
-                        issued2 = self.issue_instruction(instruction2)
-                        self.write_back()
-                        self.execute_instructions()
-                        self.increment_clock_cycle()
-                        self.update_utilizations()
-                        if self.verbose_mode == True:
-                            self.display_simulation()
-                        self.update_simulation_results()
-                else:
-                    self.write_back()
-                    self.execute_instructions()
-                    self.increment_clock_cycle()
-                    self.update_utilizations()
-                    if self.verbose_mode == True:
-                        self.display_simulation()
-                    self.update_simulation_results()
-            while self.empty_reservation_stations() != True: # finish execution after all instructions are issued 
-                self.write_back()
-                self.execute_instructions()
-                self.increment_clock_cycle()
-                self.update_utilizations()
-                if self.verbose_mode == True:
-                    self.display_simulation()
-                self.update_simulation_results()
-            if self.verbose_mode == True:
-                print("\nRESULTS TABLE\n")
-                print(self.instruction_queue)
-            utilizations = self.return_utilizations()
-            return self.instruction_queue, self.output, utilizations, self.parameters  
-        else:
-            raise ValueError("Please make sure dispatch_size parameter in Tomalulo class variable is either 1 or 2")
+                issued = 0
+                while issued < self.dispatch_size:
+                    if stalled is None:
+                        if self.instruction_queue.is_empty() == True:
+                            break
+                        stalled = self.instruction_queue.soft_dequeue()
+                        self.resolve_instruction_queue()
+                    if self.issue_instruction(stalled) == False: # boolean based on if instruction was issued
+                        break
+                    stalled = None
+                    issued += 1
+            # Once every instruction is issued, the cycles finish execution (and, with a reorder buffer, commit)
+            snapshot = self.step_cycle()
+            if snapshot is not None:
+                yield snapshot
+            if self.flushed == True: # a misprediction flush rewound the queue past the stalled instruction
+                stalled = None
+                self.flushed = False
+            if self.cycle_idle == True:
+                yield from self.skip_idle_cycles(stalled)
+        self.parameters[4] = self.instruction_queue.length # includes instructions streamed in during the run
+        if self.profiler is not None:
+            self.profiler.finish(self.clock_cycle)
+        self.snapshot_sink.close()
+        if self.verbose_mode == True:
+            print("\nRESULTS TABLE\n")
+            print(self.instruction_queue)
+
+    #######################################################################
+    # Advance the simulation by one clock cycle: write back finished
+    # instructions, execute the others and take the cycle's snapshot.
+    # Records in cycle_idle whether the cycle did anything besides
+    # counting down executing instructions.
+    #######################################################################
+    def step_cycle(self):
+        self.cycle_event = False
+        self.unit_waiting.clear()
+        self.memory_waiting.clear()
+        if self.rename_table is not None:
+            self.rename_table.settle()
+        if self.reorder_buffer is not None:
+            self.commit_instructions()
+        self.write_back()
+        self.execute_instructions()
+        self.increment_clock_cycle()
+        if self.reorder_buffer is not None:
+            self.reorder_buffer.occupancy_cycles += len(self.reorder_buffer.entries)
+        if self.utilization_window is not None:
+            self.utilization_window.record(self.clock_cycle)
+        self.cycle_idle = self.cycle_event == False and self.state_changed == False
+        for listener in self.cycle_listeners:
+            listener(self)
+        return self.update_simulation_results()
+
+    #######################################################################
+    #
+    # Event-Driven Time Advance
+    #
+    # Most cycles of a long-latency instruction (a DIVD counting down 40
+    # cycles) change nothing except the 'Clock Cycles Remaining' counters.
+    # Once a cycle passes without any event - no issue, operand claim,
+    # execution start or end, write-back, or write-back stall of a register -
+    # the following cycles do the same until the next station finishes
+    # executing, so the clock can jump straight to that cycle. The cycles in
+    # which stations finish executing are kept in a priority queue.
+    #
+    #######################################################################
+    def start_execution(self, station):
+        units = self.station_pools[station].units
+        if units is not None and units.next_free() > self.clock_cycle:
+            units.stalls += 1
+            self.unit_waiting.append(units)
+            return False
+        if self.memory_system is not None and isinstance(station, LoadBuffer):
+            latency = self.memory_system.start(station, station.latency)
+            if latency is None: # a load ordered behind an older store
+                self.memory_system.stalls[self.memory_system.blocked] += 1
+                self.memory_waiting.append(self.memory_system.blocked)
+                return False
+            station.set_time(latency)
+            station.latency = latency
+        if units is not None:
+            units.acquire(self.clock_cycle, self.initiation_intervals.get(station.op, 1))
+        station.instruction_pointer.set_execute_start_cycle(self.clock_cycle)
+        self.cycle_event = True
+        self.push_completion_event(station, self.clock_cycle + station.get_time() - 1)
+        if len(self.exec_start_listeners) > 0:
+            self.notify(self.exec_start_listeners, station)
+        return True
+
+    def finish_execution(self, station):
+        self.cycle_event = True
+        self.executing_stations.pop(station, None)
+        if self.cdb is not None:
+            self.cdb.request(station, self.station_indices[station])
+        if len(self.exec_end_listeners) > 0:
+            self.notify(self.exec_end_listeners, station)
+
+    def clear_issue_delay(self, station):
+        if station.instruction_pointer.issue_delay == True:
+            station.instruction_pointer.set_issue_delay(False)
+            self.cycle_event = True
+
+    def push_completion_event(self, station, end_cycle):
+        self.executing_stations[station] = self.event_sequence
+        heapq.heappush(self.completion_events, (end_cycle, self.event_sequence, station))
+        self.event_sequence += 1
+
+    #######################################################################
+    # Returns the earliest cycle in which an executing station finishes,
+    # or None when no station is executing. Events of stations that were
+    # cleared or restarted are dropped; an execution that was held up by
+    # a write-back stall is re-queued with its new finishing cycle.
+    #######################################################################
+    def next_completion_cycle(self):
+        events = self.completion_events
+        while len(events) > 0:
+            end_cycle, sequence, station = events[0]
+            if self.executing_stations.get(station) != sequence:
+                heapq.heappop(events)
+                continue
+            expected_end_cycle = self.clock_cycle + station.get_time() - 1
+            if end_cycle == expected_end_cycle:
+                return end_cycle
+            heapq.heappop(events)
+            self.push_completion_event(station, expected_end_cycle)
+        return None
 
+    #######################################################################
+    #
+    # Method: skip_idle_cycles
+    #
+    # Jumps the clock over the idle cycles before the next completion
+    # event. Must only be called right after an idle cycle in which no
+    # instruction could issue. Busy and executing counters and remaining
+    # times are advanced in bulk, and the snapshots the sink wants for the
+    # skipped cycles are derived from one snapshot taken before the jump.
+    # The stalled instruction, if any, is reported to the on_stall
+    # listeners for every skipped cycle, as it would have been retried.
+    #
+    # Returns: generator over the snapshots of the skipped cycles.
+    #
+    #######################################################################
+    def skip_idle_cycles(self, stalled = None):
+        if self.event_driven == False or len(self.cycle_listeners) > 0:
+            return
+        end_cycle = self.next_completion_cycle()
+        for units in self.unit_waiting: # a station waiting for a functional unit starts once one is free
+            if end_cycle is None or units.next_free() < end_cycle:
+                end_cycle = units.next_free()
+        if end_cycle is None:
+            return
+        skip = end_cycle - self.clock_cycle
+        if skip <= 0:
+            return
+        start_cycle = self.clock_cycle
+        for units in self.unit_waiting:
+            units.stalls += skip
+        if stalled is not None and self.rename_table is not None and self.rename_table.blocked == True:
+            self.rename_table.stalls += skip
+        for reason in self.memory_waiting: # loads wait for stores to start or finish, which are events
+            self.memory_system.stalls[reason] += skip
+        if self.reorder_buffer is not None:
+            self.reorder_buffer.occupancy_cycles += skip * len(self.reorder_buffer.entries)
+            if stalled is not None and self.reorder_buffer.is_full() == True:
+                self.reorder_buffer.full_stalls += skip
+        if stalled is not None and len(self.stall_listeners) > 0:
+            for cycle in range(start_cycle, start_cycle + skip):
+                for listener in self.stall_listeners:
+                    listener(cycle, stalled, self.stall_reason)
+        busy = [self.station_indices[station] for pool in (self.fp_adder_pool, self.fp_multiplier_pool, self.loadbuffer_pool) for station in pool.busy]
+        counting = [self.station_indices[station] for station in self.executing_stations]
+
+        wanted = self.snapshot_sink.next_wanted(start_cycle + 1)
+        if wanted is not None and wanted <= start_cycle + skip:
+            base = self.take_snapshot()
+            num_stations = len(self.stations)
+            while wanted is not None and wanted <= start_cycle + skip:
+                if self.snapshot_sink.wants(wanted, False) == True:
+                    elapsed = wanted - start_cycle
+                    large = array("i", base.large)
+                    for index in busy:
+                        large[2 * num_stations + index] += elapsed
+                    for index in counting:
+                        large[index] -= elapsed
+                        large[3 * num_stations + index] += elapsed
+                    snapshot = CycleSnapshot(base.layout, wanted, base.small, large)
+                    self.snapshot_sink.record(wanted, snapshot)
+                    yield snapshot
+                wanted = self.snapshot_sink.next_wanted(wanted + 1)
+
+        for index in busy:
+            station = self.stations[index]
+            station.busy_cycles += skip
+            self.station_pools[station].busy_cycles += skip
+        for index in counting:
+            station = self.stations[index]
+            station.set_time(station.get_time() - skip)
+            station.executing_cycles += skip
+            self.station_pools[station].executing_cycles += skip
+        self.clock_cycle += skip
+        if self.utilization_window is not None:
+            self.utilization_window.record(self.clock_cycle)
+
+    #######################################################################
+    #
+    # Reorder Buffer
+    #
+    # Instructions commit in program order once they have written back,
+    # at most commit_width per cycle. A mispredicted branch flushes the
+    # younger instructions when it writes back: their stations are
+    # cleared along with the register claims (Register.buffer) and
+    # pending_registers counts they held, and issue restarts right after
+    # the branch.
+    #
+    #######################################################################
+    def commit_instructions(self):
+        rob = self.reorder_buffer
+        write_back_cycles = self.instruction_queue.write_back_cycles
+        committed = 0
+        while committed < rob.commit_width and len(rob.entries) > 0:
+            instruction, station, branch, physical = rob.entries[0]
+            write_back_cycle = write_back_cycles[instruction.index]
+            if write_back_cycle == 0 or write_back_cycle >= self.clock_cycle:
+                break
+            rob.entries.popleft()
+            missing = instruction.index + 1 - len(rob.commit_cycles)
+            if missing > 0:
+                rob.commit_cycles.frombytes(bytes(missing * rob.commit_cycles.itemsize))
+            rob.commit_cycles[instruction.index] = self.clock_cycle
+            if physical is not None:
+                self.rename_table.retire(physical)
+            if branch is not None:
+                self.predictor.update(branch[0], branch[1])
+                rob.branches += 1
+                if branch[2] == True:
+                    rob.mispredictions += 1
+            committed += 1
+        if committed > 0:
+            rob.committed += committed
+            self.cycle_event = True
+
+    # Flushes after the oldest mispredicted branch that wrote back this cycle.
+    def resolve_mispredictions(self):
+        rob = self.reorder_buffer
+        for position, entry in enumerate(rob.mispredicted):
+            branch_instruction = entry[0]
+            if self.instruction_queue.write_back_cycles[branch_instruction.index] == self.clock_cycle:
+                del rob.mispredicted[position:] # the younger ones are flushed with the rest
+                rob.flush_cycles += self.clock_cycle - branch_instruction.get_issued_cycle()
+                self.flush_after(entry)
+                return
+
+    def flush_after(self, entry):
+        rob = self.reorder_buffer
+        queue = self.instruction_queue
+        while rob.entries[-1] is not entry:
+            instruction, station, branch, physical = rob.entries.pop()
+            if station.instruction_pointer is instruction:
+                self.squash(station)
+            if physical is not None:
+                self.rename_table.undo(physical)
+            for column in (queue.issued_cycles, queue.execute_start_cycles, queue.execute_end_cycles, queue.write_back_cycles):
+                column[instruction.index] = 0
+            rob.flushed_instructions += 1
+        queue.rewind(entry[0].index + 1)
+        self.flushed = True
+        self.state_changed = True
+        self.cycle_event = True
+
+    # Empties a station whose instruction was flushed before writing back.
+    def squash(self, station):
+        claimed = [station.vj, station.source]
+        waiting = [station.qj, station.source_buffer]
+        if isinstance(station, LoadBuffer):
+            station.set_address(None)
+            if self.memory_system is not None:
+                self.memory_system.cancel(station)
+        else:
+            claimed.append(station.vk)
+            waiting.append(station.qk)
+            station.set_vk(None)
+            station.set_qk(None)
+        for register in claimed:
+            if register != None and register.get_buffer() is station:
+                register.set_buffer(None)
+        for register in waiting:
+            if register != None:
+                self.remove_pending_register(register)
+        station.set_time(None)
+        station.set_op(None)
+        station.set_vj(None)
+        station.set_qj(None)
+        station.set_source(None)
+        station.set_source_buffer(None)
+        station.set_busy_status(False)
+        self.station_pools[station].release(station)
+        self.executing_stations.pop(station, None)
+        if self.cdb is not None:
+            self.cdb.cancel(station)
+        station.set_instruction_pointer(None)
+
+    def return_rob_statistics(self):
+        if self.reorder_buffer is None:
+            return None
+        return self.reorder_buffer.statistics(self.clock_cycle)
+
+    def return_cdb_statistics(self):
+        if self.cdb is None:
+            return None
+        return self.cdb.statistics(self.clock_cycle)
+
+    def return_rename_statistics(self):
+        if self.rename_table is None:
+            return None
+        return self.rename_table.statistics()
+
+    def return_memory_statistics(self):
+        if self.memory_system is None:
+            return None
+        return self.memory_system.statistics()
+
+    def return_unit_statistics(self):
+        statistics = {}
+        for name, pool in (("ADD", self.fp_adder_pool), ("MULT", self.fp_multiplier_pool), ("LOAD/STORE", self.loadbuffer_pool)):
+            if pool.units is not None:
+                statistics[name] = pool.units.statistics(self.clock_cycle)
+        return statistics
 
     def display_simulation(self):
         print("\n")
@@ -1352,209 +3485,1044 @@ class Tomasulo:
         self.display_registers()
         print("\n")
 
+    #######################################################################
+    # Hand this cycle's snapshot to the snapshot sink if it wants one.
+    # Returns the CycleSnapshot or None.
+    #######################################################################
     def update_simulation_results(self):
-        o_string = self.return_adders_string() + self.return_multipliers_string() + self.return_loadbuffers_string() + self.return_registers_string()
-        self.output.append([self.clock_cycle, o_string])
+        changed = self.state_changed
+        self.state_changed = False
+        if self.snapshot_sink.wants(self.clock_cycle, changed) == False:
+            return None
+        snapshot = self.take_snapshot()
+        self.snapshot_sink.record(self.clock_cycle, snapshot)
+        return snapshot
+
+    #######################################################################
+    # Pack the current state of the stations and registers into a
+    # CycleSnapshot (see SnapshotLayout for the column layout).
+    #######################################################################
+    def take_snapshot(self):
+        layout = self.snapshot_layout
+        register_id = layout.register_id
+        stations = self.stations
+        ops = []
+        busy = []
+        vj = []
+        vk = []
+        qj = []
+        qk = []
+        source = []
+        source_buffer = []
+        times = []
+        addresses = []
+        busy_cycles = []
+        executing_cycles = []
+        for station in stations:
+            ops.append(layout.opcode_id(station.op))
+            busy.append(1 if station.busy == True else 0)
+            vj.append(register_id(station.vj))
+            qj.append(register_id(station.qj))
+            source.append(register_id(station.source))
+            source_buffer.append(register_id(station.source_buffer))
+            if isinstance(station, LoadBuffer):
+                vk.append(-1)
+                qk.append(-1)
+                addresses.append(layout.address_id(station.address))
+            else:
+                vk.append(register_id(station.vk))
+                qk.append(register_id(station.qk))
+                addresses.append(-1)
+            times.append(station.time if station.time is not None else -1)
+            busy_cycles.append(station.busy_cycles)
+            executing_cycles.append(station.executing_cycles)
+        buffers = [layout.station_id(register.buffer) for register in self.station_registers.values()]
+        small = array("h", ops + busy + vj + vk + qj + qk + source + source_buffer + buffers)
+        large = array("i", times + addresses + busy_cycles + executing_cycles)
+        return CycleSnapshot(layout, self.clock_cycle, small, large)
 
     def return_utilizations(self):
         utilizations = []
         for rs in self.fp_adders.values():
-            utilizations.append([rs.get_name(), rs.busy_fraction, rs.executing_fraction])
+            utilizations.append([rs.get_name(), rs.get_busy_fraction(self.clock_cycle), rs.get_executing_fraction(self.clock_cycle)])
         for rs in self.fp_multipliers.values():
-            utilizations.append([rs.get_name(), rs.busy_fraction, rs.executing_fraction])
+            utilizations.append([rs.get_name(), rs.get_busy_fraction(self.clock_cycle), rs.get_executing_fraction(self.clock_cycle)])
         for lb in self.loadbuffers.values():
-            utilizations.append([lb.get_name(), lb.busy_fraction, lb.executing_fraction])
+            utilizations.append([lb.get_name(), lb.get_busy_fraction(self.clock_cycle), lb.get_executing_fraction(self.clock_cycle)])
         return utilizations
 
 ######################################################
 #
 # Main Program
 #
+# Importing this module only defines the simulator and
+# its helpers. The driver simulations run when the file
+# is executed as a script (see main), and matplotlib,
+# numpy and tkinter are imported when a plot is drawn.
+#
 ######################################################
 
-import matplotlib.pyplot as plt
-import tkinter as tk
-import random
-import numpy as np
-import copy
 #https://stackoverflow.com/questions/4698493/can-i-add-custom-methods-attributes-to-built-in-python-types
 
 class address_offset(str):
     def get_name(self):
         return self
 
+    # Numeric offset of "34+" or "34", for effective addresses.
+    def get_value(self):
+        try:
+            return int(self.rstrip("+"))
+        except ValueError:
+            raise ValueError(f"Address offset {self} is not a number") from None
+
+# Target of a branch with the direction it took in the trace: "label:T" (taken) or "label:N" (not taken).
+class branch_target(str):
+    def __new__(cls, text):
+        if text.endswith(":T") == False and text.endswith(":N") == False:
+            raise ValueError(f"Branch target {text} does not end in :T (taken) or :N (not taken)")
+        return super().__new__(cls, text)
+
+    def get_name(self):
+        return self
+
+    def get_label(self):
+        return self[:-2]
+
+    def get_taken(self):
+        return self.endswith(":T")
+
 opcodes = ["ADDD", "SUBD", "MULTD", "DIVD", "LDDD", "STDD"]
+default_latencies = {"ADDD": 2, "SUBD": 2, "MULTD": 10, "DIVD": 40, "LDDD": 1,"STDD": 1, "BEQ": 1, "BNE": 1}
+
+# Branches compare two registers: BNE F1, F2, loop:T. Like loads and stores they are stored as
+# (opcode, register, branch_target, register) rows. They are not in opcodes: a Tomasulo that runs
+# a trace with branches must be given them in its opcodes argument, e.g. list(default_latencies).
+BRANCH_OPCODES = ("BEQ", "BNE")
 
 # include this function outside class to keep consistent instruction stream among multiple tomasulo simulator confirgurations for testing functional unit utilization
-def generate_instruction_queue(opcodes, registers, number_instructions): 
+###########################################################
+#
+# Function: generate_instruction_queue
+#
+# Builds a random instruction queue with NumPy, all columns
+# drawn in bulk from one seeded Generator. As before, each
+# instruction's destination and two source registers are
+# distinct, and loads/stores take a random "offset+" in
+# place of their first operand.
+#
+# Parameters:
+#     opcodes             - opcodes to draw from, uniformly
+#     registers           - register file (name -> Register), at least 3
+#     number_instructions - length of the queue
+#     seed                - NumPy seed. None draws one from the
+#                           'random' module, so random.seed()
+#                           still fixes the queue.
+#     opcode_weights      - optional {opcode: weight} mix used
+#                           instead of 'opcodes'
+#     dependency_rate     - probability that a source register
+#                           reads the destination of an earlier
+#                           instruction
+#     dependency_distances - weights of the distances 1, 2, 3, ...
+#                           back to that instruction
+#                           (default: always the previous one)
+#
+###########################################################
+def generate_instruction_queue(opcodes, registers, number_instructions, seed = None, opcode_weights = None, dependency_rate = 0.0, dependency_distances = None): 
+    import numpy as np
+    register_list = list(registers.values())
+    num_registers = len(register_list)
+    if num_registers < 3:
+        raise ValueError("At least 3 registers are needed for distinct operands")
+    if seed is None:
+        seed = random.getrandbits(64)
+    rng = np.random.default_rng(seed)
+    count = int(number_instructions)
+
+    if opcode_weights is not None:
+        opcodes = list(opcode_weights)
+        weights = np.array([opcode_weights[opcode] for opcode in opcodes], dtype=float)
+        opcode = rng.choice(len(opcodes), size=count, p=weights / weights.sum())
+    else:
+        opcodes = list(opcodes)
+        opcode = rng.integers(len(opcodes), size=count)
+
+    # Distinct registers without rejection: operand1 is drawn from the other
+    # num_registers - 1 registers, and operand2 from the remaining num_registers - 2.
+    destination = rng.integers(num_registers, size=count)
+    operand1 = (destination + 1 + rng.integers(num_registers - 1, size=count)) % num_registers
+    operand2_draw = rng.integers(num_registers - 2, size=count)
+    dependency_draws = rng.random((2, count))
+    distance_draws = None
+    if dependency_rate > 0:
+        distances = np.asarray(dependency_distances if dependency_distances is not None else [1], dtype=float)
+        distance_draws = 1 + rng.choice(len(distances), size=(2, count), p=distances / distances.sum())
+        operand1 = depend_on_earlier(destination, operand1, dependency_draws[0] < dependency_rate, distance_draws[0], (destination,))
+    low = np.minimum(destination, operand1)
+    high = np.maximum(destination, operand1)
+    operand2 = operand2_draw + (operand2_draw >= low)
+    operand2 = operand2 + (operand2 >= high)
+    if distance_draws is not None:
+        operand2 = depend_on_earlier(destination, operand2, dependency_draws[1] < dependency_rate, distance_draws[1], (destination, operand1))
+    offsets = rng.integers(65536, size=count)
+
     instruction_queue = InstructionQueue()
-    for esh in range(number_instructions):
-        opcode = random.choice(opcodes)
-        destination = random.choice(list(registers.values()))
-        operand1 = random.choice(list(registers.values()))
-        operand2 = random.choice(list(registers.values()))
-        while operand1.get_name() == destination.get_name():
-            operand1 = random.choice(list(registers.values()))
-        while operand2.get_name() == destination.get_name() or operand2.get_name() == operand1.get_name():
-            operand2 = random.choice(list(registers.values()))
-        if opcode == "LDDD" or opcode == "STDD":
-            operand1 = address_offset(str(random.choice(range(65536))) + "+") # extra wrapper for address_offset datatype
-        instruction_queue.enqueue(opcode, destination, operand1, operand2)
+    opcode_ids = np.array([instruction_queue.opcode_id(name) for name in opcodes], dtype=np.uint8)
+    register_ids = np.array([instruction_queue.operand_id(register) for register in register_list], dtype=np.int32)
+    memory = np.isin(opcode, [index for index, name in enumerate(opcodes) if name == "LDDD" or name == "STDD"])
+    used_offsets, offset_index = np.unique(offsets[memory], return_inverse=True)
+    offset_ids = np.array([instruction_queue.operand_id(address_offset(str(offset) + "+")) for offset in used_offsets.tolist()], dtype=np.int32) # extra wrapper for address_offset datatype
+    operand1_ids = register_ids[operand1]
+    operand1_ids[memory] = offset_ids[offset_index]
+    instruction_queue.enqueue_columns(opcode_ids[opcode], register_ids[destination], operand1_ids, register_ids[operand2])
     return instruction_queue
 
+# Replaces operand[i] with destination[i - distance[i]] where 'depend' is set, the earlier
+# instruction exists and the register is not one of the instruction's other operands.
+def depend_on_earlier(destination, operand, depend, distance, others):
+    import numpy as np
+    positions = np.arange(len(destination))
+    earlier = positions - distance
+    depend = depend & (earlier >= 0)
+    dependency = destination[np.where(depend, earlier, 0)]
+    for other in others:
+        depend &= dependency != other
+    return np.where(depend, dependency, operand)
+
 def generate_registers(num_registers):
     registers = {}
     for esh in range(num_registers):
             registers["F" + str(esh)] = Register("F" + str(esh))
     return registers
 
-def add_labels(bars): # adds exact values on top of each bar
+######################################################
+#
+# Trace Files
+#
+# Instruction traces can be read from binary files
+# (save_binary_trace/load_binary_trace) or from
+# assembly text (load_assembly_trace).
+#
+# Binary trace format, little-endian:
+#
+#   header  - "TOMTRACE", version (uint16), record size
+#             (uint16), number of opcode names (uint16),
+#             number of register names (uint16) and
+#             number of records (uint64)
+#   names   - the opcode names, then the register names,
+#             each as a uint16 byte length and UTF-8 text
+#   records - one fixed-width record per instruction:
+#             opcode (uint8), destination, source1 and
+#             source2 register numbers (uint16) and the
+#             load/store offset (int32). A load/store has
+#             no source1 register (NO_REGISTER); other
+#             opcodes have offset 0.
+#
+# Records are read through numpy.memmap, one chunk at a
+# time as the simulation reaches them, so a trace file of
+# any size is replayed without holding it in memory as
+# Python objects.
+#
+######################################################
+
+BINARY_TRACE_MAGIC = b"TOMTRACE"
+BINARY_TRACE_VERSION = 1
+BINARY_TRACE_HEADER = struct.Struct("<8sHHHHQ")
+BINARY_TRACE_NAME_LENGTH = struct.Struct("<H")
+NO_REGISTER = 0xFFFF
+
+def binary_trace_record():
+    import numpy as np
+    return np.dtype([("opcode", "<u1"), ("destination", "<u2"), ("source1", "<u2"), ("source2", "<u2"), ("offset", "<i4")])
+
+def save_binary_trace(instruction_queue, path):
+    import numpy as np
+    trace = instruction_queue.trace
+    trace.load_all()
+    register_names = []
+    register_numbers = np.full(len(trace.operands), NO_REGISTER, dtype=np.uint16)
+    offsets = np.zeros(len(trace.operands), dtype=np.int32)
+    for operand_id, operand in enumerate(trace.operands):
+        if isinstance(operand, Register):
+            if operand.get_name() not in register_names:
+                register_names.append(operand.get_name())
+            register_numbers[operand_id] = register_names.index(operand.get_name())
+        elif isinstance(operand, branch_target):
+            raise ValueError("The binary trace format cannot hold branches")
+        else:
+            offsets[operand_id] = int(str(operand).rstrip("+"))
+    if len(trace.opcode_names) > 256 or len(register_names) >= NO_REGISTER:
+        raise ValueError("Too many opcodes or registers for the binary trace format")
+    operands1 = np.frombuffer(trace.operands1, dtype=np.int32)
+    records = np.zeros(len(trace), dtype=binary_trace_record())
+    records["opcode"] = np.frombuffer(trace.opcodes, dtype=np.uint8)
+    records["destination"] = register_numbers[np.frombuffer(trace.destinations, dtype=np.int32)]
+    records["source1"] = register_numbers[operands1]
+    records["source2"] = register_numbers[np.frombuffer(trace.operands2, dtype=np.int32)]
+    records["offset"] = offsets[operands1]
+    with open(path, "wb") as file:
+        file.write(BINARY_TRACE_HEADER.pack(BINARY_TRACE_MAGIC, BINARY_TRACE_VERSION, records.dtype.itemsize, len(trace.opcode_names), len(register_names), len(records)))
+        for name in trace.opcode_names + register_names:
+            encoded = name.encode("utf-8")
+            file.write(BINARY_TRACE_NAME_LENGTH.pack(len(encoded)))
+            file.write(encoded)
+        file.write(records.tobytes())
+
+###########################################################
+#
+# Function: load_binary_trace
+#
+# Opens a binary trace file as an InstructionQueue whose
+# trace is streamed in from the memory-mapped records,
+# chunk_size instructions at a time. Register names are
+# resolved against 'registers' once, from the header.
+#
+###########################################################
+def load_binary_trace(path, registers, chunk_size = 65536):
+    import mmap
+    import numpy as np
+    with open(path, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as header:
+            if len(header) < BINARY_TRACE_HEADER.size:
+                raise ValueError(f"{path} is not a binary trace file")
+            magic, version, record_size, num_opcodes, num_registers, count = BINARY_TRACE_HEADER.unpack_from(header, 0)
+            record = binary_trace_record()
+            if magic != BINARY_TRACE_MAGIC or version != BINARY_TRACE_VERSION or record_size != record.itemsize:
+                raise ValueError(f"{path} is not a version {BINARY_TRACE_VERSION} binary trace file")
+            position = BINARY_TRACE_HEADER.size
+            names = []
+            for esh in range(num_opcodes + num_registers):
+                (length,) = BINARY_TRACE_NAME_LENGTH.unpack_from(header, position)
+                position += BINARY_TRACE_NAME_LENGTH.size
+                names.append(bytes(header[position:position + length]).decode("utf-8"))
+                position += length
+            if len(header) != position + count * record.itemsize:
+                raise ValueError(f"{path} is truncated")
+
+    opcode_names = names[:num_opcodes]
+    register_names = names[num_opcodes:]
+    missing = [name for name in register_names if name not in registers]
+    if len(missing) > 0:
+        raise ValueError(f"{path} uses registers outside the {len(registers)} register file: {', '.join(missing)}")
+    instruction_queue = InstructionQueue()
+    trace = instruction_queue.trace
+    opcode_ids = np.array([trace.opcode_id(name) for name in opcode_names], dtype=np.uint8)
+    register_ids = np.array([trace.operand_id(registers[name]) for name in register_names] + [0], dtype=np.int32)
+    memory = np.array([name == "LDDD" or name == "STDD" for name in opcode_names] + [False] * (256 - num_opcodes))
+    if count > 0:
+        records = np.memmap(path, dtype=record, mode="r", offset=position, shape=(count,))
+        trace.source = stream_binary_records(trace, records, opcode_ids, register_ids, memory, chunk_size)
+        trace.source_length = count
+        instruction_queue.count_streamed_rows()
+    return instruction_queue
+
+# Appends the records to the trace chunk by chunk, one chunk per next().
+def stream_binary_records(trace, records, opcode_ids, register_ids, memory, chunk_size):
+    import numpy as np
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        opcode = np.asarray(chunk["opcode"])
+        source1 = np.asarray(chunk["source1"]).astype(np.int32)
+        source1[source1 == NO_REGISTER] = len(register_ids) - 1
+        operands1 = register_ids[source1]
+        is_memory = memory[opcode]
+        used_offsets, offset_index = np.unique(np.asarray(chunk["offset"])[is_memory], return_inverse=True)
+        offset_ids = np.array([trace.operand_id(address_offset(str(offset) + "+")) for offset in used_offsets.tolist()], dtype=np.int32)
+        operands1[is_memory] = offset_ids[offset_index]
+        trace.extend_columns(opcode_ids[opcode], register_ids[np.asarray(chunk["destination"])], operands1, register_ids[np.asarray(chunk["source2"])])
+        yield True
+
+######################################################
+#
+# Assembly trace format, one instruction per line:
+#
+#   MULTD F0, F2, F4      ; destination, operand1, operand2
+#   LDDD  F2, 34+(F3)     ; destination, offset(base)
+#
+# Opcodes are case-insensitive, register names must be
+# in the register file, and text after ';' or '#' is a
+# comment. Offsets are integers, written 34 or 34+, and
+# are stored as "34+" like those of the other traces.
+#
+######################################################
+
+ASSEMBLY_LINE = re.compile(r"\s*([A-Za-z]+)\s+([^\s,()]+)\s*,\s*(?:([^\s,()]+)\s*\(\s*([^\s,()]+)\s*\)|([^\s,()]+)\s*,\s*([^\s,()]+))\s*")
+MEMORY_OPCODES = ("LDDD", "STDD")
+
+###########################################################
+#
+# Function: load_assembly_trace
+#
+# Opens an assembly trace as an InstructionQueue that reads
+# the text lazily, chunk_size lines at a time, as the
+# simulation reaches them. 'source' is a path or an open
+# text file (such as a pipe or sys.stdin). Each register
+# name is looked up in 'registers' once per trace; parse
+# errors raise ValueError with the line number.
+#
+###########################################################
+def load_assembly_trace(source, registers, chunk_size = 4096):
+    instruction_queue = InstructionQueue()
+    trace = instruction_queue.trace
+    trace.source = stream_assembly_lines(trace, source, registers, chunk_size)
+    trace.source_length = None
+    instruction_queue.count_streamed_rows()
+    return instruction_queue
+
+# Parses the next chunk_size lines into the trace per next().
+def stream_assembly_lines(trace, source, registers, chunk_size):
+    file = open(source) if isinstance(source, str) else source
+    name = source if isinstance(source, str) else getattr(source, "name", "<stream>")
+    opcode_ids = {}
+    operand_ids = {}
+
+    def register_operand(text, line_number):
+        operand_id = operand_ids.get(text)
+        if operand_id is None:
+            if text not in registers:
+                raise ValueError(f"{name}:{line_number}: register {text} is not in the {len(registers)} register file")
+            operand_id = trace.operand_id(registers[text])
+            operand_ids[text] = operand_id
+        return operand_id
+
+    try:
+        opcodes = array('B')
+        destinations = array('i')
+        operands1 = array('i')
+        operands2 = array('i')
+        for line_number, line in enumerate(file, 1):
+            line = line.split(";", 1)[0].split("#", 1)[0]
+            if line.strip() == "":
+                continue
+            match = ASSEMBLY_LINE.fullmatch(line)
+            if match is None:
+                raise ValueError(f"{name}:{line_number}: cannot parse instruction: {line.strip()}")
+            opcode, destination, offset, base, operand1, operand2 = match.groups()
+            opcode = opcode.upper()
+            if (offset is not None) != (opcode in MEMORY_OPCODES):
+                raise ValueError(f"{name}:{line_number}: {opcode} takes " + ("an offset(base) address" if opcode in MEMORY_OPCODES else "two register operands"))
+            if opcode in BRANCH_OPCODES: # BNE F1, F2, loop:T is stored as (F1, loop:T, F2)
+                try:
+                    offset = branch_target(operand2)
+                except ValueError as error:
+                    raise ValueError(f"{name}:{line_number}: {error}") from None
+                base = operand1
+            if opcode not in opcode_ids:
+                opcode_ids[opcode] = trace.opcode_id(opcode)
+            opcodes.append(opcode_ids[opcode])
+            destinations.append(register_operand(destination, line_number))
+            if isinstance(offset, branch_target):
+                operands1.append(trace.operand_id(offset))
+                operands2.append(register_operand(base, line_number))
+            elif offset is not None:
+                try:
+                    offset = int(offset[:-1] if offset.endswith("+") else offset) # "34" and "34+" are both "34+"
+                except ValueError:
+                    raise ValueError(f"{name}:{line_number}: address offset {offset} is not a number") from None
+                operands1.append(trace.operand_id(address_offset(str(offset) + "+")))
+                operands2.append(register_operand(base, line_number))
+            else:
+                operands1.append(register_operand(operand1, line_number))
+                operands2.append(register_operand(operand2, line_number))
+            if len(opcodes) == chunk_size:
+                trace.extend_columns(opcodes, destinations, operands1, operands2)
+                opcodes = array('B')
+                destinations = array('i')
+                operands1 = array('i')
+                operands2 = array('i')
+                yield True
+        if len(opcodes) > 0:
+            trace.extend_columns(opcodes, destinations, operands1, operands2)
+            yield True
+    finally:
+        if file is not source:
+            file.close()
+
+######################################################
+#
+# Design-Space Sweeps
+#
+# A sweep runs one instruction trace against every
+# combination of the parameters in a grid, one
+# simulation per worker process. Each worker builds
+# its own register file and instruction queue from the
+# trace, so no simulator state is shared between runs.
+#
+######################################################
+
+SWEEP_DEFAULTS = {"num_fp_add": 3, "num_fp_mult": 2, "num_loadstore": 3, "dispatch_size": 1, "num_registers": 11, "latencies": None, "utilization_window": None,
+                  "rob_size": None, "commit_width": 1, "predictor": "not-taken", "cdb_width": None, "cdb_policy": "oldest-first",
+                  "functional_units": None, "initiation_intervals": None,
+                  "store_buffer": False, "forward_latency": 1, "cache": None, "base_addresses": None, "physical_registers": None}
+
+# Plain (opcode, destination, operand1, operand2) name tuples for every instruction in the queue,
+# which can be sent to worker processes and turned back into a queue with build_instruction_queue.
+def export_trace(instruction_queue):
+    trace = []
+    for instruction in instruction_queue:
+        trace.append((instruction.get_opcode(), instruction.get_destination().get_name(), instruction.get_operand1().get_name(), instruction.get_operand2().get_name()))
+    return trace
+
+def build_instruction_queue(trace, registers):
+    instruction_queue = InstructionQueue()
+    for opcode, destination, operand1, operand2 in trace:
+        if destination not in registers or operand2 not in registers or (opcode != "LDDD" and opcode != "STDD" and opcode not in BRANCH_OPCODES and operand1 not in registers):
+            raise ValueError(f"Trace instruction {opcode} {destination} {operand1} {operand2} uses a register outside the {len(registers)} register file")
+        if opcode == "LDDD" or opcode == "STDD":
+            operand1 = address_offset(operand1)
+        elif opcode in BRANCH_OPCODES:
+            operand1 = branch_target(operand1)
+        else:
+            operand1 = registers[operand1]
+        instruction_queue.enqueue(opcode, registers[destination], operand1, registers[operand2])
+    return instruction_queue
+
+# Builds the instruction queue of a trace source:
+#   - a list of (opcode, destination, operand1, operand2) name tuples,
+#   - {"generate": number_instructions, "seed": seed} for a random trace
+#     over this register file, optionally with "opcodes", "opcode_weights",
+#     "dependency_rate" and "dependency_distances" (see generate_instruction_queue).
+#   - {"binary": path} for a binary trace file (see load_binary_trace),
+#   - {"assembly": path} for an assembly text file (see load_assembly_trace),
+#   - an InstructionTrace (the trace of an InstructionQueue), run by a new queue;
+#     its registers are matched to this register file by name.
+def load_trace(trace, registers):
+    if isinstance(trace, dict):
+        if "generate" in trace:
+            return generate_instruction_queue(trace.get("opcodes", opcodes), registers, int(trace["generate"]), seed=trace.get("seed", 1),
+                                              opcode_weights=trace.get("opcode_weights"), dependency_rate=trace.get("dependency_rate", 0.0),
+                                              dependency_distances=trace.get("dependency_distances"))
+        if "binary" in trace:
+            return load_binary_trace(trace["binary"], registers)
+        if "assembly" in trace:
+            return load_assembly_trace(trace["assembly"], registers)
+        raise ValueError(f"Unknown trace source: {trace}")
+    if isinstance(trace, InstructionTrace):
+        return InstructionQueue(trace)
+    return build_instruction_queue(trace, registers)
+
+# Cartesian product of a grid such as {"num_fp_mult": [2, 4, 8], "dispatch_size": [1, 2]},
+# each combination completed with SWEEP_DEFAULTS.
+def sweep_configurations(grid):
+    names = list(grid)
+    configurations = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        configuration = dict(SWEEP_DEFAULTS)
+        configuration.update(zip(names, values))
+        if configuration["latencies"] is None:
+            configuration["latencies"] = dict(default_latencies)
+        configurations.append(configuration)
+    return configurations
+
+# A simulator for a complete configuration (SWEEP_DEFAULTS keys), without snapshots.
+def build_tomasulo(instruction_queue, registers, configuration, profiler = None):
+    if configuration["predictor"] not in PREDICTORS:
+        raise ValueError(f"Unknown branch predictor {configuration['predictor']}, expected one of: {', '.join(PREDICTORS)}")
+    memory_system = None
+    if configuration["store_buffer"] == True or configuration["cache"] is not None: # cache: Cache keyword arguments
+        memory_system = MemorySystem(cache=Cache(**configuration["cache"]) if configuration["cache"] is not None else None,
+                                     store_buffer=configuration["store_buffer"], forward_latency=configuration["forward_latency"],
+                                     base_addresses=configuration["base_addresses"])
+    return Tomasulo(instruction_queue, configuration["num_fp_add"], configuration["num_fp_mult"], configuration["num_loadstore"],
+                    registers, list(configuration["latencies"]), configuration["dispatch_size"], False,
+                    latencies=configuration["latencies"], snapshot_sink=NullSink(),
+                    utilization_window=configuration["utilization_window"], profiler=profiler,
+                    rob_size=configuration["rob_size"], commit_width=configuration["commit_width"],
+                    predictor=PREDICTORS[configuration["predictor"]](),
+                    cdb_width=configuration["cdb_width"], cdb_policy=configuration["cdb_policy"],
+                    functional_units=configuration["functional_units"], initiation_intervals=configuration["initiation_intervals"],
+                    memory_system=memory_system, physical_registers=configuration["physical_registers"])
+
+# Runs one configuration of a sweep. Module level so that worker processes can unpickle it.
+def run_configuration(trace, configuration):
+    registers = generate_registers(configuration["num_registers"])
+    instruction_queue = load_trace(trace, registers)
+    tomasulo = build_tomasulo(instruction_queue, registers, configuration,
+                              profiler=PhaseProfiler() if configuration.get("profile") == True else None)
+    results_table, simulation_results, rs_utilizations, parameters = tomasulo.run_algorithim()
+    result = dict(configuration)
+    result["num_instructions"] = parameters[4]
+    result["clock_cycles"] = tomasulo.get_clock_cycle()
+    result["utilizations"] = rs_utilizations
+    result["parameters"] = parameters
+    if tomasulo.utilization_window is not None:
+        result["utilization_curve"] = tomasulo.utilization_window.curve
+    if tomasulo.reorder_buffer is not None:
+        result["rob"] = tomasulo.return_rob_statistics()
+    if tomasulo.cdb is not None:
+        result["cdb"] = tomasulo.return_cdb_statistics()
+    if configuration["functional_units"] is not None:
+        result["functional_units"] = tomasulo.return_unit_statistics()
+    if tomasulo.memory_system is not None:
+        result["memory"] = tomasulo.return_memory_statistics()
+    if tomasulo.rename_table is not None:
+        result["rename"] = tomasulo.return_rename_statistics()
+    if configuration.get("results_table") == True:
+        result["results_table"] = str(results_table)
+    if tomasulo.profiler is not None:
+        result["profile"] = tomasulo.profiler.breakdown()
+        result["collapsed_stacks"] = tomasulo.profiler.collapsed_stacks()
+    return result
+
+###########################################################
+#
+# Method: sweep
+#
+# Runs the trace against every configuration in the grid
+# on a pool of worker processes.
+#
+# Parameters:
+#     trace       - InstructionQueue or any trace source
+#                   accepted by load_trace.
+#     grid        - dict mapping sweep parameters
+#                   (SWEEP_DEFAULTS keys) to lists of values.
+#     max_workers - number of worker processes, None for one
+#                   per CPU; 1 runs in this process.
+#
+# Returns: one result row (dict) per configuration, in
+#          grid order: the configuration plus
+#          num_instructions, clock_cycles and utilizations
+#          ([name, busy_fraction, executing_fraction]).
+#
+###########################################################
+def sweep(trace, grid, max_workers = None):
+    if isinstance(trace, InstructionQueue):
+        trace = trace.trace
+        trace.load_all()
+    configurations = sweep_configurations(grid)
+    if max_workers == 1:
+        return [run_configuration(trace, configuration) for configuration in configurations]
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_configuration, itertools.repeat(trace), configurations))
+
+def format_sweep_results(results):
+    lines = []
+    for result in results:
+        lines.append(f"Total Instructions: {result['num_instructions']} | Clock_Cycles: {result['clock_cycles']} | Num_FP_Add: {result['num_fp_add']} |  Num_FP_Mult: {result['num_fp_mult']} | Num_Load/Store: {result['num_loadstore']} | Num_Registers: {result['num_registers']} | Dispatch_Size: {result['dispatch_size']}")
+    return "\n".join(lines)
+
+def add_labels(bars, axes = None): # adds exact values on top of each bar
+    if axes is None:
+        import matplotlib.pyplot as axes
     for bar in bars:
         value = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width() / 2, value, f'{value:.4f}', ha='center', va='bottom', fontsize=10)
-
-def plot_results(rs_utilizations, clock_cycles, parameters):
+        axes.text(bar.get_x() + bar.get_width() / 2, value, f'{value:.4f}', ha='center', va='bottom', fontsize=10)
+
+###########################################################
+# Plots busy/executing utilization per functional unit.
+# Shown in a window sized to the screen, or, when a
+# filename is given, saved to that file without touching
+# pyplot or tkinter, which also works with no display.
+###########################################################
+def plot_results(rs_utilizations, clock_cycles, parameters, filename = None):
+    import numpy as np
     rs_name = [simulation[0] for simulation in rs_utilizations]
     busy_utilization = [simulation[1] for simulation in rs_utilizations]
     executing_utilization = [simulation[2] for simulation in rs_utilizations]
-    root = tk.Tk()
-    screen_width = root.winfo_screenwidth()
-    screen_height = root.winfo_screenheight()
-    root.destroy()
-    plt.figure(figsize=(screen_width/100, screen_height/100))
+    if filename is not None:
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=(19.2, 10.8))
+        axes = figure.subplots()
+    else:
+        import matplotlib.pyplot as plt
+        import tkinter as tk
+        root = tk.Tk()
+        screen_width = root.winfo_screenwidth()
+        screen_height = root.winfo_screenheight()
+        root.destroy()
+        figure = plt.figure(figsize=(screen_width/100, screen_height/100))
+        axes = figure.gca()
     width = .5
     x = np.arange(len(rs_name))
-    bar1= plt.bar(x - width / 2, busy_utilization, width, label='Busy Utilization', color='cyan')
-    bar2= plt.bar(x + width / 2, executing_utilization, width, label='Executing Utilization', color='lime')
-    plt.xlabel('Function Unit Name')
-    plt.ylabel('Utilizations')  
-    plt.title('Utilizations per Function Unit')
-    plt.suptitle(f"Total Instructions: {parameters[4]} | Clock_Cycles: {clock_cycles} | Num_FP_Add: {parameters[0]} |  Num_FP_Mult: {parameters[1]} | Num_Load/Store: {parameters[2]} | Num_Registers: {parameters[3]} | Dispatch_Size: {parameters[5]}")
-    plt.xticks(x, rs_name)
-    plt.grid()
-    plt.legend()
-    add_labels(bar1)
-    add_labels(bar2)
-    plt.show()
-    plt.close()
-
-random.seed(1)
-default_latencies = {"ADDD": 2, "SUBD": 2, "MULTD": 10, "DIVD": 40, "LDDD": 1,"STDD": 1}
-registers = generate_registers(11)
-registers32 = generate_registers(32)
-registers64 = generate_registers(64)
-registers128 = generate_registers(128)
-queue = generate_instruction_queue(opcodes, registers, 20)
-queue2 = copy.deepcopy(queue)
-queue3 = copy.deepcopy(queue)
-queue4 = copy.deepcopy(queue)
-queue5 = copy.deepcopy(queue)
-queue6 = copy.deepcopy(queue)
-queue7 = copy.deepcopy(queue)
-queue8 = copy.deepcopy(queue)
-queue9 = generate_instruction_queue(opcodes, registers, 100)
-queue10 = generate_instruction_queue(opcodes, registers, 1000)
-queue11 = generate_instruction_queue(opcodes, registers32, 1000)
-queue12 = generate_instruction_queue(opcodes, registers64, 1000)
-queue13 = generate_instruction_queue(opcodes, registers64, 10000)
-queue14 = generate_instruction_queue(opcodes, registers64, 10000)
-queue15 = generate_instruction_queue(opcodes, registers128, 100000)
-queue16 = copy.deepcopy(queue)
-# (instruction_queue, num_fp_add, num_fp_mult, num_loadstore, registers, opcodes, dispatch_size, verbose_mode, latencies=None)
-tomasulo = Tomasulo(queue, 3, 2, 3, registers, opcodes, 1, False, latencies=default_latencies)
-# results_table = [instruction_queue], simulation_results = [Clock_Cycle, RS and Register information], rs_utilizations = [RS name, busy_utilization, executing_utilization], parameters = [num_fp_add, num_fp_mult, num_loadstore, len(registers), instruction_queue.length]
-results_table, simulation_results, rs_utilizations, parameters = tomasulo.run_algorithim()
-print(f"Total Instructions: {parameters[4]} | Clock_Cycles: {simulation_results[-1][0]} | Num_FP_Add: {parameters[0]} |  Num_FP_Mult: {parameters[1]} | Num_Load/Store: {parameters[2]} | Num_Registers: {parameters[3]} | Dispatch_Size: {parameters[5]}\n")
-print(results_table)
-plot_results(rs_utilizations, simulation_results[-1][0], parameters)
-
-tomasulo16 = Tomasulo(queue16, 1, 1, 1, registers, opcodes, 1, False, latencies=default_latencies)
-results_table16, simulation_results16, rs_utilizations16, parameters16 = tomasulo16.run_algorithim()
-print(f"Total Instructions: {parameters16[4]} | Clock_Cycles: {simulation_results16[-1][0]} | Num_FP_Add: {parameters16[0]} |  Num_FP_Mult: {parameters16[1]} | Num_Load/Store: {parameters16[2]} | Num_Registers: {parameters16[3]} | Dispatch_Size: {parameters16[5]}\n")
-print(results_table16)
-plot_results(rs_utilizations16, simulation_results16[-1][0], parameters16)
-
-tomasulo2 = Tomasulo(queue2, 3, 4, 3, registers, opcodes, 1, False, latencies=default_latencies)
-results_table2, simulation_results2, rs_utilizations2, parameters2 = tomasulo2.run_algorithim()
-print(f"Total Instructions: {parameters2[4]} | Clock_Cycles: {simulation_results2[-1][0]} | Num_FP_Add: {parameters2[0]} |  Num_FP_Mult: {parameters2[1]} | Num_Load/Store: {parameters2[2]} | Num_Registers: {parameters2[3]} | Dispatch_Size: {parameters2[5]}\n")
-print(results_table2)
-plot_results(rs_utilizations2, simulation_results2[-1][0], parameters2)
-
-tomasulo3 = Tomasulo(queue3, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
-results_table3, simulation_results3, rs_utilizations3, parameters3 = tomasulo3.run_algorithim()
-print(f"Total Instructions: {parameters3[4]} | Clock_Cycles: {simulation_results3[-1][0]} | Num_FP_Add: {parameters3[0]} |  Num_FP_Mult: {parameters3[1]} | Num_Load/Store: {parameters3[2]} | Num_Registers: {parameters3[3]} | Dispatch_Size: {parameters3[5]}\n")
-print(results_table3)
-plot_results(rs_utilizations3, simulation_results3[-1][0], parameters3)
-
-tomasulo4 = Tomasulo(queue4, 3, 16, 3, registers, opcodes, 1, False, latencies=default_latencies)
-results_table4, simulation_results4, rs_utilizations4, parameters4 = tomasulo4.run_algorithim()
-print(f"Total Instructions: {parameters4[4]} | Clock_Cycles: {simulation_results4[-1][0]} | Num_FP_Add: {parameters4[0]} |  Num_FP_Mult: {parameters4[1]} | Num_Load/Store: {parameters4[2]} | Num_Registers: {parameters4[3]} | Dispatch_Size: {parameters4[5]}\n")
-print(results_table4)
-plot_results(rs_utilizations4, simulation_results4[-1][0], parameters4)
-
-tomasulo5 = Tomasulo(queue5, 3, 2, 3, registers, opcodes, 2, False, latencies=default_latencies)
-results_table5, simulation_results5, rs_utilizations5, parameters5 = tomasulo5.run_algorithim()
-print(f"Total Instructions: {parameters5[4]} | Clock_Cycles: {simulation_results5[-1][0]} | Num_FP_Add: {parameters5[0]} |  Num_FP_Mult: {parameters5[1]} | Num_Load/Store: {parameters5[2]} | Num_Registers: {parameters5[3]} | Dispatch_Size: {parameters5[5]}\n")
-print(results_table5)
-plot_results(rs_utilizations5, simulation_results5[-1][0], parameters5)
-
-tomasulo6 = Tomasulo(queue6, 3, 4, 3, registers, opcodes, 2, False, latencies=default_latencies)
-results_table6, simulation_results6, rs_utilizations6, parameters6 = tomasulo6.run_algorithim()
-print(f"Total Instructions: {parameters6[4]} | Clock_Cycles: {simulation_results6[-1][0]} | Num_FP_Add: {parameters6[0]} |  Num_FP_Mult: {parameters6[1]} | Num_Load/Store: {parameters6[2]} | Num_Registers: {parameters6[3]} | Dispatch_Size: {parameters6[5]}\n")
-print(results_table6)
-plot_results(rs_utilizations6, simulation_results6[-1][0], parameters6)
-
-tomasulo7 = Tomasulo(queue7, 3, 8, 3, registers, opcodes, 2, False, latencies=default_latencies)
-results_table7, simulation_results7, rs_utilizations7, parameters7 = tomasulo7.run_algorithim()
-print(f"Total Instructions: {parameters7[4]} | Clock_Cycles: {simulation_results7[-1][0]} | Num_FP_Add: {parameters7[0]} |  Num_FP_Mult: {parameters7[1]} | Num_Load/Store: {parameters7[2]} | Num_Registers: {parameters7[3]} | Dispatch_Size: {parameters7[5]}\n")
-print(results_table7)
-plot_results(rs_utilizations7, simulation_results7[-1][0], parameters7)
-
-tomasulo8 = Tomasulo(queue8, 3, 16, 3, registers, opcodes, 2, False, latencies=default_latencies)
-results_table8, simulation_results8, rs_utilizations8, parameters8 = tomasulo8.run_algorithim()
-print(f"Total Instructions: {parameters8[4]} | Clock_Cycles: {simulation_results8[-1][0]} | Num_FP_Add: {parameters8[0]} |  Num_FP_Mult: {parameters8[1]} | Num_Load/Store: {parameters8[2]} | Num_Registers: {parameters8[3]} | Dispatch_Size: {parameters8[5]}\n")
-print(results_table8)
-plot_results(rs_utilizations8, simulation_results8[-1][0], parameters8)
-
-tomasulo9 = Tomasulo(queue9, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
-results_table9, simulation_results9, rs_utilizations9, parameters9 = tomasulo9.run_algorithim()
-print(f"Total Instructions: {parameters9[4]} | Clock_Cycles: {simulation_results9[-1][0]} | Num_FP_Add: {parameters9[0]} |  Num_FP_Mult: {parameters9[1]} | Num_Load/Store: {parameters9[2]} | Num_Registers: {parameters9[3]} | Dispatch_Size: {parameters9[5]}\n")
-print(results_table9)
-plot_results(rs_utilizations9, simulation_results9[-1][0], parameters9)
-
-tomasulo10 = Tomasulo(queue10, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
-results_table10, simulation_results10, rs_utilizations10, parameters10 = tomasulo10.run_algorithim()
-print(f"Total Instructions: {parameters10[4]} | Clock_Cycles: {simulation_results10[-1][0]} | Num_FP_Add: {parameters10[0]} |  Num_FP_Mult: {parameters10[1]} | Num_Load/Store: {parameters10[2]} | Num_Registers: {parameters10[3]} | Dispatch_Size: {parameters10[5]}\n")
-print(results_table10)
-plot_results(rs_utilizations10, simulation_results10[-1][0], parameters10)
-
-tomasulo11 = Tomasulo(queue11, 3, 8, 3, registers32, opcodes, 2, False, latencies=default_latencies)
-results_table11, simulation_results11, rs_utilizations11, parameters11 = tomasulo11.run_algorithim()
-print(f"Total Instructions: {parameters11[4]} | Clock_Cycles: {simulation_results11[-1][0]} | Num_FP_Add: {parameters11[0]} |  Num_FP_Mult: {parameters11[1]} | Num_Load/Store: {parameters11[2]} | Num_Registers: {parameters11[3]} | Dispatch_Size: {parameters11[5]}\n")
-print(results_table11)
-plot_results(rs_utilizations11, simulation_results11[-1][0], parameters11)
-
-tomasulo12 = Tomasulo(queue12, 3, 8, 3, registers64, opcodes, 1, False, latencies=default_latencies)
-results_table12, simulation_results12, rs_utilizations12, parameters12 = tomasulo12.run_algorithim()
-print(f"Total Instructions: {parameters12[4]} | Clock_Cycles: {simulation_results12[-1][0]} | Num_FP_Add: {parameters12[0]} |  Num_FP_Mult: {parameters12[1]} | Num_Load/Store: {parameters12[2]} | Num_Registers: {parameters12[3]} | Dispatch_Size: {parameters12[5]}\n")
-print(results_table12)
-plot_results(rs_utilizations12, simulation_results12[-1][0], parameters12)
-
-tomasulo13 = Tomasulo(queue13, 3, 32, 3, registers64, opcodes, 1, False, latencies=default_latencies)
-results_table13, simulation_results13, rs_utilizations13, parameters13 = tomasulo13.run_algorithim()
-print(f"Total Instructions: {parameters13[4]} | Clock_Cycles: {simulation_results13[-1][0]} | Num_FP_Add: {parameters13[0]} |  Num_FP_Mult: {parameters13[1]} | Num_Load/Store: {parameters13[2]} | Num_Registers: {parameters13[3]} | Dispatch_Size: {parameters13[5]}\n")
-print(results_table13)
-plot_results(rs_utilizations13, simulation_results13[-1][0], parameters13)
-
-tomasulo14 = Tomasulo(queue14, 3, 32, 3, registers64, opcodes, 2, False, latencies=default_latencies)
-results_table14, simulation_results14, rs_utilizations14, parameters14 = tomasulo14.run_algorithim()
-print(f"Total Instructions: {parameters14[4]} | Clock_Cycles: {simulation_results14[-1][0]} | Num_FP_Add: {parameters14[0]} |  Num_FP_Mult: {parameters14[1]} | Num_Load/Store: {parameters14[2]} | Num_Registers: {parameters14[3]} | Dispatch_Size: {parameters14[5]}\n")
-print(results_table14)
-plot_results(rs_utilizations14, simulation_results14[-1][0], parameters14)
-
-tomasulo15 = Tomasulo(queue15, 3, 32, 3, registers128, opcodes, 2, False, latencies=default_latencies)
-results_table15, simulation_results15, rs_utilizations15, parameters15 = tomasulo15.run_algorithim()
-print(f"Total Instructions: {parameters15[4]} | Clock_Cycles: {simulation_results15[-1][0]} | Num_FP_Add: {parameters15[0]} |  Num_FP_Mult: {parameters15[1]} | Num_Load/Store: {parameters15[2]} | Num_Registers: {parameters15[3]} | Dispatch_Size: {parameters15[5]}\n")
-print(results_table15)
-plot_results(rs_utilizations15, simulation_results15[-1][0], parameters15)
->>>>>>> refs/remotes/origin/main:TomasuloSimulator.py
+    bar1= axes.bar(x - width / 2, busy_utilization, width, label='Busy Utilization', color='cyan')
+    bar2= axes.bar(x + width / 2, executing_utilization, width, label='Executing Utilization', color='lime')
+    axes.set_xlabel('Function Unit Name')
+    axes.set_ylabel('Utilizations')  
+    axes.set_title('Utilizations per Function Unit')
+    figure.suptitle(f"Total Instructions: {parameters[4]} | Clock_Cycles: {clock_cycles} | Num_FP_Add: {parameters[0]} |  Num_FP_Mult: {parameters[1]} | Num_Load/Store: {parameters[2]} | Num_Registers: {parameters[3]} | Dispatch_Size: {parameters[5]}")
+    axes.set_xticks(x, rs_name)
+    axes.grid()
+    axes.legend()
+    add_labels(bar1, axes)
+    add_labels(bar2, axes)
+    if filename is not None:
+        figure.savefig(filename)
+    else:
+        plt.show()
+        plt.close()
+
+######################################################
+#
+# Benchmarks
+#
+# Measures the speed of the simulator itself on a fixed
+# set of scenarios, so that runs of two versions can be
+# compared:
+#
+#   python TomasuloSimulator.py --benchmark bench.json
+#   python TomasuloSimulator.py --benchmark new.json --baseline bench.json
+#
+# Every scenario is a generated trace (see load_trace)
+# and a configuration (SWEEP_DEFAULTS keys). It runs in a
+# fresh worker process without snapshots, and reports:
+#
+#   seconds                    - time spent in run_algorithim
+#   cycles_per_second          - simulated clock cycles per second
+#   instructions_per_second    - instructions per second
+#   peak_rss_kb                - peak resident set size of the worker
+#                                (None where the resource module is missing)
+#   retained_blocks_per_cycle  - net change in allocated memory blocks
+#                                over the run per clock cycle
+#                                (sys.getallocatedblocks after minus
+#                                before). Blocks allocated and freed
+#                                within the run cancel out, so this shows
+#                                per-cycle garbage that is kept around,
+#                                not allocation churn: CPython does not
+#                                count allocations, and tracemalloc only
+#                                tracks bytes and would slow the timed run
+#
+######################################################
+
+BENCHMARK_SCENARIOS = [
+    {"name": "small-registers-1k", "trace": {"generate": 1000, "seed": 1}, "num_registers": 11, "dispatch_size": 1},
+    {"name": "large-registers-1k", "trace": {"generate": 1000, "seed": 1}, "num_registers": 128, "dispatch_size": 1},
+    {"name": "dispatch1-100k", "trace": {"generate": 100000, "seed": 1}, "num_registers": 64, "num_fp_mult": 8, "dispatch_size": 1},
+    {"name": "dispatch2-100k", "trace": {"generate": 100000, "seed": 1}, "num_registers": 64, "num_fp_mult": 8, "dispatch_size": 2},
+    {"name": "divd-heavy-100k", "trace": {"generate": 100000, "seed": 1, "opcode_weights": {"ADDD": 1, "SUBD": 1, "MULTD": 1, "DIVD": 6, "LDDD": 1, "STDD": 1}}, "num_registers": 64, "num_fp_mult": 8, "dispatch_size": 2},
+    {"name": "load-heavy-100k", "trace": {"generate": 100000, "seed": 1, "opcode_weights": {"ADDD": 1, "SUBD": 1, "MULTD": 1, "DIVD": 1, "LDDD": 6, "STDD": 2}}, "num_registers": 64, "num_fp_mult": 8, "dispatch_size": 2},
+    {"name": "large-registers-1m", "trace": {"generate": 1000000, "seed": 1}, "num_registers": 128, "num_fp_mult": 32, "dispatch_size": 2},
+]
+
+# Runs one benchmark scenario. Module level so that worker processes can unpickle it.
+def run_benchmark(scenario):
+    configuration = dict(SWEEP_DEFAULTS)
+    configuration.update((key, value) for key, value in scenario.items() if key != "name" and key != "trace")
+    if configuration["latencies"] is None:
+        configuration["latencies"] = dict(default_latencies)
+    registers = generate_registers(configuration["num_registers"])
+    instruction_queue = load_trace(scenario["trace"], registers)
+    tomasulo = build_tomasulo(instruction_queue, registers, configuration)
+    import time
+    blocks = sys.getallocatedblocks()
+    start = time.perf_counter()
+    results_table, simulation_results, rs_utilizations, parameters = tomasulo.run_algorithim()
+    seconds = time.perf_counter() - start
+    blocks = sys.getallocatedblocks() - blocks
+    clock_cycles = tomasulo.get_clock_cycle()
+    try:
+        import resource
+        peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak_rss_kb //= 1024 # bytes on macOS
+    except ImportError:
+        peak_rss_kb = None
+    return {"name": scenario["name"], "num_instructions": parameters[4], "clock_cycles": clock_cycles, "seconds": seconds,
+            "cycles_per_second": clock_cycles/seconds if seconds > 0 else 0,
+            "instructions_per_second": parameters[4]/seconds if seconds > 0 else 0,
+            "peak_rss_kb": peak_rss_kb,
+            "retained_blocks_per_cycle": blocks/clock_cycles if clock_cycles != 0 else 0}
+
+###########################################################
+#
+# Method: benchmark
+#
+# Runs benchmark scenarios one after another, each in a
+# new worker process.
+#
+# Parameters:
+#     scenarios - scenarios to run (default: BENCHMARK_SCENARIOS)
+#     names     - optional names of the scenarios to keep
+#
+# Returns: {"python": version, "platform": platform,
+#           "results": one row per scenario (see run_benchmark)}
+#
+###########################################################
+def benchmark(scenarios = None, names = None):
+    import platform
+    from concurrent.futures import ProcessPoolExecutor
+    if scenarios is None:
+        scenarios = BENCHMARK_SCENARIOS
+    if names is not None:
+        unknown = [name for name in names if name not in [scenario["name"] for scenario in scenarios]]
+        if len(unknown) > 0:
+            raise ValueError(f"Unknown benchmark scenarios: {', '.join(unknown)}")
+        scenarios = [scenario for scenario in scenarios if scenario["name"] in names]
+    results = []
+    for scenario in scenarios:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(run_benchmark, scenario).result())
+    return {"python": platform.python_version(), "platform": platform.platform(), "results": results}
+
+# One line per scenario; with a baseline (an earlier benchmark() result) also the speed-up in cycles per second.
+def format_benchmark_results(benchmark_results, baseline = None):
+    previous = {}
+    if baseline != None:
+        previous = {result["name"]: result for result in baseline["results"]}
+    lines = []
+    for result in benchmark_results["results"]:
+        line = (f"{result['name']}: {result['num_instructions']} instructions, {result['clock_cycles']} cycles in {result['seconds']:.3f}s | "
+                f"{result['cycles_per_second']:.0f} cycles/s | {result['instructions_per_second']:.0f} instructions/s | "
+                f"peak RSS {result['peak_rss_kb']} KB | {result['retained_blocks_per_cycle']:.3f} retained blocks/cycle")
+        if result["name"] in previous and previous[result["name"]]["cycles_per_second"] > 0:
+            line += f" | {result['cycles_per_second']/previous[result['name']]['cycles_per_second']:.2f}x baseline"
+        lines.append(line)
+    return "\n".join(lines)
+
+def run_benchmarks(output, baseline_path = None, names = None):
+    baseline = None
+    if baseline_path is not None:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+    benchmark_results = benchmark(names=names)
+    print(format_benchmark_results(benchmark_results, baseline))
+    with open(output, "w") as file:
+        json.dump(benchmark_results, file, indent=1)
+    return benchmark_results
+
+######################################################
+#
+# Command-Line Interface
+#
+# Runs a batch configuration file without any display
+# or prompt and writes the results to an output
+# directory:
+#
+#   python TomasuloSimulator.py --config runs.toml --output-dir results
+#
+# The configuration (JSON, or TOML on Python 3.11+) has
+# an optional "defaults" table and a list of "runs".
+# Every run has a name, a trace source (see load_trace)
+# and any SWEEP_DEFAULTS parameters. A parameter given
+# as a list is swept over. "results_table = true" also
+# writes each run's per-instruction results table,
+# "plot = true" saves its utilization plot and
+# "profile = true" times the phases of the cycle loop
+# (see PhaseProfiler).
+#
+#   [defaults]
+#   latencies = {ADDD = 2, SUBD = 2, MULTD = 10, DIVD = 40, LDDD = 1, STDD = 1}
+#
+#   [[runs]]
+#   name = "multipliers"
+#   trace = {generate = 1000, seed = 1}
+#   num_registers = 32
+#   num_fp_mult = [2, 4, 8]
+#   dispatch_size = [1, 2]
+#
+# Written files: results.json (every result row),
+# results.csv (one summary line per row) and, when
+# asked for, <name>-<n>.txt, <name>-<n>.png and the
+# collapsed stacks <name>-<n>.folded.
+#
+######################################################
+
+RUN_OPTIONS = ("results_table", "plot", "profile")
+
+def load_configuration(path):
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as file:
+            return tomllib.load(file)
+    with open(path) as file:
+        return json.load(file)
+
+# Splits a configuration into (name, trace, grid) for every run.
+def batch_runs(configuration):
+    defaults = configuration.get("defaults", {})
+    runs = configuration.get("runs", [])
+    if len(runs) == 0:
+        raise ValueError("The configuration has no runs")
+    batch = []
+    for index, run in enumerate(runs):
+        settings = dict(defaults)
+        settings.update(run)
+        name = str(settings.pop("name", "run" + str(index + 1)))
+        if "trace" not in settings:
+            raise ValueError(f"Run {name} has no trace")
+        trace = settings.pop("trace")
+        unknown = [key for key in settings if key not in SWEEP_DEFAULTS and key not in RUN_OPTIONS]
+        if len(unknown) > 0:
+            raise ValueError(f"Run {name} has unknown settings: {', '.join(unknown)}")
+        grid = {key: value if isinstance(value, list) else [value] for key, value in settings.items()}
+        grid["name"] = [name]
+        batch.append((name, trace, grid))
+    return batch
+
+def write_batch_results(results, output_dir):
+    import csv
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {}
+    for result in results:
+        counts[result["name"]] = counts.get(result["name"], 0) + 1
+        stem = os.path.join(output_dir, f"{result['name']}-{counts[result['name']]}")
+        if "results_table" in result:
+            with open(stem + ".txt", "w") as file:
+                file.write(result.pop("results_table"))
+        if "collapsed_stacks" in result:
+            with open(stem + ".folded", "w") as file:
+                file.write(result.pop("collapsed_stacks"))
+        if result.get("plot") == True:
+            plot_results(result["utilizations"], result["clock_cycles"], result["parameters"], filename=stem + ".png")
+    with open(os.path.join(output_dir, "results.json"), "w") as file:
+        json.dump(results, file, indent=1)
+    columns = ["name", "num_instructions", "clock_cycles", "num_fp_add", "num_fp_mult", "num_loadstore", "num_registers", "dispatch_size"]
+    with open(os.path.join(output_dir, "results.csv"), "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        for result in results:
+            writer.writerow([result[column] for column in columns])
+
+def run_batch(path, output_dir, max_workers = None):
+    results = []
+    for name, trace, grid in batch_runs(load_configuration(path)):
+        results.extend(sweep(trace, grid, max_workers=max_workers))
+    print(format_sweep_results(results))
+    write_batch_results(results, output_dir)
+    return results
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Tomasulo algorithm simulator. Without --config the built-in demo configurations are run and plotted.")
+    parser.add_argument("--config", help="JSON or TOML batch configuration file")
+    parser.add_argument("--output-dir", default="results", help="directory for the result files (default: results)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--benchmark", metavar="OUTPUT", help="run the benchmark scenarios and write their results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --benchmark JSON file to compare against")
+    parser.add_argument("--scenarios", nargs="+", help="benchmark scenarios to run (default: all)")
+    args = parser.parse_args(argv)
+    if args.benchmark is not None:
+        run_benchmarks(args.benchmark, args.baseline, args.scenarios)
+    elif args.config is None:
+        run_demo()
+    else:
+        run_batch(args.config, args.output_dir, args.workers)
+    return 0
+
+######################################################
+#
+# Driver: the configurations studied so far, each
+# printed and plotted in turn.
+#
+######################################################
+def run_demo():
+    random.seed(1)
+    registers = generate_registers(11)
+    registers32 = generate_registers(32)
+    registers64 = generate_registers(64)
+    registers128 = generate_registers(128)
+    queue = generate_instruction_queue(opcodes, registers, 20)
+    queue2 = queue.clone()
+    queue3 = queue.clone()
+    queue4 = queue.clone()
+    queue5 = queue.clone()
+    queue6 = queue.clone()
+    queue7 = queue.clone()
+    queue8 = queue.clone()
+    queue9 = generate_instruction_queue(opcodes, registers, 100)
+    queue10 = generate_instruction_queue(opcodes, registers, 1000)
+    queue11 = generate_instruction_queue(opcodes, registers32, 1000)
+    queue12 = generate_instruction_queue(opcodes, registers64, 1000)
+    queue13 = generate_instruction_queue(opcodes, registers64, 10000)
+    queue14 = generate_instruction_queue(opcodes, registers64, 10000)
+    queue15 = generate_instruction_queue(opcodes, registers128, 100000)
+    queue16 = queue.clone()
+    # (instruction_queue, num_fp_add, num_fp_mult, num_loadstore, registers, opcodes, dispatch_size, verbose_mode, latencies=None)
+    tomasulo = Tomasulo(queue, 3, 2, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    # results_table = [instruction_queue], simulation_results = [Clock_Cycle, RS and Register information], rs_utilizations = [RS name, busy_utilization, executing_utilization], parameters = [num_fp_add, num_fp_mult, num_loadstore, len(registers), instruction_queue.length]
+    results_table, simulation_results, rs_utilizations, parameters = tomasulo.run_algorithim()
+    print(f"Total Instructions: {parameters[4]} | Clock_Cycles: {simulation_results[-1][0]} | Num_FP_Add: {parameters[0]} |  Num_FP_Mult: {parameters[1]} | Num_Load/Store: {parameters[2]} | Num_Registers: {parameters[3]} | Dispatch_Size: {parameters[5]}\n")
+    print(results_table)
+    plot_results(rs_utilizations, simulation_results[-1][0], parameters)
+
+    tomasulo16 = Tomasulo(queue16, 1, 1, 1, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table16, simulation_results16, rs_utilizations16, parameters16 = tomasulo16.run_algorithim()
+    print(f"Total Instructions: {parameters16[4]} | Clock_Cycles: {simulation_results16[-1][0]} | Num_FP_Add: {parameters16[0]} |  Num_FP_Mult: {parameters16[1]} | Num_Load/Store: {parameters16[2]} | Num_Registers: {parameters16[3]} | Dispatch_Size: {parameters16[5]}\n")
+    print(results_table16)
+    plot_results(rs_utilizations16, simulation_results16[-1][0], parameters16)
+
+    tomasulo2 = Tomasulo(queue2, 3, 4, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table2, simulation_results2, rs_utilizations2, parameters2 = tomasulo2.run_algorithim()
+    print(f"Total Instructions: {parameters2[4]} | Clock_Cycles: {simulation_results2[-1][0]} | Num_FP_Add: {parameters2[0]} |  Num_FP_Mult: {parameters2[1]} | Num_Load/Store: {parameters2[2]} | Num_Registers: {parameters2[3]} | Dispatch_Size: {parameters2[5]}\n")
+    print(results_table2)
+    plot_results(rs_utilizations2, simulation_results2[-1][0], parameters2)
+
+    tomasulo3 = Tomasulo(queue3, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table3, simulation_results3, rs_utilizations3, parameters3 = tomasulo3.run_algorithim()
+    print(f"Total Instructions: {parameters3[4]} | Clock_Cycles: {simulation_results3[-1][0]} | Num_FP_Add: {parameters3[0]} |  Num_FP_Mult: {parameters3[1]} | Num_Load/Store: {parameters3[2]} | Num_Registers: {parameters3[3]} | Dispatch_Size: {parameters3[5]}\n")
+    print(results_table3)
+    plot_results(rs_utilizations3, simulation_results3[-1][0], parameters3)
+
+    tomasulo4 = Tomasulo(queue4, 3, 16, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table4, simulation_results4, rs_utilizations4, parameters4 = tomasulo4.run_algorithim()
+    print(f"Total Instructions: {parameters4[4]} | Clock_Cycles: {simulation_results4[-1][0]} | Num_FP_Add: {parameters4[0]} |  Num_FP_Mult: {parameters4[1]} | Num_Load/Store: {parameters4[2]} | Num_Registers: {parameters4[3]} | Dispatch_Size: {parameters4[5]}\n")
+    print(results_table4)
+    plot_results(rs_utilizations4, simulation_results4[-1][0], parameters4)
+
+    tomasulo5 = Tomasulo(queue5, 3, 2, 3, registers, opcodes, 2, False, latencies=default_latencies)
+    results_table5, simulation_results5, rs_utilizations5, parameters5 = tomasulo5.run_algorithim()
+    print(f"Total Instructions: {parameters5[4]} | Clock_Cycles: {simulation_results5[-1][0]} | Num_FP_Add: {parameters5[0]} |  Num_FP_Mult: {parameters5[1]} | Num_Load/Store: {parameters5[2]} | Num_Registers: {parameters5[3]} | Dispatch_Size: {parameters5[5]}\n")
+    print(results_table5)
+    plot_results(rs_utilizations5, simulation_results5[-1][0], parameters5)
+
+    tomasulo6 = Tomasulo(queue6, 3, 4, 3, registers, opcodes, 2, False, latencies=default_latencies)
+    results_table6, simulation_results6, rs_utilizations6, parameters6 = tomasulo6.run_algorithim()
+    print(f"Total Instructions: {parameters6[4]} | Clock_Cycles: {simulation_results6[-1][0]} | Num_FP_Add: {parameters6[0]} |  Num_FP_Mult: {parameters6[1]} | Num_Load/Store: {parameters6[2]} | Num_Registers: {parameters6[3]} | Dispatch_Size: {parameters6[5]}\n")
+    print(results_table6)
+    plot_results(rs_utilizations6, simulation_results6[-1][0], parameters6)
+
+    tomasulo7 = Tomasulo(queue7, 3, 8, 3, registers, opcodes, 2, False, latencies=default_latencies)
+    results_table7, simulation_results7, rs_utilizations7, parameters7 = tomasulo7.run_algorithim()
+    print(f"Total Instructions: {parameters7[4]} | Clock_Cycles: {simulation_results7[-1][0]} | Num_FP_Add: {parameters7[0]} |  Num_FP_Mult: {parameters7[1]} | Num_Load/Store: {parameters7[2]} | Num_Registers: {parameters7[3]} | Dispatch_Size: {parameters7[5]}\n")
+    print(results_table7)
+    plot_results(rs_utilizations7, simulation_results7[-1][0], parameters7)
+
+    tomasulo8 = Tomasulo(queue8, 3, 16, 3, registers, opcodes, 2, False, latencies=default_latencies)
+    results_table8, simulation_results8, rs_utilizations8, parameters8 = tomasulo8.run_algorithim()
+    print(f"Total Instructions: {parameters8[4]} | Clock_Cycles: {simulation_results8[-1][0]} | Num_FP_Add: {parameters8[0]} |  Num_FP_Mult: {parameters8[1]} | Num_Load/Store: {parameters8[2]} | Num_Registers: {parameters8[3]} | Dispatch_Size: {parameters8[5]}\n")
+    print(results_table8)
+    plot_results(rs_utilizations8, simulation_results8[-1][0], parameters8)
+
+    tomasulo9 = Tomasulo(queue9, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table9, simulation_results9, rs_utilizations9, parameters9 = tomasulo9.run_algorithim()
+    print(f"Total Instructions: {parameters9[4]} | Clock_Cycles: {simulation_results9[-1][0]} | Num_FP_Add: {parameters9[0]} |  Num_FP_Mult: {parameters9[1]} | Num_Load/Store: {parameters9[2]} | Num_Registers: {parameters9[3]} | Dispatch_Size: {parameters9[5]}\n")
+    print(results_table9)
+    plot_results(rs_utilizations9, simulation_results9[-1][0], parameters9)
+
+    tomasulo10 = Tomasulo(queue10, 3, 8, 3, registers, opcodes, 1, False, latencies=default_latencies)
+    results_table10, simulation_results10, rs_utilizations10, parameters10 = tomasulo10.run_algorithim()
+    print(f"Total Instructions: {parameters10[4]} | Clock_Cycles: {simulation_results10[-1][0]} | Num_FP_Add: {parameters10[0]} |  Num_FP_Mult: {parameters10[1]} | Num_Load/Store: {parameters10[2]} | Num_Registers: {parameters10[3]} | Dispatch_Size: {parameters10[5]}\n")
+    print(results_table10)
+    plot_results(rs_utilizations10, simulation_results10[-1][0], parameters10)
+
+    tomasulo11 = Tomasulo(queue11, 3, 8, 3, registers32, opcodes, 2, False, latencies=default_latencies)
+    results_table11, simulation_results11, rs_utilizations11, parameters11 = tomasulo11.run_algorithim()
+    print(f"Total Instructions: {parameters11[4]} | Clock_Cycles: {simulation_results11[-1][0]} | Num_FP_Add: {parameters11[0]} |  Num_FP_Mult: {parameters11[1]} | Num_Load/Store: {parameters11[2]} | Num_Registers: {parameters11[3]} | Dispatch_Size: {parameters11[5]}\n")
+    print(results_table11)
+    plot_results(rs_utilizations11, simulation_results11[-1][0], parameters11)
+
+    tomasulo12 = Tomasulo(queue12, 3, 8, 3, registers64, opcodes, 1, False, latencies=default_latencies)
+    results_table12, simulation_results12, rs_utilizations12, parameters12 = tomasulo12.run_algorithim()
+    print(f"Total Instructions: {parameters12[4]} | Clock_Cycles: {simulation_results12[-1][0]} | Num_FP_Add: {parameters12[0]} |  Num_FP_Mult: {parameters12[1]} | Num_Load/Store: {parameters12[2]} | Num_Registers: {parameters12[3]} | Dispatch_Size: {parameters12[5]}\n")
+    print(results_table12)
+    plot_results(rs_utilizations12, simulation_results12[-1][0], parameters12)
+
+    tomasulo13 = Tomasulo(queue13, 3, 32, 3, registers64, opcodes, 1, False, latencies=default_latencies)
+    results_table13, simulation_results13, rs_utilizations13, parameters13 = tomasulo13.run_algorithim()
+    print(f"Total Instructions: {parameters13[4]} | Clock_Cycles: {simulation_results13[-1][0]} | Num_FP_Add: {parameters13[0]} |  Num_FP_Mult: {parameters13[1]} | Num_Load/Store: {parameters13[2]} | Num_Registers: {parameters13[3]} | Dispatch_Size: {parameters13[5]}\n")
+    print(results_table13)
+    plot_results(rs_utilizations13, simulation_results13[-1][0], parameters13)
+
+    tomasulo14 = Tomasulo(queue14, 3, 32, 3, registers64, opcodes, 2, False, latencies=default_latencies)
+    results_table14, simulation_results14, rs_utilizations14, parameters14 = tomasulo14.run_algorithim()
+    print(f"Total Instructions: {parameters14[4]} | Clock_Cycles: {simulation_results14[-1][0]} | Num_FP_Add: {parameters14[0]} |  Num_FP_Mult: {parameters14[1]} | Num_Load/Store: {parameters14[2]} | Num_Registers: {parameters14[3]} | Dispatch_Size: {parameters14[5]}\n")
+    print(results_table14)
+    plot_results(rs_utilizations14, simulation_results14[-1][0], parameters14)
+
+    tomasulo15 = Tomasulo(queue15, 3, 32, 3, registers128, opcodes, 2, False, latencies=default_latencies)
+    results_table15, simulation_results15, rs_utilizations15, parameters15 = tomasulo15.run_algorithim()
+    print(f"Total Instructions: {parameters15[4]} | Clock_Cycles: {simulation_results15[-1][0]} | Num_FP_Add: {parameters15[0]} |  Num_FP_Mult: {parameters15[1]} | Num_Load/Store: {parameters15[2]} | Num_Registers: {parameters15[3]} | Dispatch_Size: {parameters15[5]}\n")
+    print(results_table15)
+    plot_results(rs_utilizations15, simulation_results15[-1][0], parameters15)
+
+if __name__ == "__main__":
+    sys.exit(main())
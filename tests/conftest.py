@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import TomasuloSimulator as T
+
+
+# Fails a run that stops making progress instead of hanging the test session.
+# A cycle observer makes the simulator step every cycle, so only deadlock tests use it.
+class CycleLimit(T.SimulationObserver):
+    def __init__(self, limit):
+        self.limit = limit
+
+    def on_cycle(self, tomasulo):
+        if tomasulo.get_clock_cycle() > self.limit:
+            raise AssertionError(f"simulation still running after {self.limit} cycles")
+
+
+# Builds and runs a simulator with 2 adders, 2 multipliers and 2 load buffers over the
+# default latencies (all opcodes, branches included); keyword arguments are passed on to Tomasulo.
+def simulate(instruction_queue, registers, limit = None, num_fp_add = 2, num_fp_mult = 2, num_loadstore = 2, **kwargs):
+    kwargs.setdefault("snapshot_sink", T.NullSink())
+    kwargs.setdefault("latencies", T.default_latencies)
+    if limit is not None:
+        kwargs["observers"] = list(kwargs.get("observers") or []) + [CycleLimit(limit)]
+    tomasulo = T.Tomasulo(instruction_queue, num_fp_add, num_fp_mult, num_loadstore, registers, list(kwargs["latencies"]), 1, False, **kwargs)
+    tomasulo.run_algorithim()
+    return tomasulo
+
+
+# (opcode, issued, execute start, execute end, write-back) of every instruction.
+def timings(tomasulo):
+    return [(instruction.get_opcode(), instruction.get_issued_cycle(), instruction.get_execute_start_cycle(),
+             instruction.get_execute_end_cycle(), instruction.get_write_back_cycle())
+            for instruction in tomasulo.instruction_queue]
+
+
+@pytest.fixture
+def registers():
+    return T.generate_registers(8)
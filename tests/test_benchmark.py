@@ -0,0 +1,11 @@
+import TomasuloSimulator as T
+
+
+def test_benchmark_row():
+    scenario = {"name": "tiny", "trace": {"generate": 200, "seed": 1}, "num_registers": 11, "dispatch_size": 1}
+    result = T.run_benchmark(scenario)
+    assert result["num_instructions"] == 200 and result["clock_cycles"] > 0
+    assert set(result) == {"name", "num_instructions", "clock_cycles", "seconds", "cycles_per_second", "instructions_per_second",
+                           "peak_rss_kb", "retained_blocks_per_cycle"}
+    line = T.format_benchmark_results({"results": [result]}, baseline={"results": [result]})
+    assert "retained blocks/cycle" in line and "1.00x baseline" in line
@@ -0,0 +1,57 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+# ADDD issues a cycle before MULTD and takes a cycle longer, so both finish executing in the same cycle.
+SAME_CYCLE = "ADDD F1, F2, F3\nMULTD F4, F5, F6\n"
+LATENCIES = dict(T.default_latencies, ADDD=3, MULTD=2)
+
+
+def run(registers, **configuration):
+    return simulate(T.load_assembly_trace(io.StringIO(SAME_CYCLE), registers), registers, limit=1000, latencies=LATENCIES, **configuration)
+
+
+def test_one_wide_bus_writes_back_oldest_first(registers):
+    tomasulo = run(registers, cdb_width=1)
+    add, multiply = timings(tomasulo)
+    assert add[3] == multiply[3]
+    assert add[4] == add[3] + 1
+    assert multiply[4] == add[4] + 1 # waited one cycle for the bus
+    statistics = tomasulo.return_cdb_statistics()
+    assert statistics["broadcasts"] == 2
+    assert statistics["stalled_completions"] == 1
+    assert statistics["contention_cycles"] == 1
+    assert statistics["max_waiting"] == 1
+
+
+@pytest.mark.parametrize("cdb_width", [None, 2])
+def test_wide_bus_writes_back_together(registers, cdb_width):
+    tomasulo = run(registers, cdb_width=cdb_width)
+    add, multiply = timings(tomasulo)
+    assert add[4] == multiply[4] == add[3] + 1
+    if cdb_width is not None:
+        assert tomasulo.return_cdb_statistics()["stalled_completions"] == 0
+
+
+# Stand-in for a station that finished executing: the bus only reads its instruction and latency.
+class Finished:
+    def __init__(self, index, latency):
+        self.instruction_pointer = SimpleNamespace(index=index)
+        self.latency = latency
+
+
+@pytest.mark.parametrize("policy, order", [("oldest-first", [2, 5, 9]), ("latency-priority", [9, 2, 5])])
+def test_waiting_requests_are_granted_in_policy_order(policy, order):
+    bus = T.CommonDataBus(1, policy)
+    stations = [Finished(5, 2), Finished(2, 2), Finished(9, 40)]
+    for number, station in enumerate(stations):
+        bus.request(station, number)
+    granted = [next(iter(bus.grant())).instruction_pointer.index for esh in range(3)]
+    assert granted == order
+    assert bus.stalled_completions == 2 + 1
+    assert bus.statistics(3)["waiting_cycles"] == {1: 1, 2: 1}
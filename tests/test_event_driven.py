@@ -0,0 +1,72 @@
+import io
+
+import pytest
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+# Each run gets its own predictor and memory system, which keep state.
+CONFIGURATIONS = [
+    lambda: {},
+    lambda: {"rob_size": 8, "predictor": T.BimodalPredictor()},
+    lambda: {"cdb_width": 1},
+    lambda: {"functional_units": {"ADD": 1, "MULT": 1, "LOAD/STORE": 1}, "initiation_intervals": {"DIVD": 20}},
+    lambda: {"memory_system": T.MemorySystem(cache=T.Cache(sets=4, ways=2, line_size=16),
+                                             base_addresses={"F" + str(index): 512 * index for index in range(8)})},
+    lambda: {"physical_registers": 16, "rob_size": 8},
+]
+
+BRANCHES = """LDDD F1, 0(F7)
+MULTD F2, F1, F3
+BNE F2, F4, loop:T
+ADDD F5, F2, F6
+DIVD F3, F5, F1
+BEQ F5, F6, done:N
+STDD F3, 8(F7)
+SUBD F6, F3, F2
+"""
+
+
+def run(instruction_queue, registers, event_driven, configuration):
+    sink = T.ListSink()
+    tomasulo = simulate(instruction_queue, registers, event_driven=event_driven, snapshot_sink=sink, **configuration)
+    return tomasulo, sink.records
+
+
+def assert_same_run(make_queue, configuration):
+    results = []
+    for event_driven in (False, True):
+        registers = T.generate_registers(8)
+        results.append(run(make_queue(registers), registers, event_driven, configuration()))
+    (stepped, stepped_records), (skipped, skipped_records) = results
+    assert timings(skipped) == timings(stepped)
+    assert skipped.get_clock_cycle() == stepped.get_clock_cycle()
+    assert skipped.return_utilizations() == stepped.return_utilizations()
+    assert skipped_records.cycles == stepped_records.cycles
+    assert skipped_records.small == stepped_records.small
+    assert skipped_records.large == stepped_records.large
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("configuration", range(len(CONFIGURATIONS)))
+def test_event_driven_matches_stepped_on_random_traces(seed, configuration):
+    assert_same_run(lambda registers: T.generate_instruction_queue(T.opcodes, registers, 200, seed=seed, dependency_rate=0.3),
+                    CONFIGURATIONS[configuration])
+
+
+@pytest.mark.parametrize("configuration", range(len(CONFIGURATIONS)))
+def test_event_driven_matches_stepped_with_branches(configuration):
+    assert_same_run(lambda registers: T.load_assembly_trace(io.StringIO(BRANCHES * 10), registers), CONFIGURATIONS[configuration])
+
+
+def test_event_driven_steps_only_event_cycles(monkeypatch):
+    stepped = []
+    step_cycle = T.Tomasulo.step_cycle
+    def counting_step_cycle(tomasulo):
+        stepped.append(tomasulo.get_clock_cycle())
+        return step_cycle(tomasulo)
+    monkeypatch.setattr(T.Tomasulo, "step_cycle", counting_step_cycle)
+    registers = T.generate_registers(8)
+    tomasulo = simulate(T.generate_instruction_queue(["DIVD"], registers, 50, seed=1), registers)
+    assert len(stepped) * 5 < tomasulo.get_clock_cycle() # DIVD takes 40 cycles, the countdowns are skipped
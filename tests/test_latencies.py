@@ -0,0 +1,20 @@
+import io
+
+import pytest
+
+import TomasuloSimulator as T
+
+
+def test_latencies_read_from_piped_input(monkeypatch, registers):
+    monkeypatch.setattr("sys.stdin", io.StringIO("1\n1\n10\n40\n2\n2\n"))
+    tomasulo = T.Tomasulo(T.generate_instruction_queue(T.opcodes, registers, 20, seed=1), 2, 2, 2, registers, T.opcodes, 1, False,
+                          snapshot_sink=T.NullSink())
+    assert tomasulo.instruction_latency == {"ADDD": 1, "SUBD": 1, "MULTD": 10, "DIVD": 40, "LDDD": 2, "STDD": 2}
+    tomasulo.run_algorithim()
+    assert all(instruction.get_write_back_cycle() > 0 for instruction in tomasulo.instruction_queue)
+
+
+def test_latencies_missing_from_piped_input(monkeypatch, registers):
+    monkeypatch.setattr("sys.stdin", io.StringIO("1\n1\n10\n"))
+    with pytest.raises(ValueError, match="No latency given for opcode DIVD"):
+        T.Tomasulo(T.generate_instruction_queue(T.opcodes, registers, 20, seed=1), 2, 2, 2, registers, T.opcodes, 1, False)
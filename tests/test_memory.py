@@ -0,0 +1,89 @@
+import io
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+def load_assembly(text, registers):
+    return T.load_assembly_trace(io.StringIO(text), registers)
+
+
+def execute_cycles(row):
+    opcode, issued, start, end, write_back = row
+    return end - start + 1
+
+
+def test_cache_hit_and_miss_latency():
+    cache = T.Cache(sets=4, ways=2, line_size=64, hit_latency=2, miss_latency=30)
+    assert cache.access(128) == 30
+    assert cache.access(128) == 2
+    assert cache.access(190) == 2 # same 64-byte line
+    assert cache.access(192) == 30 # next line
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_cache_evicts_least_recently_used_line():
+    cache = T.Cache(sets=1, ways=2, line_size=16, hit_latency=1, miss_latency=10)
+    cache.access(0)
+    cache.access(16)
+    assert cache.access(0) == 1 # 0 is now the most recently used, 16 the least
+    assert cache.access(32) == 10 # evicts 16
+    assert cache.evictions == 1
+    assert cache.access(0) == 1
+    assert cache.access(16) == 10 # evicts 32
+    assert cache.access(32) == 10
+    assert cache.statistics()["evictions"] == 3
+
+
+def test_cache_sets_are_independent():
+    cache = T.Cache(sets=2, ways=1, line_size=16)
+    cache.access(0) # set 0
+    cache.access(16) # set 1
+    assert cache.access(0) == cache.hit_latency
+    assert cache.access(16) == cache.hit_latency
+    assert cache.evictions == 0
+
+
+def test_load_after_aliasing_store_is_forwarded(registers):
+    memory_system = T.MemorySystem(forward_latency=1, base_addresses={"F2": 256, "F6": 248})
+    program = "DIVD F1, F4, F5\nSTDD F1, 0(F2)\nLDDD F3, 8(F6)\n" # both at address 256, through different base registers
+    latencies = dict(T.default_latencies, STDD=3)
+    tomasulo = simulate(load_assembly(program, registers), registers, limit=1000, num_loadstore=3, memory_system=memory_system, latencies=latencies)
+    divide, store, load = timings(tomasulo)
+    assert load[2] > store[2] and load[2] >= store[3] # the load waits until the store has finished executing
+    assert execute_cycles(load) == 1
+    statistics = tomasulo.return_memory_statistics()
+    assert statistics["forwarded"] == 1
+    assert statistics["disambiguation_stalls"] > 0 # while the store waited for the DIVD
+    assert statistics["forwarding_stalls"] > 0 # while the store executed
+    assert memory_system.stores == {} and memory_system.operations == {}
+
+
+def test_load_waits_for_older_store_address(registers):
+    memory_system = T.MemorySystem(base_addresses={"F6": 4096})
+    program = "DIVD F1, F4, F5\nSTDD F1, 0(F2)\nLDDD F3, 8(F6)\n"
+    tomasulo = simulate(load_assembly(program, registers), registers, limit=1000, num_loadstore=3, memory_system=memory_system)
+    divide, store, load = timings(tomasulo)
+    assert load[2] >= store[2] # no load passes a store whose address is unknown
+    statistics = tomasulo.return_memory_statistics()
+    assert statistics["forwarded"] == 0
+    assert statistics["disambiguation_stalls"] > 0
+
+
+def test_loads_without_store_buffer_do_not_wait(registers):
+    memory_system = T.MemorySystem(store_buffer=False, base_addresses={"F2": 256, "F6": 248})
+    program = "DIVD F1, F4, F5\nSTDD F1, 0(F2)\nLDDD F3, 8(F6)\n"
+    tomasulo = simulate(load_assembly(program, registers), registers, limit=1000, num_loadstore=3, memory_system=memory_system)
+    divide, store, load = timings(tomasulo)
+    assert load[2] < store[2]
+
+
+def test_load_latency_is_cache_hit_or_miss(registers):
+    memory_system = T.MemorySystem(cache=T.Cache(line_size=64, hit_latency=2, miss_latency=20), base_addresses={"F6": 4096})
+    program = "LDDD F1, 0(F2)\nLDDD F3, 8(F2)\nLDDD F4, 0(F6)\n"
+    tomasulo = simulate(load_assembly(program, registers), registers, limit=1000, num_loadstore=3, memory_system=memory_system)
+    first, same_line, other_line = timings(tomasulo)
+    assert execute_cycles(first) == 20
+    assert execute_cycles(same_line) == 2
+    assert execute_cycles(other_line) == 20
+    assert tomasulo.return_memory_statistics()["cache"]["hits"] == 1
@@ -0,0 +1,112 @@
+import io
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+def load_assembly(text, registers):
+    return T.load_assembly_trace(io.StringIO(text), registers)
+
+
+# A register file numbered the way Tomasulo numbers it.
+def register_file(num_registers):
+    registers = T.generate_registers(num_registers)
+    for index, register in enumerate(registers.values()):
+        register.set_index(index)
+    return registers
+
+
+def names(registers):
+    return [register.get_name() for register in registers]
+
+
+def test_rename_and_undo_restore_map_and_free_list():
+    registers = register_file(4)
+    table = T.RenameTable(list(registers.values()), 6)
+    assert names(table.map) == ["P0", "P1", "P2", "P3"] and names(table.free) == ["P4", "P5"]
+    first = table.rename(registers["F1"])
+    second = table.rename(registers["F1"])
+    assert names(table.map) == ["P0", "P5", "P2", "P3"] and len(table.free) == 0
+    table.undo(second)
+    table.undo(first)
+    assert names(table.map) == ["P0", "P1", "P2", "P3"] and names(table.free) == ["P4", "P5"]
+    assert table.previous == {}
+
+
+def test_retire_frees_replaced_register_once_written():
+    registers = register_file(4)
+    table = T.RenameTable(list(registers.values()), 5)
+    replaced = table.lookup(registers["F2"])
+    physical = table.rename(registers["F2"])
+    replaced.set_buffer(object()) # still being computed by an older station
+    table.retire(physical)
+    assert names(table.free) == [] and replaced in table.deferred
+    replaced.set_buffer(None)
+    table.written(replaced)
+    assert names(table.free) == ["P2"] and table.deferred == {}
+
+
+WAR = """DIVD F1, F2, F3
+ADDD F4, F1, F5
+ADDD F5, F6, F7
+"""
+
+WAW = """DIVD F1, F2, F3
+ADDD F1, F4, F5
+ADDD F6, F1, F4
+"""
+
+
+def test_renaming_removes_write_after_read(registers):
+    divide, reader, writer = timings(simulate(load_assembly(WAR, registers), registers, limit=1000, physical_registers=16))
+    assert writer[4] < reader[2] # F5 is rewritten before the older ADDD has even read it
+
+
+def test_renaming_removes_write_after_write(registers):
+    divide, writer, reader = timings(simulate(load_assembly(WAW, registers), registers, limit=1000, physical_registers=16))
+    assert writer[4] < divide[4] # the younger write to F1 no longer waits for the DIVD
+    assert writer[4] < reader[2] < divide[4] # the reader takes the younger F1, not the DIVD's
+
+
+def test_without_renaming_false_dependencies_wait(registers):
+    divide, reader, writer = timings(simulate(load_assembly(WAR, registers), registers, limit=1000))
+    assert writer[2] > reader[3]
+    registers = T.generate_registers(8)
+    divide, writer, reader = timings(simulate(load_assembly(WAW, registers), registers, limit=1000))
+    assert writer[2] > divide[4]
+
+
+# The rename map right after the BNE issued, and the rename state in the cycle it writes back and flushes.
+class FlushObserver(T.SimulationObserver):
+    def __init__(self, branch_row):
+        self.branch_row = branch_row
+        self.issued = None
+        self.flushed = None
+
+    def on_cycle(self, tomasulo):
+        table = tomasulo.rename_table
+        branch = next(instruction for instruction in tomasulo.instruction_queue if instruction.index == self.branch_row)
+        if self.issued is None and any(entry[0].index == self.branch_row for entry in tomasulo.reorder_buffer.entries):
+            self.issued = {"map": names(table.map), "free": len(table.free)}
+        if self.flushed is None and branch.get_write_back_cycle() > 0:
+            self.flushed = {"map": names(table.map), "free": names(table.free), "previous": len(table.previous),
+                            "entries": len(tomasulo.reorder_buffer.entries)}
+
+
+def test_flush_undoes_younger_renames(registers):
+    program = "DIVD F6, F4, F5\nLDDD F1, 0(F7)\nBNE F1, F2, loop:T\nADDD F3, F6, F0\nSUBD F0, F4, F5\n"
+    observer = FlushObserver(2)
+    tomasulo = simulate(load_assembly(program, registers), registers, limit=1000, num_fp_add=3, rob_size=8,
+                        predictor=T.StaticPredictor(False), physical_registers=16, observers=[observer])
+    issued, flushed = observer.issued, observer.flushed
+    assert flushed["entries"] == 3
+    assert flushed["map"] == issued["map"] # ADDD's F3 and SUBD's F0 are mapped back
+    assert flushed["previous"] == 2 # only DIVD and LDDD still hold a replaced register
+    assert len(flushed["free"]) == issued["free"]
+    assert tomasulo.return_rob_statistics()["flushed_instructions"] == 2
+
+    # Every physical register is free again once the run is over.
+    table = tomasulo.rename_table
+    assert len(table.free) == 16 - 8 and table.previous == {} and table.deferred == {}
+    assert len(set(names(table.map)) | set(names(table.free))) == 16
+    assert all(write_back > 0 for *_, write_back in timings(tomasulo))
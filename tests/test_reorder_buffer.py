@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+def load_assembly(text, registers):
+    return T.load_assembly_trace(io.StringIO(text), registers)
+
+
+# The state of the simulator in the cycle the BNE writes back, when its misprediction is resolved.
+class FlushObserver(T.SimulationObserver):
+    def __init__(self, branch_row):
+        self.branch_row = branch_row
+        self.seen = None
+
+    def on_cycle(self, tomasulo):
+        branch = next(instruction for instruction in tomasulo.instruction_queue if instruction.index == self.branch_row)
+        if self.seen is None and branch.get_write_back_cycle() > 0:
+            self.seen = {"entries": [entry[0].index for entry in tomasulo.reorder_buffer.entries],
+                         "buffers": {name: register.get_buffer() for name, register in tomasulo.registers.items()},
+                         "pending": list(tomasulo.pending_registers),
+                         "issued": [instruction.get_issued_cycle() for instruction in tomasulo.instruction_queue],
+                         "divider": tomasulo.reorder_buffer.entries[0][1]}
+
+
+MISPREDICTED = """DIVD F6, F4, F5
+LDDD F1, 0(F7)
+BNE F1, F2, loop:T
+ADDD F3, F6, F0
+SUBD F0, F4, F5
+"""
+
+
+def test_mispredicted_branch_flushes_younger_entries(registers):
+    observer = FlushObserver(2)
+    tomasulo = simulate(load_assembly(MISPREDICTED, registers), registers, limit=1000, num_fp_add=3, rob_size=8,
+                        predictor=T.StaticPredictor(False), observers=[observer])
+    flush = observer.seen
+    assert flush["entries"] == [0, 1, 2] # DIVD and LDDD wait behind the DIVD to commit; ADDD and SUBD are gone
+    assert flush["issued"][3:] == [0, 0] # timestamps of the flushed instructions are cleared
+    assert flush["buffers"]["F6"] is flush["divider"] # still held by the DIVD, which was not flushed
+    assert flush["buffers"]["F3"] is None and flush["buffers"]["F0"] is None
+    assert all(count == 0 for count in flush["pending"])
+
+    # The flushed instructions issue again after the branch and complete.
+    rows = timings(tomasulo)
+    assert all(write_back > 0 for *_, write_back in rows)
+    assert rows[3][1] > rows[2][4] and rows[4][1] > rows[2][4]
+    statistics = tomasulo.return_rob_statistics()
+    assert statistics["committed"] == 5
+    assert statistics["branches"] == 1 and statistics["mispredictions"] == 1
+    assert statistics["flushed_instructions"] == 2
+    assert all(register.get_buffer() is None for register in registers.values())
+
+
+BRANCHES = """LDDD F1, 0(F7)
+BNE F1, F2, loop:T
+ADDD F3, F4, F5
+BEQ F3, F4, skip:N
+BNE F3, F2, loop:T
+MULTD F6, F3, F4
+BEQ F6, F1, skip:N
+BNE F6, F0, loop:T
+"""
+
+
+@pytest.mark.parametrize("taken, mispredictions", [(False, 3), (True, 2)])
+def test_statistics_count_each_committed_branch_once(registers, taken, mispredictions):
+    tomasulo = simulate(load_assembly(BRANCHES, registers), registers, limit=1000, rob_size=4,
+                        predictor=T.StaticPredictor(taken))
+    statistics = tomasulo.return_rob_statistics()
+    assert statistics["committed"] == 8
+    assert statistics["branches"] == 5
+    assert statistics["mispredictions"] == mispredictions
+    assert statistics["max_occupancy"] <= 4
+
+
+def test_branch_opcodes_must_be_given(registers):
+    with pytest.raises(ValueError, match="No latency given for opcode BNE: add it to the opcodes argument"):
+        T.Tomasulo(load_assembly(BRANCHES, registers), 2, 2, 2, registers, T.opcodes, 1, False,
+                   latencies=T.default_latencies, snapshot_sink=T.NullSink(), rob_size=4)
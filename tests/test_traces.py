@@ -0,0 +1,66 @@
+import io
+
+import pytest
+
+import TomasuloSimulator as T
+from conftest import simulate, timings
+
+
+# An instruction that reads the register it writes, and one that reads the same register twice.
+REPEATED_REGISTERS = """LDDD F2, 0(F3)
+ADDD F0, F0, F2
+MULTD F1, F0, F0
+ADDD F0, F0, F0
+LDDD F4, 8(F4)
+STDD F4, 0(F4)
+"""
+
+
+def load_assembly(text, registers):
+    return T.load_assembly_trace(io.StringIO(text), registers)
+
+
+@pytest.mark.parametrize("event_driven", [True, False])
+def test_assembly_with_repeated_registers_completes(registers, event_driven):
+    tomasulo = simulate(load_assembly(REPEATED_REGISTERS, registers), registers, limit=1000, event_driven=event_driven)
+    assert all(write_back > 0 for *_, write_back in timings(tomasulo))
+    assert all(register.get_buffer() is None for register in registers.values())
+    assert all(count == 0 for count in tomasulo.pending_registers)
+
+
+def test_destination_read_as_source_waits_for_producer(registers):
+    tomasulo = simulate(load_assembly("LDDD F2, 0(F3)\nADDD F0, F0, F2\n", registers), registers, limit=1000)
+    load, add = timings(tomasulo)
+    assert add[2] > load[4] # ADDD starts only after the load wrote F2 back
+
+
+def test_same_source_twice_waits_for_producer(registers):
+    tomasulo = simulate(load_assembly("LDDD F0, 0(F3)\nMULTD F1, F0, F0\n", registers), registers, limit=1000)
+    load, multiply = timings(tomasulo)
+    assert multiply[2] > load[4]
+
+
+@pytest.mark.parametrize("configuration", [{"rob_size": 4}, {"physical_registers": 16}, {"memory_system": T.MemorySystem()}])
+def test_repeated_registers_with_extensions(registers, configuration):
+    tomasulo = simulate(load_assembly(REPEATED_REGISTERS, registers), registers, limit=1000, **configuration)
+    assert all(write_back > 0 for *_, write_back in timings(tomasulo))
+
+
+def test_assembly_offset_not_a_number(registers):
+    with pytest.raises(ValueError, match="address offset x is not a number"):
+        load_assembly("LDDD F1, x(F2)\n", registers).dequeue()
+
+
+def test_binary_trace_with_repeated_registers_completes(registers, tmp_path):
+    path = str(tmp_path / "repeated.trace")
+    T.save_binary_trace(load_assembly(REPEATED_REGISTERS, T.generate_registers(8)), path)
+    tomasulo = simulate(T.load_binary_trace(path, registers, chunk_size=2), registers, limit=1000)
+    expected = simulate(load_assembly(REPEATED_REGISTERS, registers), registers, limit=1000)
+    assert timings(tomasulo) == timings(expected)
+
+
+def test_sweep_list_trace_with_repeated_registers_completes():
+    trace = [("LDDD", "F2", "0", "F3"), ("ADDD", "F0", "F0", "F2"), ("MULTD", "F1", "F0", "F0"), ("ADDD", "F0", "F0", "F0")]
+    results = T.sweep(trace, {"num_fp_mult": [1, 2], "num_registers": [8]}, max_workers=2)
+    assert [result["num_instructions"] for result in results] == [4, 4]
+    assert results[0]["clock_cycles"] >= results[1]["clock_cycles"]